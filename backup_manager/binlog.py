@@ -0,0 +1,195 @@
+# backup_manager/binlog.py
+"""
+Binary log based incremental backups for MySQL. A full dump records the binlog
+coordinates of its snapshot, every incremental backup copies the binary logs
+written since the previous backup of the chain, and a restore replays them on
+top of the full dump, optionally stopping at a point in time.
+"""
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from functools import lru_cache
+import mysql.connector
+from .models import file_log
+from .pipeline import CHUNK_SIZE, artifact_extension, open_artifact_writer, open_artifact_reader
+from .supervisor import ProcessSupervisor, StderrTail
+
+# mysqldump --source-data/--master-data writes the coordinates in a comment near the top
+BINLOG_POSITION_RE = re.compile(
+    rb"(?:MASTER|SOURCE)_LOG_FILE='([^']+)',\s*(?:MASTER|SOURCE)_LOG_POS=(\d+)"
+)
+DUMP_HEAD_SIZE = 64 * 1024
+
+
+class BinlogGapError(Exception):
+    """The binary logs needed to continue a backup chain are gone from the server"""
+
+
+@lru_cache(maxsize=None)
+def _mysqldump_help():
+    try:
+        return subprocess.run(['mysqldump', '--help'], capture_output=True, text=True).stdout
+    except OSError:
+        return ''
+
+
+def binlog_dump_options():
+    """mysqldump options taking a consistent snapshot and recording its binlog position"""
+    help_text = _mysqldump_help()
+    options = ['--single-transaction']
+    # --master-data was renamed in MySQL 8.0.26, MariaDB only knows the old name
+    if '--source-data' in help_text:
+        options.append('--source-data=2')
+    else:
+        options.append('--master-data=2')
+    # GTID_PURGED in the dump fails on servers that already executed transactions
+    if '--set-gtid-purged' in help_text:
+        options.append('--set-gtid-purged=OFF')
+    return options
+
+
+def parse_binlog_position(head):
+    """Binlog coordinates from the beginning of a mysqldump output, None if missing"""
+    match = BINLOG_POSITION_RE.search(head or b'')
+    if not match:
+        return None
+    return {'file': match.group(1).decode(), 'position': int(match.group(2))}
+
+
+def list_binary_logs(connect_params):
+    """Names of the binary logs present on the server, oldest first"""
+    conn = mysql.connector.connect(**connect_params)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SHOW BINARY LOGS")
+        logs = [row[0] for row in cursor.fetchall()]
+        cursor.close()
+        return logs
+    finally:
+        conn.close()
+
+
+def capture_binlogs(connect_params, start, output_dir, prefix, compression='none', level=None,
+                    supervisor=None, cipher=None):
+    """
+    Copy the binary logs from start['file'] up to the one currently written into
+    output_dir. Logs are fetched whole by mysqlbinlog in raw format, the log being
+    written is copied up to its current end. Returns manifest entries in log order
+    and the end position the next incremental backup continues from.
+    """
+    supervisor = supervisor or ProcessSupervisor()
+    server_logs = list_binary_logs(connect_params)
+    if start['file'] not in server_logs:
+        raise BinlogGapError(f"Binary log {start['file']} is no longer on the server")
+    logs = server_logs[server_logs.index(start['file']):]
+
+    work_dir = tempfile.mkdtemp(prefix='binlog_', dir=output_dir)
+    try:
+        cmd = [
+            'mysqlbinlog',
+            '--read-from-remote-server',
+            f"--host={connect_params['host']}",
+            f"--port={connect_params['port']}",
+            f"--user={connect_params['user']}",
+            f"--password={connect_params['password']}",
+            '--raw',
+            '--to-last-log',
+            f'--result-file={work_dir}{os.sep}',
+            start['file'],
+        ]
+        file_log(f"BINLOG: copying {len(logs)} binary logs starting at {start['file']}:{start['position']}")
+        result = supervisor.run(cmd)
+        if result.returncode != 0:
+            raise RuntimeError(supervisor.failure(result.stderr.strip() or f'mysqlbinlog exited with code {result.returncode}'))
+
+        entries = []
+        extension = artifact_extension(compression)
+        for name in logs:
+            source = os.path.join(work_dir, name)
+            if not os.path.exists(source):
+                continue
+            filename = f"{prefix}_{name}{extension}"
+            target = os.path.join(output_dir, filename)
+            with open(source, 'rb') as src, open_artifact_writer(target, compression, level, cipher) as out:
+                shutil.copyfileobj(src, out, CHUNK_SIZE)
+            entries.append({
+                'binlog_file': name,
+                'phase': 'binlog',
+                'file': filename,
+                'raw_size': os.path.getsize(source),
+                'file_size': os.path.getsize(target),
+            })
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if not entries:
+        raise RuntimeError(f"mysqlbinlog did not copy any binary log starting at {start['file']}")
+
+    # A raw binary log copy ends exactly at the position of its last event
+    end = {'file': entries[-1]['binlog_file'], 'position': entries[-1]['raw_size']}
+    return entries, end
+
+
+def replay_binlogs(binlog_paths, mysql_cmd, start_position=None, stop_datetime=None, database=None,
+                   supervisor=None):
+    """
+    Pipe the events of the binary logs (compressed or not, in log order) through
+    mysqlbinlog into mysql_cmd. start_position applies to the first log,
+    stop_datetime ('YYYY-MM-DD HH:MM:SS', server time) ends the replay early.
+    """
+    supervisor = supervisor or ProcessSupervisor()
+    work_dir = tempfile.mkdtemp(prefix='replay_', dir=os.path.dirname(binlog_paths[0]))
+    try:
+        # mysqlbinlog needs plain files, decompress the copies next to each other
+        files = []
+        for path in binlog_paths:
+            target = os.path.join(work_dir, f"{len(files):05d}.binlog")
+            with open_artifact_reader(path) as src, open(target, 'wb') as out:
+                shutil.copyfileobj(src, out, CHUNK_SIZE)
+            files.append(target)
+
+        # Replayed transactions get new GTIDs, the originals may already be executed
+        cmd = ['mysqlbinlog', '--skip-gtids']
+        if start_position:
+            cmd.append(f'--start-position={start_position}')
+        if stop_datetime:
+            cmd.append(f'--stop-datetime={stop_datetime}')
+        if database:
+            cmd.append(f'--database={database}')
+        cmd.extend(files)
+
+        file_log(f"BINLOG: replaying {len(files)} binary logs"
+                 + (f" up to {stop_datetime}" if stop_datetime else ""))
+        binlog_process = supervisor.popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        binlog_stderr = StderrTail(binlog_process.stderr)
+        try:
+            mysql_process = supervisor.popen(
+                mysql_cmd,
+                stdin=binlog_process.stdout,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE
+            )
+        except Exception:
+            supervisor.kill(binlog_process)
+            binlog_process.wait()
+            supervisor.release(binlog_process)
+            raise
+        mysql_stderr = StderrTail(mysql_process.stderr)
+        # Only mysql holds the read end now, mysqlbinlog sees a broken pipe if it exits
+        binlog_process.stdout.close()
+        mysql_returncode = mysql_process.wait()
+        binlog_returncode = binlog_process.wait()
+        for process in (binlog_process, mysql_process):
+            supervisor.release(process)
+        binlog_stderr.join()
+        mysql_stderr.join()
+
+        if binlog_returncode != 0:
+            return {'success': False, 'message': supervisor.failure(f"mysqlbinlog: {binlog_stderr.text().strip()}")}
+        if mysql_returncode != 0:
+            return {'success': False, 'message': supervisor.failure(mysql_stderr.text())}
+        return {'success': True, 'message': f"Replayed {len(files)} binary logs"}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
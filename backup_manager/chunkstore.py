@@ -0,0 +1,276 @@
+# backup_manager/chunkstore.py
+"""
+Deduplicating chunk store. Dump output is split with content-defined chunking,
+every chunk is stored once under its sha256 digest and a backup becomes a chunk
+manifest listing the digests in order. Unchanged parts of consecutive dumps
+produce the same chunks, so only changed data takes new space and upload volume.
+"""
+import os
+import json
+import time
+import zlib
+import hashlib
+import datetime
+from django.conf import settings
+from django.utils import timezone
+from .models import StoredChunk, file_log
+from .pipeline import (
+    CHUNK_SIZE, CHUNK_MANIFEST_SUFFIX, CHUNK_MANIFEST_FORMAT,
+    open_artifact_writer, open_artifact_reader
+)
+
+MIN_CHUNK_SIZE = 256 * 1024
+AVG_CHUNK_SIZE = 1024 * 1024
+MAX_CHUNK_SIZE = 4 * 1024 * 1024
+
+# Chunks referenced this recently are never collected, protects backups still being written
+GC_GRACE_PERIOD = datetime.timedelta(hours=24)
+
+
+def find_boundary(buf, line_start, scan):
+    """
+    Content-defined chunking anchored at newlines. A line ending past
+    MIN_CHUNK_SIZE closes the chunk when the crc32 of the line falls below a
+    threshold proportional to its length, so the expected chunk size does not
+    depend on line length. Binary data works the same, 0x0a bytes are just rarer.
+
+    Returns (boundary, line_start, scan): boundary is the chunk length or None
+    when more data is needed; line_start and scan resume the search later.
+    """
+    if scan < MIN_CHUNK_SIZE:
+        if len(buf) < MIN_CHUNK_SIZE:
+            return None, 0, 0
+        # The line crossing MIN_CHUNK_SIZE is hashed from its real beginning
+        line_start = buf.rfind(b'\n', 0, MIN_CHUNK_SIZE) + 1
+        scan = MIN_CHUNK_SIZE
+
+    limit = min(len(buf), MAX_CHUNK_SIZE)
+    # Released before returning, the caller resizes buf afterwards
+    with memoryview(buf) as view:
+        while scan < limit:
+            newline = buf.find(b'\n', scan, limit)
+            if newline < 0:
+                scan = limit
+                break
+            end = newline + 1
+            if zlib.crc32(view[line_start:end]) * AVG_CHUNK_SIZE < (end - line_start) << 32:
+                return end, 0, 0
+            line_start = scan = end
+    if len(buf) >= MAX_CHUNK_SIZE:
+        return MAX_CHUNK_SIZE, 0, 0
+    return None, line_start, scan
+
+
+class ChunkStore:
+    """Chunks stored under BACKUP_DIR/.chunks/<first two hex digits>/<digest>.chunk"""
+
+    def __init__(self, root=None):
+        self.root = root or os.path.join(settings.BACKUP_DIR, '.chunks')
+
+    def chunk_path(self, digest):
+        return os.path.join(self.root, digest[:2], f"{digest}.chunk")
+
+    def put(self, data, compression='none', level=None):
+        """Store data unless a chunk with the same content exists. Returns (digest, new stored bytes)"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.chunk_path(digest)
+
+        if os.path.exists(path):
+            # Refresh the reference time so garbage collection keeps the chunk
+            if not StoredChunk.objects.filter(digest=digest).update(last_used=timezone.now()):
+                StoredChunk.objects.get_or_create(
+                    digest=digest,
+                    defaults={'size': len(data), 'stored_size': os.path.getsize(path)}
+                )
+            return digest, 0
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{time.monotonic_ns()}.tmp"
+        with open_artifact_writer(tmp_path, compression, level) as out:
+            out.write(data)
+        # Concurrent writers of the same chunk produce identical content
+        os.replace(tmp_path, path)
+        stored_size = os.path.getsize(path)
+        StoredChunk.objects.update_or_create(
+            digest=digest,
+            defaults={'size': len(data), 'stored_size': stored_size, 'last_used': timezone.now()}
+        )
+        return digest, stored_size
+
+    def writer(self, manifest_path, compression='none', level=None):
+        return ChunkWriter(self, manifest_path, compression, level)
+
+    def open_manifest(self, manifest_path):
+        return ChunkReader(self, read_chunk_manifest(manifest_path))
+
+    def is_uploaded(self, digest, destination):
+        chunk = StoredChunk.objects.filter(digest=digest).first()
+        return bool(chunk and destination in chunk.uploaded_to)
+
+    def mark_uploaded(self, digest, destination):
+        chunk = StoredChunk.objects.filter(digest=digest).first()
+        if chunk and destination not in chunk.uploaded_to:
+            chunk.uploaded_to.append(destination)
+            chunk.save(update_fields=['uploaded_to'])
+
+    def _referenced_digests(self):
+        """Digests used by any chunk manifest under BACKUP_DIR"""
+        referenced = set()
+        for dirpath, dirnames, filenames in os.walk(settings.BACKUP_DIR):
+            # Skip the store itself, WAL staging and prepared restore directories
+            dirnames[:] = [d for d in dirnames if not d.startswith('.') and d != 'restores']
+            for filename in filenames:
+                if filename.endswith(CHUNK_MANIFEST_SUFFIX):
+                    try:
+                        manifest = read_chunk_manifest(os.path.join(dirpath, filename))
+                    except (OSError, ValueError):
+                        continue
+                    referenced.update(digest for digest, _ in manifest['chunks'])
+        return referenced
+
+    def collect_garbage(self):
+        """Remove chunks no chunk manifest references anymore. Returns freed bytes"""
+        referenced = self._referenced_digests()
+        candidates = StoredChunk.objects.filter(last_used__lt=timezone.now() - GC_GRACE_PERIOD)
+        freed = 0
+        removed = 0
+        for chunk in candidates.iterator():
+            if chunk.digest in referenced:
+                continue
+            path = self.chunk_path(chunk.digest)
+            if os.path.exists(path):
+                os.remove(path)
+            freed += chunk.stored_size
+            removed += 1
+            chunk.delete()
+        if removed:
+            file_log(f"CHUNKSTORE: removed {removed} unreferenced chunks ({freed} bytes)")
+        return freed
+
+
+class ChunkWriter:
+    """File-like sink splitting everything written to it into stored chunks"""
+
+    def __init__(self, store, manifest_path, compression='none', level=None):
+        self.store = store
+        self.manifest_path = manifest_path
+        self.compression = compression
+        self.level = level
+        self.chunks = []
+        self.raw_size = 0
+        self.new_chunks = 0
+        self.new_stored_size = 0
+        self._stored_sizes = {}
+        self._buffer = bytearray()
+        self._line_start = 0
+        self._scan = 0
+        self._closed = False
+
+    def write(self, data):
+        self._buffer.extend(data)
+        while True:
+            boundary, self._line_start, self._scan = find_boundary(self._buffer, self._line_start, self._scan)
+            if boundary is None:
+                break
+            self._emit(bytes(self._buffer[:boundary]))
+            del self._buffer[:boundary]
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def _emit(self, data):
+        digest, stored = self.store.put(data, self.compression, self.level)
+        self.chunks.append([digest, len(data)])
+        self.raw_size += len(data)
+        if stored:
+            self.new_chunks += 1
+            self.new_stored_size += stored
+        if digest not in self._stored_sizes:
+            self._stored_sizes[digest] = stored or os.path.getsize(self.store.chunk_path(digest))
+
+    @property
+    def stored_size(self):
+        """Stored size of all distinct chunks the artifact references"""
+        return sum(self._stored_sizes.values())
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self._buffer:
+            self._emit(bytes(self._buffer))
+            self._buffer = bytearray()
+
+        manifest = {
+            'format': CHUNK_MANIFEST_FORMAT,
+            'version': 1,
+            'compression': self.compression,
+            'raw_size': self.raw_size,
+            'stored_size': self.stored_size,
+            'new_chunks': self.new_chunks,
+            'new_stored_size': self.new_stored_size,
+            'chunks': self.chunks,
+        }
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+        file_log(f"CHUNKSTORE: {len(self.chunks)} chunks, {self.new_chunks} new "
+                 f"({self.new_stored_size} of {self.stored_size} stored bytes)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ChunkReader:
+    """Readable stream reassembling an artifact from its chunks"""
+
+    def __init__(self, store, manifest):
+        self.store = store
+        self._chunks = iter(manifest['chunks'])
+        self._current = None
+
+    def read(self, size=-1):
+        parts = []
+        remaining = size if size is not None and size >= 0 else None
+        while remaining is None or remaining > 0:
+            if self._current is None:
+                entry = next(self._chunks, None)
+                if entry is None:
+                    break
+                path = self.store.chunk_path(entry[0])
+                if not os.path.exists(path):
+                    raise IOError(f"Chunk {entry[0]} is missing from the chunk store")
+                self._current = open_artifact_reader(path)
+            data = self._current.read(CHUNK_SIZE if remaining is None else min(remaining, CHUNK_SIZE))
+            if not data:
+                self._current.close()
+                self._current = None
+                continue
+            parts.append(data)
+            if remaining is not None:
+                remaining -= len(data)
+        return b''.join(parts)
+
+    def close(self):
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_chunk_manifest(manifest_path):
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != CHUNK_MANIFEST_FORMAT:
+        raise ValueError(f"Not a chunk manifest: {manifest_path}")
+    return manifest
@@ -0,0 +1,175 @@
+# backup_manager/concurrency.py
+"""
+Concurrency limits of backups across all workers. Every backup holds a slot
+of its database host, its SSH bastion and its storage destination while it
+runs. Slots are counting semaphores in Redis (the Celery broker by default):
+sorted sets of leases scored by their expiry, so a worker that dies without
+releasing them frees its slots once the leases run out. Restore
+verifications share one more semaphore.
+"""
+import time
+import uuid
+import threading
+from django.conf import settings
+from .models import file_log
+from .services import is_ssh_server
+
+# Seconds a lease is valid without a refresh, the holder refreshes it every third of that
+SLOT_LEASE_SECONDS = 300
+
+# Marks tasks queued by the scheduler so a backup waiting for a slot is not queued again,
+# refreshed whenever the backup is requeued so a lost message only delays the next run
+QUEUED_MARK_SECONDS = 60 * 60
+
+KEY_PREFIX = 'debt:slots:'
+QUEUED_PREFIX = 'debt:queued:'
+
+# KEYS[1] semaphore, ARGV: token, limit, now, lease expiry
+ACQUIRE_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[3])
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[2]) then
+    redis.call('ZADD', KEYS[1], ARGV[4], ARGV[1])
+    redis.call('EXPIRE', KEYS[1], math.ceil(ARGV[4] - ARGV[3]))
+    return 1
+end
+return 0
+"""
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_redis():
+    """Redis client of BACKUP_LOCK_URL, None when locks are not kept in Redis"""
+    global _client
+    url = settings.BACKUP_LOCK_URL
+    if not url.startswith(('redis://', 'rediss://', 'unix://')):
+        return None
+    with _client_lock:
+        if _client is None:
+            import redis
+            _client = redis.Redis.from_url(url)
+        return _client
+
+
+def _slots_client():
+    try:
+        return get_redis()
+    except Exception as e:
+        file_log(f"SLOTS: Redis client unavailable, running without concurrency limits: {str(e)}")
+        return None
+
+
+def backup_resources(task):
+    """(semaphore name, limit) pairs a backup of task occupies, unlimited ones left out"""
+    server = task.server
+    resources = []
+    if is_ssh_server(server):
+        bastion = f"{(server.ssh_hostname or '').lower()}:{server.ssh_port or 22}"
+        resources.append((f"ssh:{bastion}", settings.BACKUP_MAX_PER_SSH_HOST))
+        # The database host name is resolved on the bastion
+        resources.append((f"host:{bastion}/{server.hostname.lower()}:{server.port}",
+                          settings.BACKUP_MAX_PER_HOST))
+    else:
+        resources.append((f"host:{server.hostname.lower()}:{server.port}", settings.BACKUP_MAX_PER_HOST))
+
+    if task.storage_type in ('ftp', 'sftp'):
+        resources.append((f"storage:{task.storage_type}:{(task.remote_hostname or '').lower()}:{task.remote_port or ''}",
+                          settings.BACKUP_MAX_PER_STORAGE))
+    elif task.storage_type == 'gdrive':
+        folder = task.storage_config.gdrive_folder_id if task.storage_config else task.gdrive_folder_id
+        resources.append((f"storage:gdrive:{folder or ''}", settings.BACKUP_MAX_PER_STORAGE))
+    return [(name, limit) for name, limit in resources if limit > 0]
+
+
+class BackupSlots:
+    """
+    Slots of one backup in all the semaphores it needs. acquire() takes all of
+    them or none, so a backup never sits on a host slot waiting for storage.
+    """
+
+    def __init__(self, resources, client=None):
+        self.resources = sorted(resources)
+        self.client = client
+        self.token = uuid.uuid4().hex
+        self.held = []
+        self.busy = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def for_task(cls, task):
+        client = _slots_client()
+        return cls(backup_resources(task) if client else [], client)
+
+    @classmethod
+    def for_verification(cls):
+        """Slot of a restore verification, VERIFY_MAX_CONCURRENT of them run at once"""
+        client = _slots_client()
+        limit = settings.VERIFY_MAX_CONCURRENT
+        return cls([('verify', limit)] if client and limit > 0 else [], client)
+
+    def acquire(self):
+        """Take every slot, False (holding none) when one of them is busy"""
+        if not self.resources:
+            return True
+        try:
+            for name, limit in self.resources:
+                now = time.time()
+                taken = self.client.eval(ACQUIRE_SCRIPT, 1, KEY_PREFIX + name,
+                                         self.token, limit, now, now + SLOT_LEASE_SECONDS)
+                if not taken:
+                    self.busy = name
+                    self.release()
+                    return False
+                self.held.append(name)
+        except Exception as e:
+            # A broken lock store must not stop backups
+            file_log(f"SLOTS: could not acquire slots, running without concurrency limits: {str(e)}")
+            self.release()
+            return True
+        self._thread = threading.Thread(target=self._refresh, daemon=True)
+        self._thread.start()
+        return True
+
+    def _refresh(self):
+        while not self._stop.wait(SLOT_LEASE_SECONDS / 3):
+            expiry = time.time() + SLOT_LEASE_SECONDS
+            for name in self.held:
+                try:
+                    self.client.zadd(KEY_PREFIX + name, {self.token: expiry}, xx=True)
+                except Exception as e:
+                    file_log(f"SLOTS: could not refresh slot {name}: {str(e)}")
+
+    def release(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        for name in self.held:
+            try:
+                self.client.zrem(KEY_PREFIX + name, self.token)
+            except Exception as e:
+                file_log(f"SLOTS: could not release slot {name}, its lease will expire: {str(e)}")
+        self.held = []
+
+
+def mark_queued(task_id, refresh=False):
+    """Mark a scheduled task as queued, False when it already is (unless refreshing the mark)"""
+    try:
+        client = get_redis()
+        if client is None:
+            return True
+        return bool(client.set(f"{QUEUED_PREFIX}{task_id}", 1, nx=not refresh, ex=QUEUED_MARK_SECONDS))
+    except Exception as e:
+        file_log(f"SLOTS: could not mark task {task_id} as queued: {str(e)}")
+        return True
+
+
+def clear_queued(task_id):
+    try:
+        client = get_redis()
+        if client is not None:
+            client.delete(f"{QUEUED_PREFIX}{task_id}")
+    except Exception as e:
+        file_log(f"SLOTS: could not clear queued mark of task {task_id}: {str(e)}")
@@ -0,0 +1,275 @@
+# backup_manager/encryption.py
+"""
+Chunked encryption of backup artifacts with AES-256-GCM. The compressed
+stream is cut into chunks that are encrypted independently, so encryption
+runs in a thread pool while the dump is streaming and restores decrypt the
+artifact as a stream. Keys belong to a StorageConfig, artifacts name their
+key by a fingerprint so restores find it again.
+
+Layout: header, then one record per chunk.
+  header  MAGIC (8) | key id (8) | nonce prefix (8) | chunk size (4)
+  record  length (4, high bit set on the last record) | ciphertext with tag
+Chunk n uses the nonce prefix followed by n as its nonce. The header, n and
+the last-record flag are authenticated, reordered or truncated artifacts fail
+to decrypt.
+"""
+import io
+import os
+import base64
+import struct
+import hashlib
+import collections
+from concurrent.futures import ThreadPoolExecutor
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.exceptions import InvalidTag
+from .models import StorageConfig
+
+ENCRYPTION_MAGIC = b'DEBTENC1'
+KEY_SIZE = 32
+NONCE_PREFIX_SIZE = 8
+TAG_SIZE = 16
+ENCRYPTION_CHUNK_SIZE = 1024 * 1024
+HEADER = struct.Struct('>8s8s8sI')
+RECORD_LENGTH = struct.Struct('>I')
+LAST_RECORD = 0x80000000
+
+# Chunks encrypted at once, the AES-GCM work of the OpenSSL backend runs without the GIL
+ENCRYPTION_WORKERS = min(8, os.cpu_count() or 1)
+
+
+class DecryptionError(Exception):
+    """Artifact cannot be decrypted: unknown key, corrupted or truncated"""
+
+
+def generate_key():
+    """New random key in the text form stored on StorageConfig"""
+    return base64.urlsafe_b64encode(os.urandom(KEY_SIZE)).decode()
+
+
+def decode_key(text):
+    """Key bytes of its text form, raises ValueError when it is not a valid key"""
+    try:
+        key = base64.urlsafe_b64decode(text.strip().encode())
+    except Exception:
+        raise ValueError('Encryption key is not valid base64')
+    if len(key) != KEY_SIZE:
+        raise ValueError(f'Encryption key must be {KEY_SIZE} bytes')
+    return key
+
+
+def key_id(key):
+    return hashlib.sha256(key).digest()[:8]
+
+
+def _associated_data(header, index, last):
+    return header + struct.pack('>Q?', index, last)
+
+
+class ArtifactCipher:
+    """Encryption key of one storage configuration"""
+
+    def __init__(self, key):
+        self.key = key
+        self.key_id = key_id(key)
+
+    @classmethod
+    def for_task(cls, task):
+        """Cipher of the storage configuration of a schedule, None when it stores plaintext"""
+        config = task.storage_config if task else None
+        if config is None or not config.encryption_key:
+            return None
+        return cls(decode_key(config.encryption_key))
+
+    def writer(self, fileobj):
+        return EncryptingWriter(fileobj, self)
+
+
+def cipher_for_key_id(wanted):
+    """Cipher of the storage configuration whose key has the fingerprint wanted"""
+    for text in StorageConfig.objects.exclude(encryption_key='').values_list('encryption_key', flat=True):
+        try:
+            key = decode_key(text)
+        except ValueError:
+            continue
+        if key_id(key) == wanted:
+            return ArtifactCipher(key)
+    raise DecryptionError('Artifact is encrypted with a key no storage configuration has')
+
+
+class EncryptingWriter:
+    """
+    Writable stream encrypting everything written to it into fileobj. Chunks
+    are encrypted in a thread pool and written in order. Closing it writes
+    the last record and closes fileobj.
+    """
+
+    def __init__(self, fileobj, cipher, chunk_size=ENCRYPTION_CHUNK_SIZE, workers=ENCRYPTION_WORKERS):
+        self._target = fileobj
+        self._aead = AESGCM(cipher.key)
+        self._header = HEADER.pack(ENCRYPTION_MAGIC, cipher.key_id, os.urandom(NONCE_PREFIX_SIZE), chunk_size)
+        self._nonce_prefix = self._header[16:24]
+        self._chunk_size = chunk_size
+        self._buffer = bytearray()
+        self._index = 0
+        self._workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._pending = collections.deque()
+        self._closed = False
+        self._target.write(self._header)
+
+    def _encrypt(self, index, chunk, last):
+        nonce = self._nonce_prefix + struct.pack('>I', index)
+        data = self._aead.encrypt(nonce, bytes(chunk), _associated_data(self._header, index, last))
+        return RECORD_LENGTH.pack(len(data) | (LAST_RECORD if last else 0)) + data
+
+    def _submit(self, chunk, last=False):
+        if self._index >= 2 ** 32:
+            raise ValueError('Artifact too large for one nonce prefix')
+        self._pending.append(self._executor.submit(self._encrypt, self._index, chunk, last))
+        self._index += 1
+        # Bounded read-ahead, the oldest chunk is written once enough are queued
+        while len(self._pending) > self._workers * 2:
+            self._target.write(self._pending.popleft().result())
+
+    def write(self, data):
+        self._buffer.extend(data)
+        while len(self._buffer) >= self._chunk_size:
+            self._submit(self._buffer[:self._chunk_size])
+            del self._buffer[:self._chunk_size]
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._submit(self._buffer, last=True)
+            self._buffer = bytearray()
+            while self._pending:
+                self._target.write(self._pending.popleft().result())
+        finally:
+            self._executor.shutdown(wait=True)
+            self._target.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class DecryptingReader(io.RawIOBase):
+    """
+    Raw readable stream of the plaintext of an encrypted artifact. It can seek
+    when fileobj can, every record but the last holds a full chunk so the
+    record of any offset is found without reading the ones before it.
+    """
+
+    def __init__(self, fileobj, cipher=None):
+        self._source = fileobj
+        header = fileobj.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise DecryptionError('Encrypted artifact header is truncated')
+        magic, artifact_key_id, nonce_prefix, chunk_size = HEADER.unpack(header)
+        if magic != ENCRYPTION_MAGIC:
+            raise DecryptionError('Not an encrypted artifact')
+        if cipher is None or cipher.key_id != artifact_key_id:
+            cipher = cipher_for_key_id(artifact_key_id)
+        self._aead = AESGCM(cipher.key)
+        self._header = header
+        self._nonce_prefix = nonce_prefix
+        self._chunk_size = chunk_size
+        self._index = 0
+        self._plaintext = b''
+        self._offset = 0
+        self._done = False
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return self._source.seekable()
+
+    def _next_record(self):
+        length = self._source.read(RECORD_LENGTH.size)
+        if len(length) < RECORD_LENGTH.size:
+            raise DecryptionError('Encrypted artifact is truncated')
+        length, = RECORD_LENGTH.unpack(length)
+        last = bool(length & LAST_RECORD)
+        length &= ~LAST_RECORD
+        data = self._source.read(length)
+        if len(data) < length:
+            raise DecryptionError('Encrypted artifact is truncated')
+        nonce = self._nonce_prefix + struct.pack('>I', self._index)
+        try:
+            self._plaintext = self._aead.decrypt(nonce, data, _associated_data(self._header, self._index, last))
+        except InvalidTag:
+            raise DecryptionError(f'Encrypted artifact is corrupted (chunk {self._index})')
+        self._offset = 0
+        self._index += 1
+        self._done = last
+
+    def readinto(self, buffer):
+        while self._offset >= len(self._plaintext):
+            if self._done:
+                return 0
+            self._next_record()
+        size = min(len(buffer), len(self._plaintext) - self._offset)
+        buffer[:size] = self._plaintext[self._offset:self._offset + size]
+        self._offset += size
+        self._position += size
+        return size
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence != io.SEEK_SET:
+            raise io.UnsupportedOperation('Encrypted artifacts seek from the start only')
+        if offset == self._position:
+            return offset
+        index, within = divmod(offset, self._chunk_size)
+        record_size = RECORD_LENGTH.size + self._chunk_size + TAG_SIZE
+        self._source.seek(HEADER.size + index * record_size)
+        self._index = index
+        self._plaintext = b''
+        self._offset = 0
+        self._done = False
+        self._next_record()
+        self._offset = min(within, len(self._plaintext))
+        self._position = offset
+        return offset
+
+    def close(self):
+        if not self.closed:
+            self._source.close()
+        super().close()
+
+
+def is_encrypted(fileobj):
+    """True when the buffered stream starts with the encryption header (peeked, not consumed)"""
+    return fileobj.peek(len(ENCRYPTION_MAGIC))[:len(ENCRYPTION_MAGIC)] == ENCRYPTION_MAGIC
+
+
+def decrypted_size(fileobj, file_size):
+    """Plaintext size of an encrypted artifact of file_size bytes, from its header alone"""
+    header = fileobj.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise DecryptionError('Encrypted artifact header is truncated')
+    chunk_size = HEADER.unpack(header)[3]
+    overhead = RECORD_LENGTH.size + TAG_SIZE
+    # Full chunks, then the last record holding fewer than chunk_size bytes
+    payload = file_size - HEADER.size - overhead
+    full, rest = divmod(payload, chunk_size + overhead)
+    return full * chunk_size + rest
+
+
+def open_decrypted(fileobj, cipher=None):
+    """Buffered plaintext stream of an encrypted artifact stream"""
+    return io.BufferedReader(DecryptingReader(fileobj, cipher), buffer_size=ENCRYPTION_CHUNK_SIZE)
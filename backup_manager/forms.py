@@ -1,7 +1,17 @@
 from django import forms
-from .models import BackupTask, DatabaseServer, StorageConfig, AppSettings
+from .models import BackupTask, DatabaseServer, StorageConfig, AppSettings, DumpProfile
+from .ratelimit import parse_windows
+from .encryption import decode_key, generate_key
 import datetime
 
+def clean_rate_limit_windows(value):
+    """Validate time-of-day rate limit windows of a server or storage form"""
+    try:
+        parse_windows(value)
+    except ValueError as e:
+        raise forms.ValidationError(str(e))
+    return value
+
 class DatabaseServerForm(forms.ModelForm):
     password = forms.CharField(widget=forms.PasswordInput)
     ssh_password = forms.CharField(widget=forms.PasswordInput, required=False)
@@ -12,15 +22,24 @@ class DatabaseServerForm(forms.ModelForm):
             'name', 'connection_type', 'hostname', 'port', 
             'username', 'password', 'database_name',
             'ssh_hostname', 'ssh_port', 
-            'ssh_username', 'ssh_password', 'ssh_key_file'
+            'ssh_username', 'ssh_password', 'ssh_key_file', 'ssh_dump_mode',
+            'dump_engine', 'parallel_workers', 'chunk_rows', 'binlog_backups',
+            'skip_unchanged_tables', 'rate_limit', 'rate_limit_burst', 'rate_limit_windows',
+            'dump_profile'
         ]
+        widgets = {
+            'binlog_backups': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+            'rate_limit': forms.NumberInput(attrs={'min': 0}),
+            'rate_limit_burst': forms.NumberInput(attrs={'min': 0}),
+            'rate_limit_windows': forms.Textarea(attrs={'rows': 3, 'placeholder': '08:00-18:00 10M'}),
+        }
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields['connection_type'].widget.attrs.update({'class': 'form-control', 'id': 'connection_type'})
         
         # Mark SSH fields with a CSS class for easier visibility management
-        ssh_fields = ['ssh_hostname', 'ssh_port', 'ssh_username', 'ssh_password', 'ssh_key_file']
+        ssh_fields = ['ssh_hostname', 'ssh_port', 'ssh_username', 'ssh_password', 'ssh_key_file', 'ssh_dump_mode']
         for field in ssh_fields:
             self.fields[field].widget.attrs.update({'class': 'ssh-field form-control'})
             
@@ -28,8 +47,14 @@ class DatabaseServerForm(forms.ModelForm):
         if not self.instance.pk:  # Only for new servers
             self.fields['port'].initial = 3306  # Default to MySQL port
         
+        self.fields['dump_profile'].queryset = DumpProfile.objects.all().order_by('name')
+        self.fields['dump_profile'].empty_label = "-- Default options --"
+        
         # Add help text for database_name
         self.fields['database_name'].help_text = "Specific database to backup. For PostgreSQL, leave empty for all databases (requires superuser privileges)."
+    
+    def clean_rate_limit_windows(self):
+        return clean_rate_limit_windows(self.cleaned_data.get('rate_limit_windows'))
 
 class BackupTaskForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
@@ -54,7 +79,7 @@ class BackupTaskForm(forms.ModelForm):
         
         # Dodaj klasy CSS
         for field_name, field in self.fields.items():
-            if field_name not in ['enabled', 'email_notification']:
+            if field_name not in ['enabled', 'email_notification', 'stream_upload', 'keep_local_copy', 'deduplicate', 'table_index']:
                 field.widget.attrs.update({'class': 'form-control'})
     
     class Meta:
@@ -65,18 +90,44 @@ class BackupTaskForm(forms.ModelForm):
             'email_notification', 'email_address',
             'storage_config', 'storage_type', 'remote_hostname', 
             'remote_port', 'remote_username', 'remote_password', 
-            'remote_path', 'remote_key_file'
+            'remote_path', 'remote_key_file',
+            'compression', 'compression_level', 'compression_threads',
+            'stream_upload', 'keep_local_copy', 'split_size', 'upload_workers', 'backup_type', 'deduplicate',
+            'table_index',
+            'timeout_minutes', 'nice_level', 'io_priority'
         ]
         widgets = {
             'time': forms.TimeInput(attrs={'type': 'time'}),
             'day_of_month': forms.NumberInput(attrs={'min': 1, 'max': 31}),
+            'compression_level': forms.NumberInput(attrs={'min': 1, 'max': 22}),
+            'compression_threads': forms.NumberInput(attrs={'min': 0, 'max': 64}),
+            'split_size': forms.NumberInput(attrs={'min': 0}),
+            'upload_workers': forms.NumberInput(attrs={'min': 1, 'max': 16}),
+            'timeout_minutes': forms.NumberInput(attrs={'min': 0}),
+            'nice_level': forms.NumberInput(attrs={'min': 0, 'max': 19}),
             'enabled': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
             'email_notification': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+            'stream_upload': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+            'keep_local_copy': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+            'deduplicate': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+            'table_index': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
             'remote_password': forms.PasswordInput(),
         }
 
+    def clean(self):
+        cleaned_data = super().clean()
+        storage_config = cleaned_data.get('storage_config')
+        if cleaned_data.get('deduplicate') and storage_config and storage_config.encryption_key:
+            self.add_error('deduplicate', 'Deduplicated chunks cannot be encrypted, '
+                           f'storage "{storage_config.name}" has an encryption key')
+        return cleaned_data
+
 class StorageConfigForm(forms.ModelForm):
     password = forms.CharField(widget=forms.PasswordInput, required=False)
+    generate_encryption_key = forms.BooleanField(
+        required=False,
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
+    )
     
     class Meta:
         model = StorageConfig
@@ -84,16 +135,22 @@ class StorageConfigForm(forms.ModelForm):
             'name', 'storage_type', 'is_default',
             'hostname', 'port', 'username', 'password',
             'path', 'key_file',
-            'gdrive_folder_id', 'gdrive_credentials_file'
+            'gdrive_folder_id', 'gdrive_credentials_file',
+            'rate_limit', 'rate_limit_burst', 'rate_limit_windows',
+            'encryption_key'
         ]
         widgets = {
             'is_default': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+            'encryption_key': forms.TextInput(attrs={'autocomplete': 'off', 'spellcheck': 'false'}),
+            'rate_limit': forms.NumberInput(attrs={'min': 0}),
+            'rate_limit_burst': forms.NumberInput(attrs={'min': 0}),
+            'rate_limit_windows': forms.Textarea(attrs={'rows': 3, 'placeholder': '08:00-18:00 10M'}),
         }
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         for field_name, field in self.fields.items():
-            if field_name != 'is_default':
+            if field_name not in ('is_default', 'generate_encryption_key'):
                 field.widget.attrs.update({'class': 'form-control'})
                 
         # Dodaj atrybuty dla pól Google Drive
@@ -101,4 +158,59 @@ class StorageConfigForm(forms.ModelForm):
             self.fields['gdrive_folder_id'].widget.attrs.update({
                 'placeholder': 'np. 1A2B3C4D5E6F7G8H9I', 
                 'class': 'form-control'
-            })
\ No newline at end of file
+            })
+    
+    def clean_rate_limit_windows(self):
+        return clean_rate_limit_windows(self.cleaned_data.get('rate_limit_windows'))
+    
+    def clean_encryption_key(self):
+        key = (self.cleaned_data.get('encryption_key') or '').strip()
+        if key:
+            try:
+                decode_key(key)
+            except ValueError as e:
+                raise forms.ValidationError(str(e))
+        return key
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('generate_encryption_key'):
+            if cleaned_data.get('encryption_key'):
+                self.add_error('generate_encryption_key', 'Clear the current key first, '
+                               'backups encrypted with it can only be restored while it is kept')
+            else:
+                cleaned_data['encryption_key'] = generate_key()
+        return cleaned_data
+
+class DumpProfileForm(forms.ModelForm):
+    class Meta:
+        model = DumpProfile
+        fields = [
+            'name', 'mode', 'single_transaction', 'quick', 'extended_insert',
+            'net_buffer_length', 'pg_compression_level'
+        ]
+        widgets = {
+            'single_transaction': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+            'quick': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+            'extended_insert': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+            'net_buffer_length': forms.NumberInput(attrs={'min': 0, 'max': 16777216}),
+            'pg_compression_level': forms.NumberInput(attrs={'min': 1, 'max': 22}),
+        }
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for field_name, field in self.fields.items():
+            if field_name not in ('single_transaction', 'quick', 'extended_insert'):
+                field.widget.attrs.update({'class': 'form-control'})
+    
+    def clean_net_buffer_length(self):
+        value = self.cleaned_data.get('net_buffer_length') or 0
+        if value and not 1024 <= value <= 16 * 1024 * 1024:
+            raise forms.ValidationError('mysqldump accepts 1024 bytes to 16 MB, 0 keeps its default')
+        return value
+    
+    def clean_pg_compression_level(self):
+        value = self.cleaned_data.get('pg_compression_level')
+        if value is not None and not 1 <= value <= 22:
+            raise forms.ValidationError('Levels go from 1 to 9 for gzip and 1 to 22 for zstd')
+        return value
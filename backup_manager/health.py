@@ -0,0 +1,80 @@
+# backup_manager/health.py
+"""
+Cached reachability of database servers. A periodic task tests every server
+and stores the result on DatabaseServer.last_status, backups read it instead
+of opening a probe connection before each dump. Connection failures reported
+by the dump tools themselves update the cached state as well.
+"""
+import re
+import datetime
+from django.conf import settings
+from django.utils import timezone
+from .models import DatabaseServer
+
+# MySQL client error codes of failures to reach or log in to the server
+MYSQL_CONNECTION_ERRORS = {
+    1045: 'Access denied',
+    1049: 'Unknown database',
+    2002: 'Cannot connect to the server socket',
+    2003: 'Cannot connect to the server',
+    2005: 'Unknown server host',
+    2013: 'Lost connection to the server',
+    2026: 'SSL connection error',
+}
+
+# mysqldump: Got error: 2003: Can't connect to MySQL server on 'db:3306' (111) when trying to connect
+MYSQL_ERROR_RE = re.compile(r'Got error: (\d+): (.*?)(?: when trying to connect)?\s*$', re.MULTILINE)
+
+# libpq failures to reach the server. Other FATAL errors (authentication, missing
+# database, administrator shutdown) come from a server that is reachable.
+POSTGRESQL_CONNECTION_PATTERNS = (
+    re.compile(r'could not connect to server: (.*)'),
+    re.compile(r'could not translate host name (.*)'),
+    # pg_dump: error: connection to server at "db" (10.0.0.5), port 5432 failed: Connection refused
+    re.compile(r'connection to server .*? failed: ((?:Connection refused|Connection timed out|timeout expired'
+               r'|No route to host|Network is unreachable|No such file or directory).*)'),
+    re.compile(r'FATAL:\s+((?:the database system is (?:starting up|shutting down|in recovery mode'
+               r'|not yet accepting connections)|sorry, too many clients already).*)'),
+    re.compile(r'(server closed the connection unexpectedly)'),
+)
+
+
+def health_max_age():
+    """Age up to which a failed health check stops backups, two check intervals"""
+    return datetime.timedelta(seconds=2 * settings.SERVER_HEALTH_CHECK_INTERVAL)
+
+
+def record_status(server, success, message):
+    """Store a reachability result of server without touching its other fields"""
+    now = timezone.now()
+    DatabaseServer.objects.filter(pk=server.pk).update(
+        last_status=success,
+        last_status_check=now,
+        last_status_message=message,
+    )
+    server.last_status = success
+    server.last_status_check = now
+    server.last_status_message = message
+
+
+def cached_failure(server):
+    """Error message of a recent failed health check of server, None when it may be reachable"""
+    if server.last_status or not server.last_status_check:
+        return None
+    if timezone.now() - server.last_status_check > health_max_age():
+        return None
+    checked = timezone.localtime(server.last_status_check).strftime('%Y-%m-%d %H:%M:%S')
+    return f"Server unreachable at the last health check ({checked}): {server.last_status_message}"
+
+
+def connection_error(stderr):
+    """Connection failure described in dump tool output, None for other errors"""
+    match = MYSQL_ERROR_RE.search(stderr or '')
+    if match and int(match.group(1)) in MYSQL_CONNECTION_ERRORS:
+        code = int(match.group(1))
+        return f"{MYSQL_CONNECTION_ERRORS[code]} (MySQL error {code}): {match.group(2)}"
+    for pattern in POSTGRESQL_CONNECTION_PATTERNS:
+        match = pattern.search(stderr or '')
+        if match:
+            return f"PostgreSQL connection failed: {match.group(1).strip()}"
+    return None
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-17 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backup_manager', '0012_alter_databaseserver_connection_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backuptask',
+            name='compression',
+            field=models.CharField(choices=[('none', 'None'), ('gzip', 'Gzip'), ('zstd', 'Zstandard')], default='none', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='backuptask',
+            name='compression_level',
+            field=models.IntegerField(blank=True, help_text='Compression level (gzip 1-9, zstd 1-22). Leave empty for default.', null=True),
+        ),
+        migrations.AddField(
+            model_name='backuphistory',
+            name='raw_size',
+            field=models.BigIntegerField(blank=True, help_text='Uncompressed dump size in bytes', null=True),
+        ),
+    ]
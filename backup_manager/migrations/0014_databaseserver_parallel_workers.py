@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-17 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backup_manager', '0013_backuptask_compression_backuphistory_raw_size'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='databaseserver',
+            name='parallel_workers',
+            field=models.IntegerField(default=1, help_text='Number of databases dumped concurrently when backing up all databases. 1 keeps a single --all-databases / pg_dumpall run.'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-17 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backup_manager', '0014_databaseserver_parallel_workers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='databaseserver',
+            name='dump_engine',
+            field=models.CharField(choices=[('tool', 'mysqldump / pg_dump'), ('mysql_parallel', 'Table-parallel MySQL engine')], default='tool', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='databaseserver',
+            name='chunk_rows',
+            field=models.IntegerField(default=500000, help_text='Tables with more rows are split into primary key ranges by the table-parallel engine'),
+        ),
+        migrations.AlterField(
+            model_name='databaseserver',
+            name='parallel_workers',
+            field=models.IntegerField(default=1, help_text='Number of concurrent dump workers: databases dumped at once when backing up all databases, or connections used by the table-parallel engine.'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-17 12:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backup_manager', '0015_databaseserver_dump_engine_chunk_rows'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='databaseserver',
+            name='dump_engine',
+            field=models.CharField(choices=[('tool', 'mysqldump / pg_dump'), ('mysql_parallel', 'Table-parallel MySQL engine'), ('pg_directory', 'PostgreSQL directory format (pg_dump -Fd -j)')], default='tool', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='databaseserver',
+            name='parallel_workers',
+            field=models.IntegerField(default=1, help_text='Number of concurrent dump workers: databases dumped at once when backing up all databases, connections used by the table-parallel engine, or pg_dump/pg_restore jobs (-j) for directory format.'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-17 13:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backup_manager', '0016_alter_databaseserver_dump_engine'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backuptask',
+            name='keep_local_copy',
+            field=models.BooleanField(default=True, help_text='Keep a local copy of streamed backups'),
+        ),
+        migrations.AddField(
+            model_name='backuptask',
+            name='stream_upload',
+            field=models.BooleanField(default=False, help_text='Upload to remote storage while dumping (FTP, SFTP, Google Drive)'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.1 on 2026-10-17 14:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backup_manager', '0017_backuptask_stream_upload_keep_local_copy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='databaseserver',
+            name='binlog_backups',
+            field=models.BooleanField(default=False, help_text='Record binary log positions in full MySQL dumps so incremental backups can continue from them (requires log_bin and RELOAD, REPLICATION CLIENT and REPLICATION SLAVE privileges)'),
+        ),
+        migrations.AddField(
+            model_name='backuptask',
+            name='backup_type',
+            field=models.CharField(choices=[('full', 'Full dump'), ('incremental', 'Incremental (MySQL binary logs)')], default='full', max_length=15),
+        ),
+        migrations.AddField(
+            model_name='backuphistory',
+            name='backup_type',
+            field=models.CharField(choices=[('full', 'Full dump'), ('incremental', 'Incremental (MySQL binary logs)')], default='full', max_length=15),
+        ),
+        migrations.AddField(
+            model_name='backuphistory',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='incrementals', to='backup_manager.backuphistory'),
+        ),
+        migrations.AddField(
+            model_name='backuphistory',
+            name='binlog_file',
+            field=models.CharField(blank=True, help_text='Binary log the backup ends in', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='backuphistory',
+            name='binlog_position',
+            field=models.BigIntegerField(blank=True, null=True, help_text='Position in binlog_file the backup ends at'),
+        ),
+    ]
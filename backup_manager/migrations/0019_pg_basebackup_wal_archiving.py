@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-17 15:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backup_manager', '0018_binlog_incremental_backups'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='databaseserver',
+            name='dump_engine',
+            field=models.CharField(choices=[('tool', 'mysqldump / pg_dump'), ('mysql_parallel', 'Table-parallel MySQL engine'), ('pg_directory', 'PostgreSQL directory format (pg_dump -Fd -j)'), ('pg_basebackup', 'PostgreSQL physical base backup (pg_basebackup + WAL archiving)')], default='tool', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='backuptask',
+            name='backup_type',
+            field=models.CharField(choices=[('full', 'Full dump'), ('incremental', 'Incremental (MySQL binary logs / PostgreSQL WAL)')], default='full', max_length=15),
+        ),
+        migrations.AlterField(
+            model_name='backuphistory',
+            name='backup_type',
+            field=models.CharField(choices=[('full', 'Full dump'), ('incremental', 'Incremental (MySQL binary logs / PostgreSQL WAL)')], default='full', max_length=15),
+        ),
+        migrations.AddField(
+            model_name='backuphistory',
+            name='wal_lsn',
+            field=models.CharField(blank=True, help_text='PostgreSQL WAL position (LSN) the backup ends at', max_length=32),
+        ),
+    ]
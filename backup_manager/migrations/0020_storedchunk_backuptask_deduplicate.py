@@ -0,0 +1,31 @@
+# Generated by Django 5.2.1 on 2026-10-17 15:50
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backup_manager', '0019_pg_basebackup_wal_archiving'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(help_text='sha256 of the chunk content', max_length=64, unique=True)),
+                ('size', models.IntegerField(help_text='Uncompressed chunk size in bytes')),
+                ('stored_size', models.IntegerField(help_text='Chunk size on disk in bytes')),
+                ('uploaded_to', models.JSONField(blank=True, default=list, help_text='Remote destinations holding the chunk')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used', models.DateTimeField(default=django.utils.timezone.now, help_text='Last time a backup referenced the chunk')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='backuptask',
+            name='deduplicate',
+            field=models.BooleanField(default=False, help_text='Store dumps in the deduplicating chunk store'),
+        ),
+    ]
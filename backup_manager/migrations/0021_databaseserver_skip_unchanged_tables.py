@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-17 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backup_manager', '0020_storedchunk_backuptask_deduplicate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='databaseserver',
+            name='skip_unchanged_tables',
+            field=models.CharField(choices=[('off', 'Dump every table'), ('update_time', 'Skip tables with an unchanged update time'), ('checksum', 'Skip tables with an unchanged checksum')], default='off', help_text='Table-parallel engine: reuse the data files of tables that did not change since the previous backup instead of dumping them again', max_length=20),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.1 on 2026-10-17 17:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backup_manager', '0021_databaseserver_skip_unchanged_tables'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backuphistory',
+            name='progress_phase',
+            field=models.CharField(blank=True, help_text='dump or upload', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='backuphistory',
+            name='progress_bytes',
+            field=models.BigIntegerField(blank=True, help_text='Uncompressed bytes dumped so far', null=True),
+        ),
+        migrations.AddField(
+            model_name='backuphistory',
+            name='progress_rows',
+            field=models.BigIntegerField(blank=True, help_text='Rows dumped so far (table-parallel engine)', null=True),
+        ),
+        migrations.AddField(
+            model_name='backuphistory',
+            name='expected_bytes',
+            field=models.BigIntegerField(blank=True, help_text='Size of the previous run the ETA is based on', null=True),
+        ),
+        migrations.AddField(
+            model_name='backuphistory',
+            name='throughput',
+            field=models.FloatField(blank=True, help_text='Average dump throughput in bytes per second', null=True),
+        ),
+        migrations.AddField(
+            model_name='backuphistory',
+            name='eta_seconds',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='backuphistory',
+            name='progress_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
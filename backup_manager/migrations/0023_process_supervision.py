@@ -0,0 +1,38 @@
+# Generated by Django 5.2.1 on 2026-10-17 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backup_manager', '0022_backuphistory_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backuptask',
+            name='timeout_minutes',
+            field=models.IntegerField(default=0, help_text='Kill the dump when it runs longer than this. 0 means no limit.'),
+        ),
+        migrations.AddField(
+            model_name='backuptask',
+            name='nice_level',
+            field=models.IntegerField(default=0, help_text='CPU priority of the dump processes (nice 0-19, higher is lower priority)'),
+        ),
+        migrations.AddField(
+            model_name='backuptask',
+            name='io_priority',
+            field=models.CharField(choices=[('normal', 'Normal'), ('best_effort', 'Low (best-effort, lowest level)'), ('idle', 'Idle (only when the disk is otherwise idle)')], default='normal', help_text='Disk priority of the dump processes (ionice)', max_length=15),
+        ),
+        migrations.AddField(
+            model_name='backuphistory',
+            name='cancel_requested',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='backuphistory',
+            name='termination_reason',
+            field=models.CharField(blank=True, choices=[('timeout', 'Timed out'), ('cancelled', 'Cancelled')], max_length=10),
+        ),
+    ]
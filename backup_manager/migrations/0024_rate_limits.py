@@ -0,0 +1,43 @@
+# Generated by Django 5.2.1 on 2026-10-17 19:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backup_manager', '0023_process_supervision'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='databaseserver',
+            name='rate_limit',
+            field=models.BigIntegerField(default=0, help_text='Maximum dump throughput in bytes per second. 0 means no limit.'),
+        ),
+        migrations.AddField(
+            model_name='databaseserver',
+            name='rate_limit_burst',
+            field=models.BigIntegerField(default=0, help_text='Bytes allowed above the limit in a burst. 0 means one second of traffic.'),
+        ),
+        migrations.AddField(
+            model_name='databaseserver',
+            name='rate_limit_windows',
+            field=models.TextField(blank=True, help_text="Time-of-day limits overriding the rate, one per line, e.g. '08:00-18:00 10M'. 0 lifts the limit within the window."),
+        ),
+        migrations.AddField(
+            model_name='storageconfig',
+            name='rate_limit',
+            field=models.BigIntegerField(default=0, help_text='Maximum upload throughput in bytes per second. 0 means no limit.'),
+        ),
+        migrations.AddField(
+            model_name='storageconfig',
+            name='rate_limit_burst',
+            field=models.BigIntegerField(default=0, help_text='Bytes allowed above the limit in a burst. 0 means one second of traffic.'),
+        ),
+        migrations.AddField(
+            model_name='storageconfig',
+            name='rate_limit_windows',
+            field=models.TextField(blank=True, help_text="Time-of-day limits overriding the rate, one per line, e.g. '08:00-18:00 10M'. 0 lifts the limit within the window."),
+        ),
+    ]
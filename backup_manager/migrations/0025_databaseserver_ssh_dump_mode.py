@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-17 19:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backup_manager', '0024_rate_limits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='databaseserver',
+            name='ssh_dump_mode',
+            field=models.CharField(choices=[('tunnel', 'Tunnel: dump here through an SSH tunnel'), ('remote', 'Remote: dump and compress on the SSH host')], default='tunnel', help_text='Remote runs mysqldump/pg_dump and the compressor on the SSH host, only compressed data crosses the link', max_length=10),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-17 20:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backup_manager', '0025_databaseserver_ssh_dump_mode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storageconfig',
+            name='encryption_key',
+            field=models.CharField(blank=True, help_text='AES-256 key (base64) encrypting backups sent to this storage. Empty stores them unencrypted. Backups cannot be restored without it.', max_length=64),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-17 20:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backup_manager', '0026_storageconfig_encryption_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backuptask',
+            name='compression_threads',
+            field=models.IntegerField(default=1, help_text='Threads compressing the dump output. 0 uses every CPU core.'),
+        ),
+    ]
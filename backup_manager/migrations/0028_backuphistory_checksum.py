@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-17 21:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backup_manager', '0027_backuptask_compression_threads'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backuphistory',
+            name='checksum',
+            field=models.CharField(blank=True, help_text='SHA-256 of the stored artifact file, computed while it was written', max_length=64),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-17 21:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backup_manager', '0028_backuphistory_checksum'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backuptask',
+            name='split_size',
+            field=models.IntegerField(default=0, help_text='Split dumps into parts of this many MB. 0 keeps a single file.'),
+        ),
+        migrations.AddField(
+            model_name='backuptask',
+            name='upload_workers',
+            field=models.IntegerField(default=4, help_text='Parts of a split dump uploaded at the same time'),
+        ),
+    ]
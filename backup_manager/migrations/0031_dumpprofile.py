@@ -0,0 +1,34 @@
+# Generated by Django 5.2.1 on 2026-10-17 22:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backup_manager', '0030_alter_databaseserver_dump_engine'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DumpProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('mode', models.CharField(choices=[('auto', 'Auto: chosen from table sizes and storage engines'), ('manual', 'Manual: the options below')], default='auto', max_length=10)),
+                ('single_transaction', models.BooleanField(default=True, help_text='Consistent InnoDB snapshot without table locks (--single-transaction). Off locks the tables of each database while it is dumped.')),
+                ('quick', models.BooleanField(default=True, help_text='Stream rows instead of buffering whole tables in memory (--quick)')),
+                ('extended_insert', models.BooleanField(default=True, help_text='Write multi-row INSERT statements (--extended-insert)')),
+                ('net_buffer_length', models.IntegerField(default=0, help_text='Maximum size of a multi-row INSERT statement in bytes (--net-buffer-length, up to 16 MB). 0 keeps the mysqldump default.')),
+                ('pg_compression_level', models.IntegerField(blank=True, help_text='pg_dump -Z level of directory format dumps. Empty follows the compression level of the schedule.', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='databaseserver',
+            name='dump_profile',
+            field=models.ForeignKey(blank=True, help_text='Options of mysqldump and pg_dump. Empty uses --single-transaction --quick and the compression level of the schedule.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='servers', to='backup_manager.dumpprofile'),
+        ),
+    ]
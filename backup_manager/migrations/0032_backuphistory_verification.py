@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-17 22:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backup_manager', '0031_dumpprofile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backuphistory',
+            name='restore_seconds',
+            field=models.FloatField(blank=True, help_text='Duration of the verification restore (measured RTO)', null=True),
+        ),
+        migrations.AddField(
+            model_name='backuphistory',
+            name='verification_message',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='backuphistory',
+            name='verification_status',
+            field=models.CharField(blank=True, choices=[('pending', 'Verifying'), ('passed', 'Verified'), ('failed', 'Verification failed')], max_length=10),
+        ),
+        migrations.AddField(
+            model_name='backuphistory',
+            name='verified_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-17 22:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('backup_manager', '0032_backuphistory_verification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backuptask',
+            name='table_index',
+            field=models.BooleanField(default=True, help_text='Index dumps by table for single table restores, block compression makes them slightly larger'),
+        ),
+    ]
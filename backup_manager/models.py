@@ -30,6 +30,22 @@ class DatabaseServer(models.Model):
         ('direct_postgresql', 'PostgreSQL (TCP/IP)'),
         ('ssh_postgresql', 'PostgreSQL (SSH Tunnel)'),
     )
+    DUMP_ENGINES = (
+        ('tool', 'mysqldump / pg_dump'),
+        ('mysql_parallel', 'Table-parallel MySQL engine'),
+        ('pg_directory', 'PostgreSQL directory format (pg_dump -Fd -j)'),
+        ('pg_basebackup', 'PostgreSQL physical base backup (pg_basebackup + WAL archiving)'),
+        ('pg_copy', 'Native PostgreSQL engine (COPY over parallel connections)'),
+    )
+    SSH_DUMP_MODES = (
+        ('tunnel', 'Tunnel: dump here through an SSH tunnel'),
+        ('remote', 'Remote: dump and compress on the SSH host'),
+    )
+    CHANGE_DETECTION_CHOICES = (
+        ('off', 'Dump every table'),
+        ('update_time', 'Skip tables with an unchanged update time'),
+        ('checksum', 'Skip tables with an unchanged checksum'),
+    )
     
     name = models.CharField(max_length=100)
     connection_type = models.CharField(max_length=20, choices=CONNECTION_TYPES)
@@ -46,6 +62,36 @@ class DatabaseServer(models.Model):
     ssh_username = models.CharField(max_length=100, blank=True, null=True)
     ssh_password = models.CharField(max_length=255, blank=True, null=True)
     ssh_key_file = models.FileField(upload_to='ssh_keys/', blank=True, null=True)
+    ssh_dump_mode = models.CharField(max_length=10, choices=SSH_DUMP_MODES, default='tunnel',
+                                     help_text="Remote runs mysqldump/pg_dump and the compressor on the SSH host, "
+                                               "only compressed data crosses the link")
+    
+    # Dump settings
+    dump_engine = models.CharField(max_length=20, choices=DUMP_ENGINES, default='tool')
+    parallel_workers = models.IntegerField(default=1,
+                                           help_text="Number of concurrent dump workers: databases dumped at once when backing up "
+                                                     "all databases, connections used by the table-parallel and native engines, or "
+                                                     "pg_dump/pg_restore jobs (-j) for directory format.")
+    chunk_rows = models.IntegerField(default=500000,
+                                     help_text="Tables with more rows are split into primary key ranges by the table-parallel engine")
+    binlog_backups = models.BooleanField(default=False,
+                                         help_text="Record binary log positions in full MySQL dumps so incremental backups can "
+                                                   "continue from them (requires log_bin and RELOAD, REPLICATION CLIENT and "
+                                                   "REPLICATION SLAVE privileges)")
+    skip_unchanged_tables = models.CharField(max_length=20, choices=CHANGE_DETECTION_CHOICES, default='off',
+                                             help_text="Table-parallel engine: reuse the data files of tables that did not "
+                                                       "change since the previous backup instead of dumping them again")
+    rate_limit = models.BigIntegerField(default=0,
+                                        help_text="Maximum dump throughput in bytes per second. 0 means no limit.")
+    rate_limit_burst = models.BigIntegerField(default=0,
+                                              help_text="Bytes allowed above the limit in a burst. 0 means one second of traffic.")
+    rate_limit_windows = models.TextField(blank=True,
+                                          help_text="Time-of-day limits overriding the rate, one per line, e.g. "
+                                                    "'08:00-18:00 10M'. 0 lifts the limit within the window.")
+    dump_profile = models.ForeignKey('DumpProfile', on_delete=models.SET_NULL, null=True, blank=True,
+                                     related_name='servers',
+                                     help_text="Options of mysqldump and pg_dump. Empty uses --single-transaction --quick "
+                                               "and the compression level of the schedule.")
     
     # Server status
     last_status = models.BooleanField(default=False)
@@ -73,6 +119,11 @@ class DatabaseServer(models.Model):
         super().save(*args, **kwargs)
 
 class BackupTask(models.Model):
+    BACKUP_TYPE_CHOICES = (
+        ('full', 'Full dump'),
+        ('incremental', 'Incremental (MySQL binary logs / PostgreSQL WAL)'),
+    )
+
     FREQUENCY_CHOICES = (
         ('daily', 'Daily'),
         ('weekly', 'Weekly'),
@@ -95,6 +146,16 @@ class BackupTask(models.Model):
         ('sftp', 'SFTP Server'),
         ('gdrive', 'Google Drive'),
     )
+    IO_PRIORITY_CHOICES = (
+        ('normal', 'Normal'),
+        ('best_effort', 'Low (best-effort, lowest level)'),
+        ('idle', 'Idle (only when the disk is otherwise idle)'),
+    )
+    COMPRESSION_CHOICES = (
+        ('none', 'None'),
+        ('gzip', 'Gzip'),
+        ('zstd', 'Zstandard'),
+    )
     
     name = models.CharField(max_length=100)
     server = models.ForeignKey('DatabaseServer', on_delete=models.CASCADE, related_name='backup_tasks')
@@ -131,6 +192,45 @@ class BackupTask(models.Model):
     gdrive_credentials_file = models.FileField(upload_to='gdrive_creds/', blank=True, null=True,
                                          help_text="JSON credentials file")
 
+    # Dump output is compressed while streaming, no uncompressed file is written
+    compression = models.CharField(max_length=10, choices=COMPRESSION_CHOICES, default='none')
+    compression_level = models.IntegerField(null=True, blank=True,
+                                            help_text="Compression level (gzip 1-9, zstd 1-22). Leave empty for default.")
+    compression_threads = models.IntegerField(default=1,
+                                              help_text="Threads compressing the dump output. 0 uses every CPU core.")
+
+    # Dump output is split into content-defined chunks stored once in the chunk store
+    deduplicate = models.BooleanField(default=False,
+                                      help_text="Store dumps in the deduplicating chunk store")
+
+    # Plain SQL dumps are compressed in independent blocks and indexed by table
+    table_index = models.BooleanField(default=True,
+                                      help_text="Index dumps by table for single table restores, "
+                                                "block compression makes them slightly larger")
+
+    # Incremental runs copy binary logs written since the previous backup of the chain
+    backup_type = models.CharField(max_length=15, choices=BACKUP_TYPE_CHOICES, default='full')
+
+    # Upload to remote storage while the dump is running instead of after it
+    stream_upload = models.BooleanField(default=False,
+                                        help_text="Upload to remote storage while dumping (FTP, SFTP, Google Drive)")
+    keep_local_copy = models.BooleanField(default=True,
+                                          help_text="Keep a local copy of streamed backups")
+
+    # Dump output split into fixed-size parts, uploaded in parallel and retried one by one
+    split_size = models.IntegerField(default=0,
+                                     help_text="Split dumps into parts of this many MB. 0 keeps a single file.")
+    upload_workers = models.IntegerField(default=4,
+                                         help_text="Parts of a split dump uploaded at the same time")
+
+    # Limits of the dump processes, enforced by ProcessSupervisor
+    timeout_minutes = models.IntegerField(default=0,
+                                          help_text="Kill the dump when it runs longer than this. 0 means no limit.")
+    nice_level = models.IntegerField(default=0,
+                                     help_text="CPU priority of the dump processes (nice 0-19, higher is lower priority)")
+    io_priority = models.CharField(max_length=15, choices=IO_PRIORITY_CHOICES, default='normal',
+                                   help_text="Disk priority of the dump processes (ionice)")
+
     def __str__(self):
         return f"{self.name} ({self.get_frequency_display()} - {self.server.name})"
     
@@ -211,6 +311,11 @@ class BackupHistory(models.Model):
         ('error', 'Error'),
         ('pending', 'In progress'),
     )
+    VERIFICATION_CHOICES = (
+        ('pending', 'Verifying'),
+        ('passed', 'Verified'),
+        ('failed', 'Verification failed'),
+    )
     
     server = models.ForeignKey('DatabaseServer', on_delete=models.CASCADE)
     task = models.ForeignKey('BackupTask', on_delete=models.SET_NULL, null=True, blank=True)
@@ -219,23 +324,97 @@ class BackupHistory(models.Model):
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
     file_path = models.CharField(max_length=255, blank=True)
     file_size = models.BigIntegerField(null=True, blank=True)
+    raw_size = models.BigIntegerField(null=True, blank=True, help_text="Uncompressed dump size in bytes")
+    checksum = models.CharField(max_length=64, blank=True,
+                                help_text="SHA-256 of the stored artifact file, computed while it was written")
     error_message = models.TextField(blank=True)
     description = models.TextField(blank=True, help_text="Operation description or additional information")
+
+    # Backup chain: an incremental backup continues from the binlog position of its parent
+    backup_type = models.CharField(max_length=15, choices=BackupTask.BACKUP_TYPE_CHOICES, default='full')
+    parent = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='incrementals')
+    binlog_file = models.CharField(max_length=255, blank=True, help_text="Binary log the backup ends in")
+    binlog_position = models.BigIntegerField(null=True, blank=True, help_text="Position in binlog_file the backup ends at")
+    wal_lsn = models.CharField(max_length=32, blank=True, help_text="PostgreSQL WAL position (LSN) the backup ends at")
+
+    # Live progress, updated every few seconds while the backup runs
+    progress_phase = models.CharField(max_length=10, blank=True, help_text="dump or upload")
+    progress_bytes = models.BigIntegerField(null=True, blank=True, help_text="Uncompressed bytes dumped so far")
+    progress_rows = models.BigIntegerField(null=True, blank=True, help_text="Rows dumped so far (table-parallel engine)")
+    expected_bytes = models.BigIntegerField(null=True, blank=True, help_text="Size of the previous run the ETA is based on")
+    throughput = models.FloatField(null=True, blank=True, help_text="Average dump throughput in bytes per second")
+    eta_seconds = models.IntegerField(null=True, blank=True)
+    progress_updated_at = models.DateTimeField(null=True, blank=True)
+
+    # Set from the UI, the supervisor of the running backup kills its processes
+    cancel_requested = models.BooleanField(default=False)
+    termination_reason = models.CharField(max_length=10, blank=True,
+                                          choices=(('timeout', 'Timed out'), ('cancelled', 'Cancelled')))
+
+    # Restore verification into a scratch database (backup_manager.verify)
+    verification_status = models.CharField(max_length=10, blank=True, choices=VERIFICATION_CHOICES)
+    verified_at = models.DateTimeField(null=True, blank=True)
+    restore_seconds = models.FloatField(null=True, blank=True, help_text="Duration of the verification restore (measured RTO)")
+    verification_message = models.TextField(blank=True)
     
     def __str__(self):
         return f"Backup {self.server.name} ({self.started_at.strftime('%Y-%m-%d %H:%M')})"
 
+    def restore_chain(self):
+        """Backups to restore in order: the full backup, then incrementals up to this one"""
+        chain = [self]
+        while chain[0].parent_id:
+            chain.insert(0, chain[0].parent)
+        return chain
+
     def get_filename(self):
         if self.file_path:
             return os.path.basename(self.file_path)
         return None
     
     def is_restorable(self):
-        return self.status == 'success' and self.file_path and os.path.exists(self.file_path)
+        if self.status != 'success' or not self.file_path or not os.path.exists(self.file_path):
+            return False
+        if self.backup_type == 'incremental':
+            chain = self.restore_chain()
+            return chain[0].backup_type == 'full' and all(b.has_file() for b in chain)
+        return True
 
     def has_file(self):
         return bool(self.file_path and os.path.exists(self.file_path))
 
+    def progress_percent(self):
+        if not self.expected_bytes or self.progress_bytes is None:
+            return None
+        return min(99, int(self.progress_bytes * 100 / self.expected_bytes))
+
+    def progress_data(self):
+        """Progress fields as returned by the progress API"""
+        return {
+            'id': self.id,
+            'status': self.status,
+            'phase': self.progress_phase,
+            'bytes': self.progress_bytes,
+            'rows': self.progress_rows,
+            'expected_bytes': self.expected_bytes,
+            'percent': self.progress_percent(),
+            'throughput': self.throughput,
+            'eta_seconds': self.eta_seconds,
+            'updated_at': self.progress_updated_at.isoformat() if self.progress_updated_at else None,
+        }
+
+class StoredChunk(models.Model):
+    """Index of the deduplicating chunk store, one row per distinct chunk"""
+    digest = models.CharField(max_length=64, unique=True, help_text="sha256 of the chunk content")
+    size = models.IntegerField(help_text="Uncompressed chunk size in bytes")
+    stored_size = models.IntegerField(help_text="Chunk size on disk in bytes")
+    uploaded_to = models.JSONField(default=list, blank=True, help_text="Remote destinations holding the chunk")
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used = models.DateTimeField(default=timezone.now, help_text="Last time a backup referenced the chunk")
+
+    def __str__(self):
+        return self.digest
+
 class StorageConfig(models.Model):
     """Model for storage configuration"""
     STORAGE_CHOICES = (
@@ -266,6 +445,17 @@ class StorageConfig(models.Model):
     gdrive_credentials_file = models.FileField(upload_to='gdrive_creds/', blank=True, null=True,
                                          help_text="JSON credentials file")
 
+    rate_limit = models.BigIntegerField(default=0,
+                                        help_text="Maximum upload throughput in bytes per second. 0 means no limit.")
+    rate_limit_burst = models.BigIntegerField(default=0,
+                                              help_text="Bytes allowed above the limit in a burst. 0 means one second of traffic.")
+    rate_limit_windows = models.TextField(blank=True,
+                                          help_text="Time-of-day limits overriding the rate, one per line, e.g. "
+                                                    "'08:00-18:00 10M'. 0 lifts the limit within the window.")
+
+    encryption_key = models.CharField(max_length=64, blank=True,
+                                      help_text="AES-256 key (base64) encrypting backups sent to this storage. "
+                                                "Empty stores them unencrypted. Backups cannot be restored without it.")
     
     def __str__(self):
         return f"{self.name} ({self.get_storage_type_display()})"
@@ -276,6 +466,39 @@ class StorageConfig(models.Model):
             StorageConfig.objects.filter(is_default=True).exclude(id=self.id).update(is_default=False)
         super().save(*args, **kwargs)
 
+class DumpProfile(models.Model):
+    """Tuning of the dump tools of the servers it is attached to"""
+    MODES = (
+        ('auto', 'Auto: chosen from table sizes and storage engines'),
+        ('manual', 'Manual: the options below'),
+    )
+    
+    name = models.CharField(max_length=100)
+    mode = models.CharField(max_length=10, choices=MODES, default='auto')
+    
+    # mysqldump options
+    single_transaction = models.BooleanField(default=True,
+                                             help_text="Consistent InnoDB snapshot without table locks (--single-transaction). "
+                                                       "Off locks the tables of each database while it is dumped.")
+    quick = models.BooleanField(default=True,
+                                help_text="Stream rows instead of buffering whole tables in memory (--quick)")
+    extended_insert = models.BooleanField(default=True,
+                                          help_text="Write multi-row INSERT statements (--extended-insert)")
+    net_buffer_length = models.IntegerField(default=0,
+                                            help_text="Maximum size of a multi-row INSERT statement in bytes "
+                                                      "(--net-buffer-length, up to 16 MB). 0 keeps the mysqldump default.")
+    
+    # pg_dump options
+    pg_compression_level = models.IntegerField(null=True, blank=True,
+                                               help_text="pg_dump -Z level of directory format dumps. "
+                                                         "Empty follows the compression level of the schedule.")
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name} ({self.get_mode_display()})"
+
 class AppSettings(models.Model):
     """Model for application settings"""
     key = models.CharField(max_length=50, unique=True)
@@ -0,0 +1,583 @@
+# backup_manager/mysql_engine.py
+import os
+import math
+import queue
+import shutil
+import hashlib
+import decimal
+import datetime
+import threading
+import mysql.connector
+from .models import file_log
+from .pipeline import open_artifact_writer, artifact_extension, new_checksum
+
+# Rows fetched from the server per round trip
+FETCH_ROWS = 1000
+
+# Size cap of one multi-row INSERT statement in characters, lowered for a small max_allowed_packet of the server
+MAX_STATEMENT_BYTES = 1024 * 1024
+
+INTEGER_TYPES = ('tinyint', 'smallint', 'mediumint', 'int', 'bigint')
+
+# EXTRA of generated columns, their values are computed on restore. MySQL 8 reports
+# DEFAULT_GENERATED for columns with an expression default, those hold stored values.
+GENERATED_COLUMN_EXTRAS = ('VIRTUAL GENERATED', 'STORED GENERATED', 'PERSISTENT GENERATED')
+
+# Databases never dumped by the engine (users and grants are not part of the backup)
+SYSTEM_DATABASES = ('information_schema', 'performance_schema', 'sys', 'mysql')
+
+SESSION_HEADER = (
+    "SET NAMES utf8mb4;\n"
+    "SET FOREIGN_KEY_CHECKS=0;\n"
+    "SET UNIQUE_CHECKS=0;\n"
+    "SET SQL_MODE='NO_AUTO_VALUE_ON_ZERO';\n"
+)
+
+_ESCAPE_TABLE = str.maketrans({
+    '\0': '\\0',
+    '\n': '\\n',
+    '\r': '\\r',
+    '\\': '\\\\',
+    "'": "\\'",
+    '"': '\\"',
+    '\x1a': '\\Z',
+})
+
+
+def quote_identifier(name):
+    """Quote MySQL identifier with backticks"""
+    return '`' + name.replace('`', '``') + '`'
+
+
+def _time_literal(value):
+    """Format timedelta returned for TIME columns as [-]HH:MM:SS[.ffffff]"""
+    total = value.days * 86400 + value.seconds
+    sign = ''
+    microseconds = value.microseconds
+    if total < 0:
+        sign = '-'
+        total = -total - (1 if microseconds else 0)
+        microseconds = (1000000 - microseconds) % 1000000
+    hours, rest = divmod(total, 3600)
+    minutes, seconds = divmod(rest, 60)
+    text = f"{sign}{hours:02d}:{minutes:02d}:{seconds:02d}"
+    if microseconds:
+        text += f".{microseconds:06d}"
+    return f"'{text}'"
+
+
+def sql_literal(value):
+    """Convert a value returned by mysql.connector to a SQL literal"""
+    if value is None:
+        return 'NULL'
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, (int, float, decimal.Decimal)):
+        return str(value)
+    if isinstance(value, (bytes, bytearray)):
+        return f"X'{bytes(value).hex()}'" if value else "''"
+    if isinstance(value, datetime.timedelta):
+        return _time_literal(value)
+    if isinstance(value, set):
+        value = ','.join(sorted(value))
+    return "'" + str(value).translate(_ESCAPE_TABLE) + "'"
+
+
+class ParallelMySQLDumper:
+    """
+    Dumps MySQL databases over several connections sharing one consistent snapshot.
+
+    Tables are dumped in parallel, tables larger than chunk_rows are split into
+    primary key ranges. Every schema, data chunk and post-data file is written as
+    its own compressed artifact, the returned entries are meant for a manifest.
+
+    With change_detection set, every table gets a fingerprint and the data files
+    of tables whose fingerprint matches the previous manifest are linked from it
+    instead of being dumped again.
+    """
+
+    def __init__(self, connect_params, databases, output_dir, prefix,
+                 workers=4, chunk_rows=500000, compression='none', level=None,
+                 change_detection='off', previous=None, progress=None, supervisor=None,
+                 limiter=None, cipher=None):
+        self.connect_params = dict(connect_params, charset='utf8mb4', use_unicode=True)
+        self.databases = [db for db in databases if db not in SYSTEM_DATABASES]
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.workers = max(1, workers)
+        self.chunk_rows = max(1, chunk_rows)
+        self.compression = compression
+        self.level = level
+        self.extension = artifact_extension(compression)
+        self.binlog_position = None
+        self.change_detection = change_detection
+        self.previous = previous
+        self.progress = progress
+        self.supervisor = supervisor
+        self.limiter = limiter
+        self.cipher = cipher
+        self.fingerprints = []
+        self.carried_tables = 0
+        self.statement_bytes = MAX_STATEMENT_BYTES
+        self._schema_digests = {}
+        self._update_times = {}
+
+    def _connect(self):
+        return mysql.connector.connect(**self.connect_params)
+
+    def run(self):
+        """Run the dump and return manifest entries in restore order"""
+        connections = self._open_snapshot_connections()
+        try:
+            schema_entries, post_entries, chunks = [], [], []
+            for database in self.databases:
+                schema_entries.append(self._dump_schema(connections[0], database))
+                chunks.extend(self._plan_chunks(connections[0], database))
+                post_entry = self._dump_post_data(connections[0], database)
+                if post_entry:
+                    post_entries.append(post_entry)
+
+            fingerprints = self._table_fingerprints(connections, chunks)
+            chunks, carried_entries = self._carry_forward(chunks, fingerprints)
+
+            file_log(f"MYSQL ENGINE: {len(chunks)} data chunks over {len(connections)} connections")
+            data_entries = carried_entries + self._dump_chunks(connections, chunks)
+            self.fingerprints = [[db, table, value] for (db, table), value in fingerprints.items()]
+        finally:
+            for conn in connections:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+        return schema_entries + data_entries + post_entries
+
+    def _open_snapshot_connections(self):
+        """
+        Open worker connections that all see the same snapshot: writes are blocked
+        with FLUSH TABLES WITH READ LOCK while every connection starts its transaction.
+        """
+        lock_conn = self._connect()
+        lock_cursor = lock_conn.cursor()
+        connections = []
+        try:
+            lock_cursor.execute("FLUSH TABLES WITH READ LOCK")
+            for _ in range(self.workers):
+                conn = self._connect()
+                cursor = conn.cursor()
+                cursor.execute("SET SESSION TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+                cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+                cursor.close()
+                connections.append(conn)
+            self.binlog_position = self._read_binlog_position(lock_cursor)
+            self.statement_bytes = self._statement_limit(lock_cursor)
+            if self.change_detection == 'update_time':
+                self._update_times = self._read_update_times(lock_cursor)
+        except Exception:
+            for conn in connections:
+                conn.close()
+            raise
+        finally:
+            try:
+                lock_cursor.execute("UNLOCK TABLES")
+                lock_cursor.close()
+            finally:
+                lock_conn.close()
+
+        file_log(f"MYSQL ENGINE: snapshot taken at binlog position {self.binlog_position}")
+        return connections
+
+    @staticmethod
+    def _statement_limit(cursor):
+        """INSERT size cap in characters, a character takes up to 4 bytes of max_allowed_packet in utf8mb4"""
+        cursor.execute("SELECT @@max_allowed_packet")
+        max_packet = int(cursor.fetchone()[0])
+        return max(16 * 1024, min(MAX_STATEMENT_BYTES, max_packet // 4))
+
+    @staticmethod
+    def _read_binlog_position(cursor):
+        """Binlog coordinates of the snapshot, None when binary logging is disabled"""
+        for statement in ("SHOW MASTER STATUS", "SHOW BINARY LOG STATUS"):
+            try:
+                cursor.execute(statement)
+                row = cursor.fetchone()
+                cursor.fetchall()
+                if row:
+                    return {'file': row[0], 'position': int(row[1])}
+                return None
+            except mysql.connector.Error:
+                continue
+        return None
+
+    def _read_update_times(self, cursor):
+        """
+        Table update times read while writes are blocked, so they match the snapshot.
+        Tables with an unknown update time (InnoDB after a restart) or one within
+        the current second are left out, they are always dumped.
+        """
+        try:
+            # MySQL 8 caches table statistics for a day by default
+            cursor.execute("SET SESSION information_schema_stats_expiry = 0")
+        except mysql.connector.Error:
+            pass
+        cursor.execute("SELECT NOW()")
+        now = cursor.fetchone()[0]
+        placeholders = ', '.join(['%s'] * len(self.databases))
+        cursor.execute(
+            "SELECT TABLE_SCHEMA, TABLE_NAME, ENGINE, CREATE_TIME, UPDATE_TIME FROM information_schema.TABLES "
+            f"WHERE TABLE_TYPE = 'BASE TABLE' AND TABLE_SCHEMA IN ({placeholders})",
+            tuple(self.databases)
+        )
+        update_times = {}
+        for database, table, engine, created, updated in cursor.fetchall():
+            if updated is None or updated >= now:
+                continue
+            update_times[(database, table)] = f"{engine}:{created}:{updated}"
+        return update_times
+
+    def _table_checksum(self, conn, database, table, columns):
+        """Row count and order independent row hashes computed inside the snapshot"""
+        row_text = 'CONCAT_WS(\'#\', ' + ', '.join(
+            f"{quote_identifier(c)}, ISNULL({quote_identifier(c)})" for c in columns
+        ) + ')'
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                f"SELECT COUNT(*), BIT_XOR(CRC32({row_text})), SUM(CRC32({row_text})) "
+                f"FROM {quote_identifier(database)}.{quote_identifier(table)}"
+            )
+            count, xor, total = cursor.fetchone()
+        finally:
+            cursor.close()
+        return f"{count}:{xor}:{total}"
+
+    def _table_fingerprints(self, connections, chunks):
+        """
+        Fingerprint of every planned table: the digest of its CREATE TABLE statement
+        combined with its update time or checksum. Tables without a reliable
+        fingerprint are missing from the result.
+        """
+        if self.change_detection not in ('update_time', 'checksum'):
+            return {}
+
+        tables = {}
+        for chunk in chunks:
+            tables.setdefault((chunk['database'], chunk['table']), chunk['columns'])
+
+        if self.change_detection == 'checksum':
+            keys = list(tables)
+            results = self._run_parallel(
+                connections, keys,
+                lambda conn, key: self._table_checksum(conn, key[0], key[1], tables[key]),
+                lambda key: f"{key[0]}.{key[1]} checksum"
+            )
+            values = dict(zip(keys, results))
+        else:
+            values = self._update_times
+
+        return {
+            key: f"{self._schema_digests[key]}:{values[key]}"
+            for key in tables
+            if key in values and key in self._schema_digests
+        }
+
+    def _previous_tables(self):
+        """Fingerprints and data entries of the tables in the previous manifest"""
+        if not self.previous:
+            return {}
+        previous = {
+            (database, table): {'fingerprint': value, 'entries': []}
+            for database, table, value in self.previous.get('fingerprints', [])
+        }
+        for entry in self.previous['artifacts']:
+            key = (entry['database'], entry['table'])
+            if entry['phase'] == 'data' and key in previous:
+                previous[key]['entries'].append(entry)
+        return previous
+
+    def _carry_forward(self, chunks, fingerprints):
+        """
+        Link the data files of unchanged tables from the previous backup. Returns
+        the chunks still to dump and manifest entries of the linked files.
+        """
+        previous = self._previous_tables()
+        carried = set()
+        entries = []
+
+        for key, value in fingerprints.items():
+            table = previous.get(key)
+            if not table or table['fingerprint'] != value or not table['entries']:
+                continue
+            if not all(os.path.exists(entry['path']) for entry in table['entries']):
+                continue
+
+            for entry in table['entries']:
+                # Keep the extension, the previous backup may use another compression
+                suffix = entry['file'][entry['file'].rindex('.sql'):]
+                filename = f"{self.prefix}_{key[0]}.{key[1]}.{entry['chunk']:05d}{suffix}"
+                target = os.path.join(self.output_dir, filename)
+                try:
+                    os.link(entry['path'], target)
+                except OSError:
+                    shutil.copyfile(entry['path'], target)
+                carried_entry = {k: v for k, v in entry.items() if k != 'path'}
+                carried_entry['file'] = filename
+                carried_entry['carried_from'] = os.path.basename(entry['path'])
+                entries.append(carried_entry)
+                if self.progress:
+                    self.progress.add(entry['raw_size'])
+            carried.add(key)
+
+        self.carried_tables = len(carried)
+        if carried:
+            file_log(f"MYSQL ENGINE: {len(carried)} unchanged tables linked from the previous backup")
+        return [c for c in chunks if (c['database'], c['table']) not in carried], entries
+
+    def _entry(self, database, phase, filename, raw_size, file_size, checksum, table=None, chunk=None):
+        return {
+            'database': database,
+            'table': table,
+            'chunk': chunk,
+            'phase': phase,
+            'file': filename,
+            'raw_size': raw_size,
+            'file_size': file_size,
+            'checksum': checksum,
+        }
+
+    def _write_file(self, filename, parts):
+        """Write an iterable of SQL strings into a compressed artifact file, returns its sizes and checksum"""
+        path = os.path.join(self.output_dir, filename)
+        raw_size = 0
+        digest = new_checksum()
+        with open_artifact_writer(path, self.compression, self.level, self.cipher, digest=digest) as out:
+            for part in parts:
+                data = part.encode('utf-8')
+                out.write(data)
+                raw_size += len(data)
+                if self.progress:
+                    self.progress.add(len(data))
+                if self.limiter:
+                    self.limiter.consume(len(data))
+        return raw_size, os.path.getsize(path), digest.hexdigest()
+
+    def _base_tables(self, cursor, database):
+        cursor.execute(
+            "SELECT TABLE_NAME, TABLE_ROWS FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = %s AND TABLE_TYPE = 'BASE TABLE' ORDER BY TABLE_NAME",
+            (database,)
+        )
+        return cursor.fetchall()
+
+    def _dump_schema(self, conn, database):
+        """Write CREATE DATABASE and CREATE TABLE statements of a database"""
+        cursor = conn.cursor()
+        db = quote_identifier(database)
+        parts = [
+            SESSION_HEADER,
+            f"CREATE DATABASE IF NOT EXISTS {db};\n",
+            f"USE {db};\n",
+        ]
+        for table, _ in self._base_tables(cursor, database):
+            cursor.execute(f"SHOW CREATE TABLE {db}.{quote_identifier(table)}")
+            create_statement = cursor.fetchone()[1]
+            self._schema_digests[(database, table)] = hashlib.sha256(create_statement.encode('utf-8')).hexdigest()[:16]
+            parts.append(f"\nDROP TABLE IF EXISTS {quote_identifier(table)};\n{create_statement};\n")
+        cursor.close()
+
+        filename = f"{self.prefix}_{database}-schema.sql{self.extension}"
+        raw_size, file_size, checksum = self._write_file(filename, parts)
+        return self._entry(database, 'schema', filename, raw_size, file_size, checksum)
+
+    def _dump_post_data(self, conn, database):
+        """Write views and triggers, restored after all data is loaded"""
+        cursor = conn.cursor()
+        db = quote_identifier(database)
+        parts = [SESSION_HEADER, f"USE {db};\n"]
+
+        cursor.execute(
+            "SELECT TABLE_NAME FROM information_schema.VIEWS WHERE TABLE_SCHEMA = %s ORDER BY TABLE_NAME",
+            (database,)
+        )
+        for (view,) in cursor.fetchall():
+            cursor.execute(f"SHOW CREATE VIEW {db}.{quote_identifier(view)}")
+            create_statement = cursor.fetchone()[1]
+            parts.append(f"\nDROP VIEW IF EXISTS {quote_identifier(view)};\n{create_statement};\n")
+
+        cursor.execute(
+            "SELECT TRIGGER_NAME FROM information_schema.TRIGGERS WHERE TRIGGER_SCHEMA = %s ORDER BY TRIGGER_NAME",
+            (database,)
+        )
+        for (trigger,) in cursor.fetchall():
+            cursor.execute(f"SHOW CREATE TRIGGER {db}.{quote_identifier(trigger)}")
+            create_statement = cursor.fetchone()[2]
+            parts.append(
+                f"\nDROP TRIGGER IF EXISTS {quote_identifier(trigger)};\n"
+                f"DELIMITER ;;\n{create_statement};;\nDELIMITER ;\n"
+            )
+        cursor.close()
+
+        if len(parts) == 2:
+            return None
+
+        filename = f"{self.prefix}_{database}-post.sql{self.extension}"
+        raw_size, file_size, checksum = self._write_file(filename, parts)
+        return self._entry(database, 'post', filename, raw_size, file_size, checksum)
+
+    def _plan_chunks(self, conn, database):
+        """Split every table into chunks, large tables by integer primary key ranges"""
+        cursor = conn.cursor()
+        db = quote_identifier(database)
+        chunks = []
+
+        for table, estimated_rows in self._base_tables(cursor, database):
+            cursor.execute(
+                "SELECT COLUMN_NAME, DATA_TYPE, COLUMN_KEY FROM information_schema.COLUMNS "
+                "WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s AND EXTRA NOT IN (%s, %s, %s) "
+                "ORDER BY ORDINAL_POSITION",
+                (database, table) + GENERATED_COLUMN_EXTRAS
+            )
+            columns = cursor.fetchall()
+            column_names = [name for name, _, _ in columns]
+            primary_key = [(name, data_type) for name, data_type, key in columns if key == 'PRI']
+
+            ranges = [None]
+            estimated_rows = estimated_rows or 0
+            if estimated_rows > self.chunk_rows and len(primary_key) == 1 and primary_key[0][1] in INTEGER_TYPES:
+                pk = quote_identifier(primary_key[0][0])
+                cursor.execute(f"SELECT MIN({pk}), MAX({pk}) FROM {db}.{quote_identifier(table)}")
+                low, high = cursor.fetchone()
+                if low is not None:
+                    count = math.ceil(estimated_rows / self.chunk_rows)
+                    step = max(1, math.ceil((high - low + 1) / count))
+                    ranges = [
+                        (primary_key[0][0], start, min(start + step, high + 1))
+                        for start in range(low, high + 1, step)
+                    ]
+
+            for number, key_range in enumerate(ranges):
+                chunks.append({
+                    'database': database,
+                    'table': table,
+                    'columns': column_names,
+                    'range': key_range,
+                    'chunk': number,
+                    'estimated_rows': estimated_rows / len(ranges),
+                    'file': f"{self.prefix}_{database}.{table}.{number:05d}.sql{self.extension}",
+                })
+
+        cursor.close()
+        return chunks
+
+    def _insert_batches(self, table, column_list, rows):
+        """
+        Group row literals into multi-row INSERT statements of at most
+        statement_bytes, a single larger row gets a statement of its own.
+        """
+        prefix = f"INSERT INTO {table} ({column_list}) VALUES\n"
+        batch, size = [], len(prefix)
+        for row in rows:
+            values = '(' + ','.join(sql_literal(value) for value in row) + ')'
+            if batch and size + len(values) + 2 > self.statement_bytes:
+                yield prefix + ',\n'.join(batch) + ';\n'
+                batch, size = [], len(prefix)
+            batch.append(values)
+            size += len(values) + 2
+        if batch:
+            yield prefix + ',\n'.join(batch) + ';\n'
+
+    def _fetch_rows(self, conn, query, params, counted=None):
+        """
+        Yield the rows of a query from an unbuffered cursor, the server streams
+        them and only FETCH_ROWS rows are held at a time. counted['rows'] adds
+        up the rows fetched.
+        """
+        cursor = conn.cursor(buffered=False)
+        cursor.execute(query, params)
+        try:
+            while True:
+                rows = cursor.fetchmany(FETCH_ROWS)
+                if not rows:
+                    break
+                if self.supervisor:
+                    # No tool process to kill, stop at the next batch instead
+                    self.supervisor.check()
+                if self.progress:
+                    self.progress.add(rows=len(rows))
+                if counted is not None:
+                    counted['rows'] += len(rows)
+                yield from rows
+        finally:
+            cursor.close()
+
+    def _chunk_statements(self, conn, chunk, counted=None):
+        """Yield the SQL text of one data chunk as size-capped multi-row INSERT statements"""
+        db = quote_identifier(chunk['database'])
+        table = quote_identifier(chunk['table'])
+        column_list = ', '.join(quote_identifier(c) for c in chunk['columns'])
+
+        query = f"SELECT {column_list} FROM {db}.{table}"
+        params = ()
+        if chunk['range']:
+            pk, start, end = chunk['range']
+            query += f" WHERE {quote_identifier(pk)} >= %s AND {quote_identifier(pk)} < %s"
+            params = (start, end)
+
+        yield SESSION_HEADER
+        yield f"USE {db};\n"
+        yield from self._insert_batches(table, column_list, self._fetch_rows(conn, query, params, counted))
+
+    def _run_parallel(self, connections, items, func, describe):
+        """Call func(conn, item) for every item with one thread per snapshot connection, results in item order"""
+        work = queue.Queue()
+        for index, item in enumerate(items):
+            work.put((index, item))
+
+        results = {}
+        errors = []
+        failed = threading.Event()
+
+        def worker(conn):
+            while not failed.is_set():
+                try:
+                    index, item = work.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    results[index] = func(conn, item)
+                except Exception as e:
+                    errors.append(f"{describe(item)}: {str(e)}")
+                    failed.set()
+
+        threads = [threading.Thread(target=worker, args=(conn,), daemon=True) for conn in connections]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if errors:
+            raise RuntimeError('; '.join(errors))
+
+        return [results[index] for index in range(len(items))]
+
+    def _dump_chunk(self, conn, chunk):
+        counted = {'rows': 0}
+        raw_size, file_size, checksum = self._write_file(chunk['file'], self._chunk_statements(conn, chunk, counted))
+        entry = self._entry(
+            chunk['database'], 'data', chunk['file'], raw_size, file_size, checksum,
+            table=chunk['table'], chunk=chunk['chunk']
+        )
+        # Row count of the snapshot, restore verification compares it with the restored table
+        entry['rows'] = counted['rows']
+        return entry
+
+    def _dump_chunks(self, connections, chunks):
+        """Dump data chunks with one thread per snapshot connection"""
+        # Largest chunks first so the slowest tables do not start last
+        ordered = sorted(chunks, key=lambda c: c['estimated_rows'], reverse=True)
+        entries = self._run_parallel(
+            connections, ordered, self._dump_chunk,
+            lambda chunk: f"{chunk['database']}.{chunk['table']} chunk {chunk['chunk']}"
+        )
+        by_file = {entry['file']: entry for entry in entries}
+        return [by_file[chunk['file']] for chunk in chunks]
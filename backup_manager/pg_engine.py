@@ -0,0 +1,589 @@
+# backup_manager/pg_engine.py
+"""
+Native PostgreSQL engine built on psycopg2, it needs no pg_dump matching the
+server version. The schema is read from the catalogs once per database, every
+table is then streamed with COPY TO STDOUT over several connections sharing
+one exported snapshot. Restores load the per-table files with COPY FROM
+STDIN, again over several connections.
+
+Exported: schemas, extensions, enum types, domains, functions and procedures,
+sequences, tables (partitioned ones included), constraints, indexes, views,
+materialized views and triggers. Roles, grants, ownership, comments, composite
+and range types are not part of the backup. Requires PostgreSQL 10 or newer.
+"""
+import os
+import queue
+import threading
+import psycopg2
+from psycopg2 import extensions
+from .models import file_log
+from .pipeline import open_artifact_writer, open_artifact_reader, artifact_extension, new_checksum, ChecksumCheck
+
+# COPY output collected before it is written to the artifact
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# Objects in these schemas belong to the server, not to the database
+USER_SCHEMA = "n.nspname <> 'information_schema' AND n.nspname !~ '^pg_'"
+
+# Objects created by an extension come back with CREATE EXTENSION
+NOT_EXTENSION_MEMBER = (
+    "NOT EXISTS (SELECT 1 FROM pg_catalog.pg_depend e "
+    "WHERE e.classid = '{catalog}'::regclass AND e.objid = {oid} AND e.deptype = 'e')"
+)
+
+SESSION_HEADER = (
+    "SET client_encoding = 'UTF8';\n"
+    "SET standard_conforming_strings = on;\n"
+    "SET check_function_bodies = false;\n"
+    "SET client_min_messages = warning;\n"
+    "SELECT pg_catalog.set_config('search_path', '', false);\n"
+)
+
+
+def quote_identifier(name):
+    """Quote PostgreSQL identifier with double quotes"""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def quote_literal(value):
+    """Quote a string literal, standard_conforming_strings is on in every session"""
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _qualified(schema, name):
+    return f"{quote_identifier(schema)}.{quote_identifier(name)}"
+
+
+def _column_list(columns):
+    return ', '.join(quote_identifier(c) for c in columns)
+
+
+def _not_member(catalog, oid):
+    return NOT_EXTENSION_MEMBER.format(catalog=catalog, oid=oid)
+
+
+def _fetch(conn, query, params=None):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query, params)
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+
+class _CopyOutput:
+    """File object COPY TO STDOUT writes its rows to, passed on to the artifact in blocks"""
+
+    def __init__(self, out, progress=None, supervisor=None, limiter=None):
+        self.out = out
+        self.progress = progress
+        self.supervisor = supervisor
+        self.limiter = limiter
+        self.raw_size = 0
+        self.rows = 0
+        self._buffer = bytearray()
+
+    def write(self, data):
+        self._buffer.extend(data)
+        if len(self._buffer) >= COPY_BUFFER_SIZE:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        if not self._buffer:
+            return
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        if self.supervisor:
+            # No tool process to kill, stop at the next block instead
+            self.supervisor.check()
+        self.out.write(data)
+        self.raw_size += len(data)
+        # Newlines inside values are escaped in the text format, one line is one row
+        rows = data.count(b'\n')
+        self.rows += rows
+        if self.progress:
+            self.progress.add(len(data), rows=rows)
+        if self.limiter:
+            self.limiter.consume(len(data))
+
+
+class ParallelPostgreSQLDumper:
+    """
+    Dumps PostgreSQL databases over several connections sharing one snapshot.
+
+    For every database the first connection exports its snapshot, the others
+    import it, so all tables are copied as of the same moment. Schema and
+    post-data (constraints, indexes, views, triggers, sequence values) are
+    written as SQL files, table data as COPY text files, each as its own
+    compressed artifact. The returned entries are meant for a manifest.
+    """
+
+    def __init__(self, connect_params, databases, output_dir, prefix,
+                 workers=4, compression='none', level=None, progress=None,
+                 supervisor=None, limiter=None, cipher=None):
+        self.connect_params = dict(connect_params)
+        self.databases = list(databases)
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.workers = max(1, workers)
+        self.compression = compression
+        self.level = level
+        self.extension = artifact_extension(compression)
+        self.progress = progress
+        self.supervisor = supervisor
+        self.limiter = limiter
+        self.cipher = cipher
+        self.server_version = None
+
+    def _connect(self, database):
+        conn = psycopg2.connect(dbname=database, **self.connect_params)
+        conn.set_client_encoding('UTF8')
+        return conn
+
+    def run(self):
+        """Run the dump and return manifest entries in restore order"""
+        schema_entries, data_entries, post_entries = [], [], []
+        for database in self.databases:
+            connections = self._open_snapshot_connections(database)
+            try:
+                self.server_version = connections[0].server_version
+                tables = self._tables(connections[0])
+                self._lock_tables(connections[0], tables)
+                schema_entries.append(self._dump_schema(connections[0], database, tables))
+                post_entries.append(self._dump_post_data(connections[0], database, tables))
+
+                data_tables = [t for t in tables if t['kind'] == 'r']
+                file_log(f"PG ENGINE: {len(data_tables)} tables of {database} over {len(connections)} connections")
+                data_entries.extend(self._dump_tables(connections, database, data_tables))
+            finally:
+                for conn in connections:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+        return schema_entries + data_entries + post_entries
+
+    def _open_snapshot_connections(self, database):
+        """
+        Open worker connections that all see the same snapshot: the first one
+        exports it and keeps its transaction open while the others import it.
+        """
+        leader = self._connect(database)
+        connections = [leader]
+        try:
+            leader.set_session(isolation_level=extensions.ISOLATION_LEVEL_REPEATABLE_READ, readonly=True)
+            snapshot = _fetch(leader, "SELECT pg_catalog.pg_export_snapshot()")[0][0]
+            for _ in range(self.workers - 1):
+                conn = self._connect(database)
+                conn.set_session(isolation_level=extensions.ISOLATION_LEVEL_REPEATABLE_READ, readonly=True)
+                cursor = conn.cursor()
+                cursor.execute("SET TRANSACTION SNAPSHOT %s", (snapshot,))
+                cursor.close()
+                connections.append(conn)
+            # Catalog functions qualify every name they print with an empty search path
+            for conn in connections:
+                _fetch(conn, "SELECT pg_catalog.set_config('search_path', '', false)")
+        except Exception:
+            for conn in connections:
+                conn.close()
+            raise
+
+        file_log(f"PG ENGINE: snapshot {snapshot} of {database} shared by {len(connections)} connections")
+        return connections
+
+    def _tables(self, conn):
+        """Ordinary and partitioned tables of the user schemas, parents before their partitions"""
+        rows = _fetch(conn, f"""
+            SELECT c.oid, n.nspname, c.relname, c.relkind, c.relpersistence, c.relispartition,
+                   (SELECT i.inhparent::regclass::text FROM pg_catalog.pg_inherits i WHERE i.inhrelid = c.oid),
+                   CASE WHEN c.relispartition THEN pg_catalog.pg_get_expr(c.relpartbound, c.oid) END,
+                   CASE WHEN c.relkind = 'p' THEN pg_catalog.pg_get_partkeydef(c.oid) END,
+                   pg_catalog.pg_relation_size(c.oid)
+            FROM pg_catalog.pg_class c JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+            WHERE c.relkind IN ('r', 'p') AND {USER_SCHEMA} AND {_not_member('pg_class', 'c.oid')}
+            ORDER BY c.relispartition, c.oid
+        """)
+        tables = []
+        for oid, schema, name, kind, persistence, is_partition, parent, bound, partition_key, size in rows:
+            tables.append({
+                'oid': oid,
+                'schema': schema,
+                'name': name,
+                'qualified': _qualified(schema, name),
+                'kind': kind,
+                'unlogged': persistence == 'u',
+                'parent': parent if is_partition else None,
+                'bound': bound,
+                'partition_key': partition_key,
+                'size': size,
+                'columns': self._columns(conn, oid),
+            })
+        return tables
+
+    def _columns(self, conn, oid):
+        generated = "a.attgenerated" if self.server_version >= 120000 else "''"
+        rows = _fetch(conn, f"""
+            SELECT a.attname, pg_catalog.format_type(a.atttypid, a.atttypmod), a.attnotnull,
+                   pg_catalog.pg_get_expr(d.adbin, d.adrelid), a.attidentity, {generated},
+                   (SELECT pg_catalog.quote_ident(cn.nspname) || '.' || pg_catalog.quote_ident(co.collname)
+                    FROM pg_catalog.pg_collation co JOIN pg_catalog.pg_namespace cn ON cn.oid = co.collnamespace
+                    WHERE co.oid = a.attcollation AND a.attcollation <> t.typcollation)
+            FROM pg_catalog.pg_attribute a
+            JOIN pg_catalog.pg_type t ON t.oid = a.atttypid
+            LEFT JOIN pg_catalog.pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+            WHERE a.attrelid = %s AND a.attnum > 0 AND NOT a.attisdropped
+            ORDER BY a.attnum
+        """, (oid,))
+        return [
+            {
+                'name': name, 'type': data_type, 'not_null': not_null, 'default': default,
+                'identity': identity, 'generated': generated_kind, 'collation': collation,
+            }
+            for name, data_type, not_null, default, identity, generated_kind, collation in rows
+        ]
+
+    def _lock_tables(self, conn, tables):
+        """Keep the tables from being dropped or altered while they are copied"""
+        if tables:
+            cursor = conn.cursor()
+            cursor.execute(
+                "LOCK TABLE " + ', '.join(t['qualified'] for t in tables) + " IN ACCESS SHARE MODE"
+            )
+            cursor.close()
+
+    def _entry(self, database, phase, filename, raw_size, file_size, checksum, table=None, chunk=None):
+        return {
+            'database': database,
+            'table': table,
+            'chunk': chunk,
+            'phase': phase,
+            'file': filename,
+            'raw_size': raw_size,
+            'file_size': file_size,
+            'checksum': checksum,
+        }
+
+    def _write_file(self, filename, parts):
+        """Write an iterable of SQL strings into a compressed artifact file, returns its sizes and checksum"""
+        path = os.path.join(self.output_dir, filename)
+        raw_size = 0
+        digest = new_checksum()
+        with open_artifact_writer(path, self.compression, self.level, self.cipher, digest=digest) as out:
+            for part in parts:
+                data = part.encode('utf-8')
+                out.write(data)
+                raw_size += len(data)
+                if self.progress:
+                    self.progress.add(len(data))
+        return raw_size, os.path.getsize(path), digest.hexdigest()
+
+    def _column_definition(self, column):
+        parts = [quote_identifier(column['name']), column['type']]
+        if column['collation']:
+            parts.append(f"COLLATE {column['collation']}")
+        if column['generated'] == 's':
+            parts.append(f"GENERATED ALWAYS AS ({column['default']}) STORED")
+        elif column['default'] is not None and not column['identity']:
+            parts.append(f"DEFAULT {column['default']}")
+        if column['identity'] == 'a':
+            parts.append("GENERATED ALWAYS AS IDENTITY")
+        elif column['identity'] == 'd':
+            parts.append("GENERATED BY DEFAULT AS IDENTITY")
+        elif column['not_null']:
+            parts.append("NOT NULL")
+        return ' '.join(parts)
+
+    def _create_table(self, table):
+        unlogged = 'UNLOGGED ' if table['unlogged'] else ''
+        if table['parent']:
+            statement = f"CREATE {unlogged}TABLE {table['qualified']} PARTITION OF {table['parent']} {table['bound']}"
+        else:
+            columns = ',\n    '.join(self._column_definition(c) for c in table['columns'])
+            statement = f"CREATE {unlogged}TABLE {table['qualified']} (\n    {columns}\n)"
+        if table['partition_key']:
+            statement += f" PARTITION BY {table['partition_key']}"
+        return statement + ";\n"
+
+    def _sequences(self, conn):
+        """Sequences with the column they belong to, identity sequences are created by their column"""
+        return _fetch(conn, f"""
+            SELECT c.oid::regclass::text, pg_catalog.format_type(s.seqtypid, NULL), s.seqstart, s.seqincrement,
+                   s.seqmin, s.seqmax, s.seqcache, s.seqcycle,
+                   d.deptype, d.refobjid::regclass::text, a.attname
+            FROM pg_catalog.pg_sequence s
+            JOIN pg_catalog.pg_class c ON c.oid = s.seqrelid
+            JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+            LEFT JOIN pg_catalog.pg_depend d ON d.classid = 'pg_class'::regclass AND d.objid = c.oid
+                 AND d.refclassid = 'pg_class'::regclass AND d.deptype IN ('a', 'i')
+            LEFT JOIN pg_catalog.pg_attribute a ON a.attrelid = d.refobjid AND a.attnum = d.refobjsubid
+            WHERE {USER_SCHEMA} AND {_not_member('pg_class', 'c.oid')}
+            ORDER BY c.oid
+        """)
+
+    def _dump_schema(self, conn, database, tables):
+        """Write schemas, extensions, types, functions, sequences and tables of a database"""
+        parts = [SESSION_HEADER]
+
+        for (schema,) in _fetch(conn, f"""
+            SELECT n.nspname FROM pg_catalog.pg_namespace n
+            WHERE {USER_SCHEMA} AND {_not_member('pg_namespace', 'n.oid')} ORDER BY n.oid
+        """):
+            parts.append(f"CREATE SCHEMA IF NOT EXISTS {quote_identifier(schema)};\n")
+
+        for name, schema in _fetch(conn, """
+            SELECT e.extname, n.nspname FROM pg_catalog.pg_extension e
+            JOIN pg_catalog.pg_namespace n ON n.oid = e.extnamespace
+            WHERE e.extname <> 'plpgsql' ORDER BY e.oid
+        """):
+            parts.append(f"CREATE EXTENSION IF NOT EXISTS {quote_identifier(name)} WITH SCHEMA {quote_identifier(schema)};\n")
+
+        # Objects restored into an existing database replace the ones there
+        for table in reversed(tables):
+            parts.append(f"DROP TABLE IF EXISTS {table['qualified']} CASCADE;\n")
+
+        types = _fetch(conn, f"""
+            SELECT t.oid::regtype::text, t.typtype,
+                   ARRAY(SELECT e.enumlabel::text FROM pg_catalog.pg_enum e
+                         WHERE e.enumtypid = t.oid ORDER BY e.enumsortorder),
+                   pg_catalog.format_type(t.typbasetype, t.typtypmod), t.typnotnull, t.typdefault,
+                   ARRAY(SELECT pg_catalog.pg_get_constraintdef(con.oid) FROM pg_catalog.pg_constraint con
+                         WHERE con.contypid = t.oid ORDER BY con.oid)
+            FROM pg_catalog.pg_type t JOIN pg_catalog.pg_namespace n ON n.oid = t.typnamespace
+            WHERE t.typtype IN ('e', 'd') AND {USER_SCHEMA} AND {_not_member('pg_type', 't.oid')}
+            ORDER BY t.oid
+        """)
+        for name, kind, labels, base_type, not_null, default, checks in types:
+            parts.append(f"DROP TYPE IF EXISTS {name} CASCADE;\n")
+            if kind == 'e':
+                parts.append(f"CREATE TYPE {name} AS ENUM ({', '.join(quote_literal(l) for l in labels)});\n")
+            else:
+                statement = f"CREATE DOMAIN {name} AS {base_type}"
+                if default is not None:
+                    statement += f" DEFAULT {default}"
+                if not_null:
+                    statement += " NOT NULL"
+                for check in checks:
+                    statement += f" {check}"
+                parts.append(statement + ";\n")
+
+        kinds = "p.prokind IN ('f', 'p')" if self.server_version >= 110000 else "NOT p.proisagg AND NOT p.proiswindow"
+        for (definition,) in _fetch(conn, f"""
+            SELECT pg_catalog.pg_get_functiondef(p.oid) FROM pg_catalog.pg_proc p
+            JOIN pg_catalog.pg_namespace n ON n.oid = p.pronamespace
+            WHERE {kinds} AND {USER_SCHEMA} AND {_not_member('pg_proc', 'p.oid')}
+            ORDER BY p.oid
+        """):
+            parts.append(f"\n{definition.rstrip()};\n")
+
+        for name, data_type, start, increment, minimum, maximum, cache, cycle, dependency, _, _ in self._sequences(conn):
+            if dependency == 'i':
+                continue
+            parts.append(
+                f"DROP SEQUENCE IF EXISTS {name} CASCADE;\n"
+                f"CREATE SEQUENCE {name} AS {data_type} START WITH {start} INCREMENT BY {increment} "
+                f"MINVALUE {minimum} MAXVALUE {maximum} CACHE {cache}{' CYCLE' if cycle else ''};\n"
+            )
+
+        for table in tables:
+            parts.append("\n" + self._create_table(table))
+
+        filename = f"{self.prefix}_{database}-schema.sql{self.extension}"
+        raw_size, file_size, checksum = self._write_file(filename, parts)
+        return self._entry(database, 'schema', filename, raw_size, file_size, checksum)
+
+    def _dump_post_data(self, conn, database, tables):
+        """Write constraints, indexes, sequence values, views and triggers, restored after all data is loaded"""
+        parts = [SESSION_HEADER]
+        oids = [t['oid'] for t in tables]
+
+        # Partitions get the constraints and indexes of their parent from it
+        inherited = "AND con.conparentid = 0" if self.server_version >= 110000 else ""
+        for table, name, definition in _fetch(conn, f"""
+            SELECT con.conrelid::regclass::text, con.conname, pg_catalog.pg_get_constraintdef(con.oid)
+            FROM pg_catalog.pg_constraint con
+            WHERE con.conrelid = ANY(%s::oid[]) AND con.contype IN ('p', 'u', 'x', 'c', 'f')
+                  AND con.conislocal {inherited}
+            ORDER BY con.contype = 'f', con.oid
+        """, (oids,)):
+            parts.append(f"ALTER TABLE {table} ADD CONSTRAINT {quote_identifier(name)} {definition};\n")
+
+        for (definition,) in _fetch(conn, """
+            SELECT pg_catalog.pg_get_indexdef(i.indexrelid) FROM pg_catalog.pg_index i
+            JOIN pg_catalog.pg_class ic ON ic.oid = i.indexrelid
+            WHERE i.indrelid = ANY(%s::oid[]) AND NOT ic.relispartition
+                  AND NOT EXISTS (SELECT 1 FROM pg_catalog.pg_constraint con
+                                  WHERE con.conindid = i.indexrelid AND con.contype IN ('p', 'u', 'x'))
+            ORDER BY i.indexrelid
+        """, (oids,)):
+            parts.append(f"{definition};\n")
+
+        for name, _, _, _, _, _, _, _, dependency, table, column in self._sequences(conn):
+            # Sequence values are not transactional, they are read as they are now
+            last_value, is_called = _fetch(conn, f"SELECT last_value, is_called FROM {name}")[0]
+            called = 'true' if is_called else 'false'
+            if dependency == 'i':
+                sequence = f"pg_catalog.pg_get_serial_sequence({quote_literal(table)}, {quote_literal(column)})"
+            else:
+                sequence = quote_literal(name)
+                if dependency == 'a':
+                    parts.append(f"ALTER SEQUENCE {name} OWNED BY {table}.{quote_identifier(column)};\n")
+            parts.append(f"SELECT pg_catalog.setval({sequence}, {last_value}, {called});\n")
+
+        for name, kind, definition in _fetch(conn, f"""
+            SELECT c.oid::regclass::text, c.relkind, pg_catalog.pg_get_viewdef(c.oid)
+            FROM pg_catalog.pg_class c JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+            WHERE c.relkind IN ('v', 'm') AND {USER_SCHEMA} AND {_not_member('pg_class', 'c.oid')}
+            ORDER BY c.oid
+        """):
+            definition = definition.strip().rstrip(';')
+            if kind == 'v':
+                parts.append(f"\nCREATE OR REPLACE VIEW {name} AS\n{definition};\n")
+            else:
+                parts.append(
+                    f"\nDROP MATERIALIZED VIEW IF EXISTS {name} CASCADE;\n"
+                    f"CREATE MATERIALIZED VIEW {name} AS\n{definition}\nWITH DATA;\n"
+                )
+
+        cloned = "AND t.tgparentid = 0" if self.server_version >= 130000 else ""
+        for (definition,) in _fetch(conn, f"""
+            SELECT pg_catalog.pg_get_triggerdef(t.oid) FROM pg_catalog.pg_trigger t
+            WHERE t.tgrelid = ANY(%s::oid[]) AND NOT t.tgisinternal {cloned}
+            ORDER BY t.oid
+        """, (oids,)):
+            parts.append(f"{definition};\n")
+
+        filename = f"{self.prefix}_{database}-post.sql{self.extension}"
+        raw_size, file_size, checksum = self._write_file(filename, parts)
+        return self._entry(database, 'post', filename, raw_size, file_size, checksum)
+
+    def _dump_table(self, conn, database, table):
+        """Stream one table with COPY TO STDOUT into its own artifact"""
+        columns = [c['name'] for c in table['columns'] if not c['generated']]
+        filename = f"{self.prefix}_{database}.{table['schema']}.{table['name']}.copy{self.extension}"
+        path = os.path.join(self.output_dir, filename)
+        digest = new_checksum()
+
+        cursor = conn.cursor()
+        try:
+            with open_artifact_writer(path, self.compression, self.level, self.cipher, digest=digest) as out:
+                output = _CopyOutput(out, self.progress, self.supervisor, self.limiter)
+                column_list = f" ({_column_list(columns)})" if columns else ""
+                cursor.copy_expert(f"COPY {table['qualified']}{column_list} TO STDOUT", output)
+                output.flush()
+        finally:
+            cursor.close()
+
+        entry = self._entry(
+            database, 'data', filename, output.raw_size, os.path.getsize(path), digest.hexdigest(),
+            table=table['name'], chunk=0
+        )
+        entry['schema'] = table['schema']
+        entry['columns'] = columns
+        # Row count of the snapshot, restore verification compares it with the restored table
+        entry['rows'] = output.rows
+        return entry
+
+    def _dump_tables(self, connections, database, tables):
+        """Dump tables with one thread per snapshot connection, entries in table order"""
+        work = queue.Queue()
+        # Largest tables first so the slowest ones do not start last
+        for index, table in sorted(enumerate(tables), key=lambda item: item[1]['size'], reverse=True):
+            work.put((index, table))
+
+        results = {}
+        errors = []
+        failed = threading.Event()
+
+        def worker(conn):
+            while not failed.is_set():
+                try:
+                    index, table = work.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    results[index] = self._dump_table(conn, database, table)
+                except Exception as e:
+                    errors.append(f"{database}.{table['schema']}.{table['name']}: {str(e)}")
+                    failed.set()
+
+        threads = [threading.Thread(target=worker, args=(conn,), daemon=True) for conn in connections]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if errors:
+            raise RuntimeError('; '.join(errors))
+
+        return [results[index] for index in range(len(tables))]
+
+
+def is_copy_backup(manifest):
+    """True for manifests written by the native PostgreSQL engine"""
+    return manifest.get('engine') == 'pg_copy'
+
+
+class CopyRestorer:
+    """
+    Restores the entries of a native PostgreSQL engine manifest. Every entry
+    is loaded in its own transaction, a file that fails its checksum is rolled
+    back before anything of it is committed.
+    """
+
+    def __init__(self, connect_params, supervisor=None):
+        self.connect_params = dict(connect_params)
+        self.supervisor = supervisor
+
+    def _connect(self, database):
+        conn = psycopg2.connect(dbname=database, **self.connect_params)
+        conn.set_client_encoding('UTF8')
+        return conn
+
+    def _ensure_database(self, database):
+        conn = self._connect('postgres')
+        try:
+            conn.autocommit = True
+            if not _fetch(conn, "SELECT 1 FROM pg_catalog.pg_database WHERE datname = %s", (database,)):
+                file_log(f"PG ENGINE: creating database {database}")
+                cursor = conn.cursor()
+                cursor.execute(f"CREATE DATABASE {quote_identifier(database)}")
+                cursor.close()
+        finally:
+            conn.close()
+
+    def restore_entry(self, entry):
+        """Load one schema, data or post-data file, returns a result dict"""
+        if self.supervisor:
+            self.supervisor.check()
+        if entry['phase'] == 'schema':
+            self._ensure_database(entry['database'])
+
+        check = ChecksumCheck(entry['checksum']) if entry.get('checksum') else None
+        conn = self._connect(entry['database'])
+        try:
+            cursor = conn.cursor()
+            with open_artifact_reader(entry['path'], check) as reader:
+                if entry['phase'] == 'data':
+                    table = _qualified(entry['schema'], entry['table'])
+                    column_list = f" ({_column_list(entry['columns'])})" if entry['columns'] else ""
+                    cursor.copy_expert(f"COPY {table}{column_list} FROM STDIN", reader)
+                else:
+                    cursor.execute(reader.read().decode('utf-8'))
+                if check is not None and not check.matches():
+                    conn.rollback()
+                    return {
+                        'success': False,
+                        'message': f"Checksum mismatch of {entry['file']}, the file is corrupted or truncated. "
+                                   f"Nothing of it was restored."
+                    }
+            cursor.close()
+            conn.commit()
+        except psycopg2.Error as e:
+            conn.rollback()
+            return {'success': False, 'message': str(e).strip()}
+        finally:
+            conn.close()
+
+        return {'success': True, 'message': f"Restored {entry['file']}"}
@@ -0,0 +1,1066 @@
+# backup_manager/pipeline.py
+import io
+import os
+import gzip
+import hashlib
+import json
+import queue
+import shutil
+import subprocess
+import tarfile
+import threading
+import collections
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from .models import file_log
+from .supervisor import ProcessSupervisor, ProcessTerminated, StderrTail
+from .encryption import is_encrypted, open_decrypted, decrypted_size
+
+# Size of the blocks read from dump tools and written to artifacts
+CHUNK_SIZE = 1024 * 1024
+
+COMPRESSION_EXTENSIONS = {
+    'none': '',
+    'gzip': '.gz',
+    'zstd': '.zst',
+}
+
+DEFAULT_COMPRESSION_LEVELS = {
+    'gzip': 6,
+    'zstd': 3,
+}
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+# Checksum of the stored bytes of artifacts, computed while they are written and read
+CHECKSUM_ALGORITHM = 'sha256'
+
+
+def new_checksum():
+    return hashlib.new(CHECKSUM_ALGORITHM)
+
+
+# Input compressed as one gzip member by each thread of a parallel gzip writer
+PARALLEL_GZIP_BLOCK_SIZE = 1024 * 1024
+
+
+def resolve_threads(threads):
+    """Thread count of a task setting, 0 meaning every CPU core"""
+    threads = int(threads or 0)
+    return threads if threads > 0 else (os.cpu_count() or 1)
+
+
+def artifact_extension(compression):
+    """Return the file extension appended to artifacts for given compression"""
+    return COMPRESSION_EXTENSIONS.get(compression or 'none', '')
+
+
+class _GzipWriter(gzip.GzipFile):
+    """GzipFile that also closes the stream it writes to"""
+
+    def __init__(self, fileobj, level):
+        super().__init__(fileobj=fileobj, mode='wb', compresslevel=level)
+        self._target = fileobj
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            target, self._target = self._target, None
+            if target is not None:
+                target.close()
+
+
+class _GzipReader(gzip.GzipFile):
+    """GzipFile that also closes the stream it reads from"""
+
+    def __init__(self, fileobj):
+        super().__init__(fileobj=fileobj, mode='rb')
+        self._source = fileobj
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            source, self._source = self._source, None
+            if source is not None:
+                source.close()
+
+
+class ParallelGzipWriter:
+    """
+    Gzip compression on several threads, like pigz. The input is cut into
+    blocks compressed as independent gzip members (zlib releases the GIL),
+    written in input order. Multi-member files are standard gzip, gunzip and
+    every reader here decompress them as one stream. Closing it also closes
+    fileobj.
+    """
+
+    def __init__(self, fileobj, level, threads, block_size=PARALLEL_GZIP_BLOCK_SIZE):
+        self._target = fileobj
+        self._level = level
+        self._threads = threads
+        self._block_size = block_size
+        self._buffer = bytearray()
+        self._executor = ThreadPoolExecutor(max_workers=threads)
+        self._pending = collections.deque()
+        self._closed = False
+        self._raw_offset = 0
+        self._written = 0
+        # (input offset, output offset) of every member, where a reader can start decompressing
+        self.blocks = []
+
+    def _compress(self, block):
+        compressor = zlib.compressobj(self._level, zlib.DEFLATED, 31)
+        return compressor.compress(block) + compressor.flush()
+
+    def _submit(self, block):
+        self._pending.append((self._raw_offset, self._executor.submit(self._compress, bytes(block))))
+        self._raw_offset += len(block)
+        # Bounded read-ahead, the oldest block is written once every thread has work queued
+        while len(self._pending) > self._threads * 2:
+            self._write_next()
+
+    def _write_next(self):
+        raw_offset, future = self._pending.popleft()
+        member = future.result()
+        self.blocks.append((raw_offset, self._written))
+        self._target.write(member)
+        self._written += len(member)
+
+    def write(self, data):
+        self._buffer.extend(data)
+        while len(self._buffer) >= self._block_size:
+            self._submit(self._buffer[:self._block_size])
+            del self._buffer[:self._block_size]
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            # An empty input still makes a valid (empty) gzip file
+            if self._buffer or not self._pending:
+                self._submit(self._buffer)
+            self._buffer = bytearray()
+            while self._pending:
+                self._write_next()
+        finally:
+            self._executor.shutdown(wait=True)
+            self._target.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ParallelZstdWriter(ParallelGzipWriter):
+    """
+    zstd counterpart of ParallelGzipWriter, every block becomes an independent
+    frame that readers can start decompressing at. zstd readers here read
+    across frames, so does the zstd tool.
+    """
+
+    def __init__(self, fileobj, level, threads, block_size=PARALLEL_GZIP_BLOCK_SIZE):
+        import zstandard
+        self._zstandard = zstandard
+        super().__init__(fileobj, level, threads, block_size)
+
+    def _compress(self, block):
+        # Compressors are not shared between threads
+        return self._zstandard.ZstdCompressor(level=self._level).compress(block)
+
+
+def open_compressor(fileobj, compression='none', level=None, threads=1, blocks=False):
+    """
+    Wrap a writable binary stream so everything written to it is compressed,
+    on several threads when threads is above 1. Closing the returned writer
+    also closes fileobj.
+
+    With blocks the output is cut into independently decompressible blocks
+    (gzip members, zstd frames) whose offsets the writer lists in .blocks,
+    see sqlindex. Uncompressed output needs no blocks to be read at any offset.
+    """
+    compression = compression or 'none'
+
+    if compression == 'none':
+        return fileobj
+
+    if level is None:
+        level = DEFAULT_COMPRESSION_LEVELS[compression]
+
+    if compression == 'gzip':
+        if threads > 1 or blocks:
+            return ParallelGzipWriter(fileobj, level, threads)
+        return _GzipWriter(fileobj, level)
+    elif compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError('zstd compression requires the zstandard package (pip install zstandard)')
+        if blocks:
+            return ParallelZstdWriter(fileobj, level, threads)
+        # libzstd compresses with its own worker threads, the output stays a single frame
+        compressor = zstandard.ZstdCompressor(level=level, threads=threads if threads > 1 else 0)
+        return compressor.stream_writer(fileobj, closefd=True)
+    else:
+        raise ValueError(f"Unsupported compression: {compression}")
+
+
+def open_artifact_writer(path, compression='none', level=None, cipher=None, threads=1, digest=None):
+    """
+    Open a writable binary stream that compresses everything written to it
+    on threads threads, encrypting the compressed stream with cipher (an
+    ArtifactCipher) if given. digest (see new_checksum) is updated with the
+    bytes stored in the file.
+    """
+    target = open(path, 'wb')
+    if digest is not None:
+        target = StreamSink(target, digest=digest)
+    if cipher is not None:
+        target = cipher.writer(target)
+    return open_compressor(target, compression, level, threads)
+
+
+class _ChecksumRaw(io.RawIOBase):
+    """Raw stream over a file updating a digest with every byte read"""
+
+    def __init__(self, fileobj, digest):
+        self._source = fileobj
+        self._digest = digest
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = self._source.readinto(buffer)
+        if size:
+            self._digest.update(memoryview(buffer)[:size])
+        return size
+
+    def close(self):
+        if not self.closed:
+            self._source.close()
+        super().close()
+
+
+class ChecksumCheck:
+    """
+    Verifies the stored bytes of an artifact against its recorded checksum
+    while a reader goes through it, without reading the file a second time.
+    Pass it to open_artifact_reader and call matches() at the end of the stream.
+    """
+
+    def __init__(self, expected):
+        self.expected = expected
+        self.digest = new_checksum()
+        self._raw = None
+
+    def wrap(self, fileobj):
+        self._raw = _ChecksumRaw(fileobj, self.digest)
+        return io.BufferedReader(self._raw, buffer_size=CHUNK_SIZE)
+
+    def matches(self):
+        # Bytes a decoder left unread after the end of its stream are part of the file too
+        while self._raw.read(CHUNK_SIZE):
+            pass
+        return self.digest.hexdigest() == self.expected
+
+
+def _open_raw(path):
+    """Stored bytes of an artifact file, split artifacts read part after part"""
+    if is_parts_manifest(path):
+        return io.BufferedReader(PartsReader(read_parts_manifest(path)), buffer_size=CHUNK_SIZE)
+    return open(path, 'rb')
+
+
+def verify_checksum(path, checksum, supervisor=None):
+    """True when the stored bytes of the artifact at path match the checksum recorded at dump time"""
+    check = ChecksumCheck(checksum)
+    with check.wrap(_open_raw(path)) as stored:
+        while stored.read(CHUNK_SIZE):
+            if supervisor:
+                supervisor.check()
+        return check.matches()
+
+
+def open_stored_reader(path, check=None):
+    """
+    Open an artifact file as stored (still compressed), decrypting encrypted
+    files. check is an optional ChecksumCheck of the stored bytes.
+    """
+    raw = _open_raw(path)
+    if check is not None:
+        raw = check.wrap(raw)
+    if is_encrypted(raw):
+        return open_decrypted(raw)
+    return raw
+
+
+def stored_file_size(path):
+    """Size of the stream open_stored_reader returns"""
+    size = read_parts_manifest(path)['size'] if is_parts_manifest(path) else os.path.getsize(path)
+    with _open_raw(path) as raw:
+        if is_encrypted(raw):
+            return decrypted_size(raw, size)
+    return size
+
+
+def open_artifact_reader(path, check=None):
+    """
+    Open an artifact for reading, transparently decrypting encrypted files,
+    decompressing gzip/zstd files and reassembling deduplicated artifacts
+    from the chunk store. check is an optional ChecksumCheck of the file.
+    """
+    if is_chunk_manifest(path):
+        from .chunkstore import ChunkStore
+        return ChunkStore().open_manifest(path)
+
+    stored = open_stored_reader(path, check)
+    magic = stored.peek(4)[:4]
+
+    if magic.startswith(GZIP_MAGIC):
+        return _GzipReader(stored)
+    elif magic.startswith(ZSTD_MAGIC):
+        try:
+            import zstandard
+        except ImportError:
+            stored.close()
+            raise RuntimeError('Reading zstd artifacts requires the zstandard package (pip install zstandard)')
+        # Indexed artifacts hold one frame per block
+        return zstandard.ZstdDecompressor().stream_reader(stored, read_across_frames=True, closefd=True)
+    return stored
+
+
+class StreamDecoder:
+    """Incremental decompressor of a gzip or zstd stream of one or more members"""
+
+    def __init__(self, compression):
+        self.compression = compression
+        self._decoder = self._new_decoder()
+
+    def _new_decoder(self):
+        if self.compression == 'gzip':
+            return zlib.decompressobj(wbits=31)
+        if self.compression == 'zstd':
+            import zstandard
+            return zstandard.ZstdDecompressor().decompressobj()
+        raise ValueError(f"Unsupported compression: {self.compression}")
+
+    def decompress(self, data):
+        output = []
+        while data:
+            output.append(self._decoder.decompress(data))
+            # Bytes past the end of a member start the next one
+            data = self._decoder.unused_data
+            if data:
+                self._decoder = self._new_decoder()
+        return b''.join(output)
+
+
+def read_artifact_header(path, length=5):
+    """Return the first bytes of the decompressed artifact content"""
+    with open_artifact_reader(path) as reader:
+        return reader.read(length)
+
+
+class StreamSink:
+    """Writes the stored (compressed) bytes to every target, counting and optionally hashing them"""
+
+    def __init__(self, *targets, digest=None):
+        self.targets = [target for target in targets if target is not None]
+        self.bytes_written = 0
+        self.digest = digest
+
+    def write(self, data):
+        for target in self.targets:
+            target.write(data)
+        self.bytes_written += len(data)
+        if self.digest is not None:
+            self.digest.update(data)
+        return len(data)
+
+    def flush(self):
+        for target in self.targets:
+            target.flush()
+
+    def close(self):
+        errors = []
+        for target in self.targets:
+            try:
+                target.close()
+            except Exception as e:
+                errors.append(e)
+        if errors:
+            raise errors[0]
+
+
+# Upper bound of blocks held in memory between the dump and the uploader
+PIPE_MAX_CHUNKS = 64
+
+_PIPE_ABORTED = object()
+
+
+class BoundedPipe:
+    """
+    In-memory pipe between the dump (writer) and an uploader (reader) thread.
+    At most PIPE_MAX_CHUNKS written blocks are buffered, a writer faster than
+    the upload blocks until the reader catches up.
+    """
+
+    def __init__(self, max_chunks=PIPE_MAX_CHUNKS):
+        self._queue = queue.Queue(maxsize=max_chunks)
+        self._buffer = bytearray()
+        self._finished = False
+        self._error = None
+        self.eof = False
+
+    def _put(self, item):
+        while True:
+            if self._error:
+                raise BrokenPipeError(self._error)
+            try:
+                self._queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def write(self, data):
+        if data:
+            self._put(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        """Signal the end of the stream to the reader"""
+        if not self._finished and not self._error:
+            self._finished = True
+            self._put(None)
+
+    def abort(self, message):
+        """Fail both ends, the reader must never see a clean end of a broken stream"""
+        self._error = message or 'Stream aborted'
+        try:
+            self._queue.put_nowait(_PIPE_ABORTED)
+        except queue.Full:
+            pass
+
+    def read(self, size=-1):
+        while not self.eof and (size is None or size < 0 or len(self._buffer) < size):
+            item = self._queue.get()
+            if self._error:
+                raise IOError(self._error)
+            if item is None:
+                self.eof = True
+            else:
+                self._buffer.extend(item)
+
+        if size is None or size < 0:
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+
+def _run_upload(upload, pipe, upload_result):
+    """Run uploader on the reading end of the pipe, failing the pipe on error"""
+    try:
+        result = upload(pipe)
+    except Exception as e:
+        result = {'success': False, 'message': f'Upload error: {str(e)}'}
+
+    if result.get('success') and not pipe.eof:
+        result = {'success': False, 'message': 'Upload finished before the end of the dump'}
+    if not result.get('success'):
+        pipe.abort(result.get('message'))
+    upload_result.update(result)
+
+
+def stream_dump(cmd, backup_path, compression='none', level=None, env=None,
+                upload=None, keep_local=True, head_size=0, chunk_store=None, progress=None,
+                supervisor=None, limiter=None, remote=None, cipher=None, threads=1, part_size=0,
+                index=None):
+    """
+    Run a dump command and stream its stdout into the artifact at backup_path,
+    compressing on the fly. Returns a result dict with raw and stored byte counts.
+
+    upload is an optional callable taking a readable stream. It runs in its own
+    thread and receives the compressed output while the dump is still running,
+    through a bounded in-memory pipe. The local file is then only written when
+    keep_local is set.
+
+    head_size keeps the first bytes of the uncompressed output in result['head']
+    for callers reading metadata the dump tool writes at the top (binlog position).
+
+    With a chunk_store the output is deduplicated into the store and backup_path
+    becomes a chunk manifest, upload is not supported then.
+
+    progress is an optional ProgressTracker counting the uncompressed bytes,
+    supervisor the ProcessSupervisor enforcing the task timeout and priority,
+    limiter a RateLimiter throttling how fast the dump output is read.
+
+    remote is an optional RemoteShell running cmd on its SSH host. Its output
+    arrives compressed and is stored as it is when the artifact uses the same
+    compression, otherwise it is decompressed here first.
+
+    cipher is an optional ArtifactCipher encrypting the compressed stream before
+    it is stored and uploaded. Deduplicated artifacts are never encrypted.
+
+    threads is the number of threads compressing the output.
+
+    With a part_size the stored stream is split into part files of that many
+    bytes and backup_path becomes a parts manifest, upload is not supported then.
+
+    index is an optional SqlIndexBuilder (see sqlindex) locating the tables in
+    the output. The artifact is then compressed in independent blocks and the
+    index written next to it. Remote output stored compressed as it arrived
+    keeps its single stream and is not indexed, nor are deduplicated artifacts
+    and dumps without a local copy.
+    """
+    file_log(f"PIPELINE: streaming {cmd[0]} into {backup_path} (compression: {compression})")
+
+    supervisor = supervisor or ProcessSupervisor()
+    try:
+        process = supervisor.popen(cmd, remote=remote, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+    except ProcessTerminated as e:
+        return {'success': False, 'message': str(e)}
+    stderr_tail = StderrTail(process.stderr)
+
+    pipe = None
+    upload_thread = None
+    upload_result = {}
+    if upload:
+        pipe = BoundedPipe()
+        upload_thread = threading.Thread(target=_run_upload, args=(upload, pipe, upload_result), daemon=True)
+        upload_thread.start()
+        file_log(f"PIPELINE: uploading while dumping (local copy: {'yes' if keep_local else 'no'})")
+
+    if chunk_store is not None or (upload and not keep_local):
+        index = None
+    decoder = StreamDecoder(remote.compression) if remote else None
+    # Remote output already compressed the way the artifact is goes through untouched
+    passthrough = decoder is not None and chunk_store is None and remote.compression == (compression or 'none')
+    if passthrough and remote.compression != 'none':
+        # A single compressed stream has no blocks to seek to, table restores would
+        # decompress it from the start anyway
+        index = None
+
+    if chunk_store is not None:
+        sink = out = chunk_store.writer(backup_path, compression, level)
+    else:
+        if upload and not keep_local:
+            local_file = None
+        elif part_size:
+            local_file = PartWriter(backup_path, part_size)
+        else:
+            local_file = open(backup_path, 'wb')
+        sink = StreamSink(local_file, pipe, digest=new_checksum())
+        target = cipher.writer(sink) if cipher else sink
+        out = target if passthrough else open_compressor(target, compression, level, threads, blocks=index is not None)
+
+    raw_size = 0
+    head = bytearray()
+    error = None
+    try:
+        for chunk in iter(lambda: process.stdout.read(CHUNK_SIZE), b''):
+            data = decoder.decompress(chunk) if decoder else chunk
+            out.write(chunk if passthrough else data)
+            if index is not None:
+                index.feed(data)
+            if len(head) < head_size:
+                head.extend(data[:head_size - len(head)])
+            raw_size += len(data)
+            if progress:
+                progress.add(len(data))
+            if limiter:
+                limiter.consume(len(chunk))
+        returncode = process.wait()
+    except Exception as e:
+        supervisor.kill(process)
+        returncode = process.wait()
+        error = e
+    finally:
+        process.stdout.close()
+        supervisor.release(process)
+
+    if pipe and (error or returncode != 0):
+        pipe.abort('Dump did not complete')
+
+    try:
+        out.close()
+    except Exception as e:
+        error = error or e
+
+    stderr_tail.join()
+    if upload_thread:
+        upload_thread.join()
+    stderr = stderr_tail.text()
+
+    upload_failed = upload and not upload_result.get('success')
+    if error or returncode != 0 or upload_failed:
+        _remove_partial(backup_path)
+        # A broken pipe is only the echo of the failure on the other end
+        secondary = error is None or isinstance(error, BrokenPipeError)
+        if upload_failed and secondary and returncode == 0:
+            message = upload_result.get('message', 'Upload failed')
+        elif returncode != 0 and secondary:
+            message = stderr or f'{cmd[0]} exited with code {returncode}'
+        else:
+            message = str(error)
+        return {
+            'success': False,
+            'message': supervisor.failure(message),
+        }
+
+    stored_size = sink.stored_size if chunk_store is not None else sink.bytes_written
+    file_log(f"PIPELINE: dump finished, raw {raw_size} bytes, stored {stored_size} bytes")
+
+    if index is not None:
+        try:
+            index.write(index_path(backup_path), compression, getattr(out, 'blocks', []), raw_size)
+        except OSError as e:
+            # The artifact is complete, it only restores as a whole without its index
+            file_log(f"PIPELINE: could not write the table index of {backup_path}: {str(e)}")
+
+    result = {
+        'success': True,
+        'path': backup_path,
+        'raw_size': raw_size,
+        'file_size': stored_size,
+    }
+    if chunk_store is not None:
+        result['new_size'] = sink.new_stored_size
+    else:
+        result['checksum'] = sink.digest.hexdigest()
+    if upload:
+        result['upload_result'] = upload_result
+    if head_size:
+        result['head'] = bytes(head)
+    return result
+
+
+def stream_restore(cmd, backup_path, env=None, supervisor=None, checksum=None, tables=None):
+    """
+    Run a restore command feeding the decompressed artifact to its stdin.
+    Returns a result dict with the end of the process stderr on failure.
+
+    With the checksum recorded at dump time the stored bytes are verified
+    before the restore tool starts: it applies statements as it reads them
+    and killing it does not undo them, so a corrupted artifact is never fed
+    to it. Verifying reads the stored file once more, without decompressing.
+
+    tables restores only these tables of an artifact with a table index, read
+    at their offsets. The whole-file checksum is not verified then,
+    encrypted artifacts still authenticate every chunk read.
+    """
+    file_log(f"PIPELINE: streaming {backup_path} into {cmd[0]}"
+             + (f" (tables: {', '.join(tables)})" if tables else ""))
+
+    supervisor = supervisor or ProcessSupervisor()
+    try:
+        if checksum and not tables and not is_chunk_manifest(backup_path):
+            try:
+                error = None if verify_checksum(backup_path, checksum, supervisor) else (
+                    f'Checksum mismatch of {os.path.basename(backup_path)}, the artifact is corrupted or truncated'
+                )
+            except IOError as e:
+                # Parts are checked against their own checksums while they are read
+                error = str(e)
+            if error:
+                file_log(f"PIPELINE: {error}, nothing restored")
+                return {'success': False, 'message': f'{error}. Nothing was restored.'}
+        process = supervisor.popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            env=env
+        )
+    except ProcessTerminated as e:
+        return {'success': False, 'message': str(e)}
+    stderr_tail = StderrTail(process.stderr)
+
+    try:
+        if tables:
+            from .sqlindex import open_table_reader
+            opened = open_table_reader(backup_path, tables)
+        else:
+            opened = open_artifact_reader(backup_path)
+        with opened as reader:
+            for chunk in iter(lambda: reader.read(CHUNK_SIZE), b''):
+                process.stdin.write(chunk)
+    except BrokenPipeError:
+        # The restore tool exited early, its stderr explains why
+        pass
+    except Exception:
+        supervisor.kill(process)
+        raise
+    finally:
+        try:
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+        returncode = process.wait()
+        supervisor.release(process)
+        stderr_tail.join()
+
+    return {
+        'success': returncode == 0,
+        'message': supervisor.failure(stderr_tail.text()) if returncode != 0 else stderr_tail.text(),
+    }
+
+
+def _remove_partial(path):
+    """Remove an incomplete artifact left behind by a failed dump"""
+    try:
+        if is_parts_manifest(path):
+            _remove_parts(path)
+        for file_path in (path, index_path(path)):
+            if os.path.exists(file_path):
+                os.remove(file_path)
+    except OSError as e:
+        file_log(f"PIPELINE: could not remove partial artifact {path}: {str(e)}")
+
+
+# PostgreSQL directory format dumps (pg_dump -Fd) are packaged into one tar file
+PG_DIRECTORY_SUFFIX = '.pgdir.tar'
+
+
+def is_directory_dump(path):
+    """Check if the artifact is a tar of PostgreSQL directory format dumps"""
+    return bool(path) and path.endswith(PG_DIRECTORY_SUFFIX)
+
+
+# Multi-file artifacts (one dump per database) are tied together by a manifest
+MANIFEST_SUFFIX = '.manifest.json'
+MANIFEST_FORMAT = 'debt-manifest'
+
+# Deduplicated artifacts: ordered list of chunk digests in the chunk store
+CHUNK_MANIFEST_SUFFIX = '.chunks.json'
+CHUNK_MANIFEST_FORMAT = 'debt-chunks'
+
+# Artifacts split into numbered part files of a fixed size, listed in order with their checksums
+PARTS_MANIFEST_SUFFIX = '.parts.json'
+PARTS_MANIFEST_FORMAT = 'debt-parts'
+
+# Table index of a SQL dump, stored next to the artifact and never uploaded
+INDEX_SUFFIX = '.index.json'
+
+
+def index_path(path):
+    """Path of the table index (see sqlindex) of a SQL dump artifact"""
+    return f"{path}{INDEX_SUFFIX}"
+
+
+def is_manifest(path):
+    """Check if the artifact path points to a manifest of several dump files"""
+    return bool(path) and path.endswith(MANIFEST_SUFFIX)
+
+
+def is_chunk_manifest(path):
+    """Check if the artifact path points to a deduplicated (chunked) artifact"""
+    return bool(path) and path.endswith(CHUNK_MANIFEST_SUFFIX)
+
+
+def is_parts_manifest(path):
+    """Check if the artifact path points to an artifact split into part files"""
+    return bool(path) and path.endswith(PARTS_MANIFEST_SUFFIX)
+
+
+def part_path(manifest_path, index):
+    """Path of part index (from 1) of a split artifact"""
+    return f"{manifest_path[:-len(PARTS_MANIFEST_SUFFIX)]}.part{index:05d}"
+
+
+def read_parts_manifest(manifest_path):
+    """Load a parts manifest and resolve part file names to absolute paths"""
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+
+    if manifest.get('format') != PARTS_MANIFEST_FORMAT:
+        raise ValueError(f"Not a parts manifest: {manifest_path}")
+
+    base_dir = os.path.dirname(manifest_path)
+    for part in manifest['parts']:
+        part['path'] = os.path.join(base_dir, part['file'])
+    return manifest
+
+
+def _remove_parts(manifest_path):
+    # Parts are numbered without gaps, this also finds those of a dump that never wrote its manifest
+    index = 1
+    while os.path.exists(part_path(manifest_path, index)):
+        os.remove(part_path(manifest_path, index))
+        index += 1
+
+
+class PartWriter:
+    """
+    Writable file splitting the stored stream into part files of part_size
+    bytes, each hashed on the way. Closing it writes the parts manifest
+    listing them in order, parts are uploaded and retried one by one.
+    """
+
+    def __init__(self, manifest_path, part_size):
+        self.manifest_path = manifest_path
+        self.part_size = part_size
+        self.parts = []
+        self._file = None
+        self._digest = None
+        self._written = 0
+        self._closed = False
+
+    def _start_part(self):
+        self._file = open(part_path(self.manifest_path, len(self.parts) + 1), 'wb')
+        self._digest = new_checksum()
+        self._written = 0
+
+    def _finish_part(self):
+        self._file.close()
+        self.parts.append({
+            'file': os.path.basename(self._file.name),
+            'size': self._written,
+            'checksum': self._digest.hexdigest(),
+        })
+        self._file = None
+
+    def write(self, data):
+        view = memoryview(data)
+        while view:
+            if self._file is None:
+                self._start_part()
+            block = view[:self.part_size - self._written]
+            self._file.write(block)
+            self._digest.update(block)
+            self._written += len(block)
+            view = view[len(block):]
+            if self._written == self.part_size:
+                self._finish_part()
+        return len(data)
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self._file is not None:
+            self._finish_part()
+        manifest = {
+            'format': PARTS_MANIFEST_FORMAT,
+            'version': 1,
+            'part_size': self.part_size,
+            'size': sum(part['size'] for part in self.parts),
+            'parts': self.parts,
+        }
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+
+class PartsReader(io.RawIOBase):
+    """
+    Raw stream of the parts of a split artifact in order, every part verified
+    at its end. It can seek, a part entered at an offset is only checked for
+    its size.
+    """
+
+    def __init__(self, manifest):
+        self._parts = manifest['parts']
+        self._index = -1
+        self._file = None
+        self._digest = None
+        self._read = 0
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def _verify(self):
+        part = self._parts[self._index]
+        if self._read != part['size'] or (self._digest and self._digest.hexdigest() != part['checksum']):
+            raise IOError(f"Part {part['file']} is corrupted or truncated")
+
+    def readinto(self, buffer):
+        while True:
+            if self._file is None:
+                if self._index + 1 >= len(self._parts):
+                    return 0
+                self._index += 1
+                self._file = open(self._parts[self._index]['path'], 'rb')
+                self._digest = new_checksum()
+                self._read = 0
+            size = self._file.readinto(buffer)
+            if size:
+                if self._digest:
+                    self._digest.update(memoryview(buffer)[:size])
+                self._read += size
+                self._position += size
+                return size
+            self._file.close()
+            self._file = None
+            self._verify()
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += sum(part['size'] for part in self._parts)
+        if offset == self._position:
+            return offset
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+        start = 0
+        for index, part in enumerate(self._parts):
+            if offset < start + part['size'] or index == len(self._parts) - 1:
+                self._index = index
+                self._file = open(part['path'], 'rb')
+                self._file.seek(offset - start)
+                self._digest = None
+                self._read = offset - start
+                break
+            start += part['size']
+        self._position = offset
+        return offset
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        super().close()
+
+
+def manifest_dir(manifest_path):
+    """Directory holding the files referenced by a manifest"""
+    return manifest_path[:-len(MANIFEST_SUFFIX)]
+
+
+def write_manifest(manifest_path, manifest):
+    """Write manifest atomically so a crash never leaves a half written file"""
+    manifest = dict(manifest, format=MANIFEST_FORMAT, version=1)
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def read_manifest(manifest_path):
+    """Load manifest and resolve artifact file names to absolute paths"""
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+
+    if manifest.get('format') != MANIFEST_FORMAT:
+        raise ValueError(f"Not a backup manifest: {manifest_path}")
+
+    base_dir = manifest_dir(manifest_path)
+    for entry in manifest.get('artifacts', []):
+        entry['path'] = os.path.join(base_dir, entry['file'])
+    return manifest
+
+
+def artifact_members(path):
+    """List the artifact files of an artifact (manifest first), split files by their parts manifest"""
+    if not is_manifest(path):
+        return [path]
+    manifest = read_manifest(path)
+    return [path] + [entry['path'] for entry in manifest['artifacts']]
+
+
+def artifact_files(path):
+    """List every file on disk that makes up an artifact (manifest first)"""
+    files = []
+    for member in artifact_members(path):
+        files.append(member)
+        if is_parts_manifest(member) and os.path.exists(member):
+            files.extend(part['path'] for part in read_parts_manifest(member)['parts'])
+    return files
+
+
+def _chunk_manifest_info(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def _stored_size(path):
+    """Stored size of one artifact file, chunk manifests count the chunks they reference"""
+    if is_chunk_manifest(path):
+        return _chunk_manifest_info(path)['stored_size']
+    return os.path.getsize(path)
+
+
+def artifact_size(path):
+    """Total stored size of an artifact in bytes"""
+    return sum(_stored_size(f) for f in artifact_files(path) if os.path.exists(f))
+
+
+def remove_artifact(path):
+    """Remove artifact file, or a manifest together with all files it references"""
+    chunked = is_chunk_manifest(path)
+    if is_manifest(path):
+        base_dir = manifest_dir(path)
+        if os.path.isdir(base_dir):
+            chunked = any(name.endswith(CHUNK_MANIFEST_SUFFIX) for name in os.listdir(base_dir))
+            shutil.rmtree(base_dir)
+    if is_parts_manifest(path):
+        _remove_parts(path)
+    for file_path in (path, index_path(path)):
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+    # Chunks are shared between artifacts, drop only the ones nothing references
+    if chunked:
+        from .chunkstore import ChunkStore
+        ChunkStore().collect_garbage()
+
+
+def iter_artifact_tar(path):
+    """Stream all files of an artifact as an uncompressed tar archive"""
+    for file_path in artifact_members(path):
+        name = os.path.basename(file_path)
+        if is_parts_manifest(file_path):
+            name = name[:-len(PARTS_MANIFEST_SUFFIX)]
+        if is_chunk_manifest(file_path):
+            # Deduplicated files are reassembled, uncompressed
+            name = name[:-len(CHUNK_MANIFEST_SUFFIX)]
+            size = _chunk_manifest_info(file_path)['raw_size']
+            opener = open_artifact_reader
+        else:
+            # Files are streamed as stored, encrypted ones decrypted and split ones joined
+            size = stored_file_size(file_path)
+            opener = open_stored_reader
+
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mtime = int(os.path.getmtime(file_path))
+        yield info.tobuf(format=tarfile.PAX_FORMAT)
+
+        with opener(file_path) as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                yield chunk
+
+        remainder = info.size % tarfile.BLOCKSIZE
+        if remainder:
+            yield b'\0' * (tarfile.BLOCKSIZE - remainder)
+
+    # End of archive marker
+    yield b'\0' * (tarfile.BLOCKSIZE * 2)
@@ -0,0 +1,166 @@
+# backup_manager/progress.py
+"""
+Live progress of running backups. The dump pipeline counts bytes (and rows
+where the engine sees them) while they stream, a background thread saves the
+counters, throughput and an ETA based on the previous run into the
+BackupHistory row every few seconds, where the UI and the API read them.
+"""
+import os
+import time
+import threading
+import contextlib
+from django.db import connection
+from django.utils import timezone
+from .models import BackupHistory, file_log
+
+PROGRESS_INTERVAL = 5  # seconds between progress updates in the database
+
+
+def directory_size(path):
+    """Total size of the files under path, files disappearing meanwhile are skipped"""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, filename))
+            except OSError:
+                pass
+    return total
+
+
+class ProgressTracker:
+    """
+    Thread-safe progress counters of one backup. Counters are only updated in
+    memory by the dump threads, a single reporter thread writes them to the
+    database so dumping never waits on it. Dump tools writing files themselves
+    are followed with watch(), which polls the size of their output.
+    """
+
+    def __init__(self, history_id, expected_bytes=None, interval=PROGRESS_INTERVAL):
+        self.history_id = history_id
+        self.expected_bytes = expected_bytes
+        self.interval = interval
+        self.bytes = 0
+        self.rows = 0
+        self.phase = 'dump'
+        self._lock = threading.Lock()
+        self._watched = None
+        self._watch_base = 0
+        self._started = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def for_history(cls, history):
+        """Tracker of a pending backup, expecting the size of the previous successful run"""
+        previous = BackupHistory.objects.filter(
+            server=history.server,
+            task=history.task,
+            status='success'
+        ).exclude(pk=history.pk).order_by('-started_at').first()
+        expected = (previous.raw_size or previous.file_size) if previous else None
+        return cls(history.pk, expected or None)
+
+    def add(self, nbytes=0, rows=0):
+        with self._lock:
+            self.bytes += nbytes
+            self.rows += rows
+
+    def set_phase(self, phase):
+        self.phase = phase
+        self._save()
+
+    @contextlib.contextmanager
+    def watch(self, path):
+        """Count the files written under path as progress while the block runs"""
+        with self._lock:
+            self._watched = path
+            self._watch_base = self.bytes
+        try:
+            yield self
+        finally:
+            self._poll()
+            with self._lock:
+                self._watched = None
+
+    def _poll(self):
+        path = self._watched
+        if path and os.path.exists(path):
+            size = directory_size(path)
+            with self._lock:
+                self.bytes = max(self.bytes, self._watch_base + size)
+
+    def snapshot(self):
+        """Current counters with throughput (bytes/s) and ETA (seconds, None when unknown)"""
+        with self._lock:
+            done = self.bytes
+            rows = self.rows
+        elapsed = max(time.monotonic() - self._started, 0.001) if self._started else 0.001
+        throughput = done / elapsed
+        eta = None
+        if self.expected_bytes and throughput > 0 and self.phase == 'dump':
+            # A run outgrowing the previous one stays at 0 until it finishes
+            eta = max(0, int((self.expected_bytes - done) / throughput))
+        return {
+            'phase': self.phase,
+            'bytes': done,
+            'rows': rows or None,
+            'expected_bytes': self.expected_bytes,
+            'throughput': throughput,
+            'eta_seconds': eta,
+        }
+
+    def _fields(self):
+        progress = self.snapshot()
+        return {
+            'progress_phase': progress['phase'],
+            'progress_bytes': progress['bytes'],
+            'progress_rows': progress['rows'],
+            'expected_bytes': progress['expected_bytes'],
+            'throughput': progress['throughput'],
+            'eta_seconds': progress['eta_seconds'],
+            'progress_updated_at': timezone.now(),
+        }
+
+    def _save(self):
+        try:
+            BackupHistory.objects.filter(pk=self.history_id).update(**self._fields())
+        except Exception as e:
+            file_log(f"PROGRESS: could not save progress of history {self.history_id}: {str(e)}")
+
+    def _report(self):
+        try:
+            while not self._stop.wait(self.interval):
+                self._poll()
+                self._save()
+        finally:
+            # The reporter thread has its own database connection
+            connection.close()
+
+    def start(self):
+        self._started = time.monotonic()
+        self._save()
+        self._thread = threading.Thread(target=self._report, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self._save()
+
+    def finish(self, history):
+        """Stop reporting and copy the final counters into history, so saving it keeps them"""
+        self.stop()
+        for field, value in self._fields().items():
+            setattr(history, field, value)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,150 @@
+# backup_manager/ratelimit.py
+"""
+Throughput limits of the byte streams between dump tools, the compressor and
+the uploaders. Dump limits are configured per DatabaseServer, upload limits per
+StorageConfig, both in bytes per second with a burst allowance and optional
+time-of-day windows overriding the rate, e.g. a lower limit during business hours.
+"""
+import re
+import time
+import datetime
+import threading
+from django.utils import timezone
+
+RATE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+# "08:00-18:00 10M": HH:MM-HH:MM and a rate with an optional K/M/G suffix, 0 lifts the limit
+WINDOW_RE = re.compile(
+    r'^(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s+(\d+(?:\.\d+)?)\s*([KMG]?)(?:B(?:/S)?)?$',
+    re.IGNORECASE
+)
+
+# Seconds between re-evaluations of the time-of-day windows
+RATE_REFRESH_INTERVAL = 30
+
+
+def parse_windows(text):
+    """Parse time-of-day windows, one per line. Raises ValueError on invalid lines"""
+    windows = []
+    for number, line in enumerate((text or '').splitlines(), start=1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        match = WINDOW_RE.match(line)
+        if not match:
+            raise ValueError(f"Line {number}: expected 'HH:MM-HH:MM RATE', e.g. '08:00-18:00 10M'")
+        start_h, start_m, end_h, end_m, value, unit = match.groups()
+        try:
+            start = datetime.time(int(start_h), int(start_m))
+            end = datetime.time(int(end_h), int(end_m))
+        except ValueError:
+            raise ValueError(f"Line {number}: invalid time")
+        windows.append((start, end, int(float(value) * RATE_UNITS[unit.upper()])))
+    return windows
+
+
+def window_rate(windows, default, now):
+    """Rate of the first window containing the time now, default outside every window"""
+    for start, end, rate in windows:
+        if start <= end:
+            inside = start <= now < end
+        else:
+            # Window across midnight
+            inside = now >= start or now < end
+        if inside:
+            return rate
+    return default
+
+
+# Limiters by model and primary key with the settings they were built from
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every stream of one server or storage. consume()
+    blocks the calling thread until the bytes fit the limit, which backpressures
+    the dump process or the upload through the pipe it reads from.
+    """
+
+    def __init__(self, rate=0, burst=0, windows=()):
+        self.default_rate = rate
+        self.burst = burst
+        self.windows = list(windows)
+        self._lock = threading.Lock()
+        self._rate = None
+        self._rate_checked = 0
+        self._tokens = None
+        self._last = time.monotonic()
+
+    @classmethod
+    def for_config(cls, config):
+        """
+        Limiter of a DatabaseServer or StorageConfig, None when it has no limits.
+        The same object is returned for every stream of the config in this process,
+        so consecutive uploads of small files share one bucket.
+        """
+        if config is None:
+            return None
+        settings = (config.rate_limit, config.rate_limit_burst, config.rate_limit_windows)
+        key = (config._meta.label, config.pk)
+        with _shared_lock:
+            cached = _shared.get(key)
+            if cached and cached[0] == settings:
+                return cached[1]
+            windows = parse_windows(config.rate_limit_windows)
+            limiter = cls(config.rate_limit, config.rate_limit_burst, windows) \
+                if config.rate_limit or windows else None
+            _shared[key] = (settings, limiter)
+            return limiter
+
+    def current_rate(self):
+        """Bytes per second allowed now, 0 for unlimited"""
+        now = time.monotonic()
+        if self._rate is None or now - self._rate_checked >= RATE_REFRESH_INTERVAL:
+            self._rate = window_rate(self.windows, self.default_rate, timezone.localtime().time())
+            self._rate_checked = now
+        return self._rate
+
+    def consume(self, nbytes):
+        with self._lock:
+            rate = self.current_rate()
+            if not rate:
+                return
+            # The bucket holds one second of traffic unless a larger burst is configured
+            capacity = max(self.burst, rate)
+            now = time.monotonic()
+            if self._tokens is None:
+                self._tokens = capacity
+            self._tokens = min(capacity, self._tokens + (now - self._last) * rate)
+            self._last = now
+            self._tokens -= nbytes
+            # Waiting off the lock, the debt makes the next callers wait their turn
+            wait = -self._tokens / rate if self._tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+class ThrottledReader:
+    """Readable stream passing reads of the wrapped stream through a RateLimiter"""
+
+    def __init__(self, fileobj, limiter):
+        self._fileobj = fileobj
+        self._limiter = limiter
+
+    def read(self, size=-1):
+        data = self._fileobj.read(size)
+        if data:
+            self._limiter.consume(len(data))
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._fileobj, name)
+
+
+def throttle(fileobj, limiter):
+    """fileobj limited by limiter, unchanged without one"""
+    if limiter is None:
+        return fileobj
+    return ThrottledReader(fileobj, limiter)
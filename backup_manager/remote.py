@@ -0,0 +1,109 @@
+# backup_manager/remote.py
+"""
+Dump tools running on the SSH host of a server. The tool and a compressor run
+in a shell on the remote side, only the compressed stream crosses the SSH
+channel. RemoteProcess gives the channel the Popen interface the pipeline
+and the ProcessSupervisor work with, over a connection of the SSH pool.
+"""
+import shlex
+import signal
+import subprocess
+from .models import file_log
+from .pipeline import DEFAULT_COMPRESSION_LEVELS
+
+# Compression on the SSH link when the task stores uncompressed artifacts
+TRANSPORT_COMPRESSION = ('gzip', 1)
+
+# Shell running cmd | compressor, exiting with the status of cmd rather than the compressor's.
+# POSIX sh has no pipefail, the status travels through fd 3 into the command substitution.
+PIPELINE_TEMPLATE = (
+    'exec 4>&1; '
+    'status=$({{ {{ {command} 3>&-; echo $? >&3; }} | {compressor} >&4; }} 3>&1); '
+    'exit ${{status:-1}}'
+)
+
+
+def compressor_command(compression, level):
+    if compression == 'gzip':
+        return f'gzip -c -{level}'
+    if compression == 'zstd':
+        ultra = ' --ultra' if level > 19 else ''
+        return f'zstd -q -c{ultra} -{level}'
+    raise ValueError(f"Unsupported compression: {compression}")
+
+
+def remote_pipeline(cmd, env=None, compression='gzip', level=1):
+    """Command line running cmd with env on the remote host, its output compressed"""
+    assignments = ''.join(f'{name}={shlex.quote(value)} ' for name, value in (env or {}).items())
+    command = assignments + ' '.join(shlex.quote(arg) for arg in cmd)
+    pipeline = PIPELINE_TEMPLATE.format(command=command, compressor=compressor_command(compression, level))
+    # Whatever the login shell of the SSH user is
+    return 'sh -c ' + shlex.quote(pipeline)
+
+
+class _ChannelReader:
+    """Reader of the stdout or stderr side of a channel with the file methods the pipeline uses"""
+
+    def __init__(self, channel, stderr=False):
+        self._recv = channel.recv_stderr if stderr else channel.recv
+
+    def read1(self, size=8192):
+        return self._recv(size)
+
+    def read(self, size=-1):
+        data = bytearray()
+        while size < 0 or len(data) < size:
+            block = self._recv(65536 if size < 0 else min(size - len(data), 65536))
+            if not block:
+                break
+            data.extend(block)
+        return bytes(data)
+
+    def close(self):
+        pass
+
+
+class RemoteProcess:
+    """Command running in a session channel of an SSH connection"""
+
+    def __init__(self, ssh_client, command):
+        self.args = command
+        self.returncode = None
+        self.channel = ssh_client.get_transport().open_session()
+        self.channel.exec_command(command)
+        self.stdout = _ChannelReader(self.channel)
+        self.stderr = _ChannelReader(self.channel, stderr=True)
+
+    def wait(self, timeout=None):
+        if self.returncode is None:
+            if not self.channel.status_event.wait(timeout):
+                raise subprocess.TimeoutExpired(self.args, timeout)
+            self.returncode = self.channel.recv_exit_status()
+        return self.returncode
+
+    def kill(self):
+        # SSH has no reliable way to signal the remote command. With the channel closed
+        # it writes into a closed pipe and dies of SIGPIPE.
+        if self.returncode is None:
+            self.returncode = -signal.SIGKILL
+        self.channel.close()
+
+
+class RemoteShell:
+    """
+    Starts dump tools on the SSH host of a server, piping their output through
+    a compressor there. compression is the format of the stream coming back.
+    """
+
+    def __init__(self, ssh_client, compression='none', level=None):
+        if compression in (None, 'none'):
+            compression, level = TRANSPORT_COMPRESSION
+        elif level is None:
+            level = DEFAULT_COMPRESSION_LEVELS[compression]
+        self.ssh_client = ssh_client
+        self.compression = compression
+        self.level = level
+
+    def popen(self, cmd, env=None):
+        file_log(f"REMOTE: running {cmd[0]} on the SSH host, {self.compression} -{self.level} over the link")
+        return RemoteProcess(self.ssh_client, remote_pipeline(cmd, env, self.compression, self.level))
@@ -1,16 +1,40 @@
 import os
-import paramiko
 import mysql.connector
 from mysql.connector import Error as MySQLError
 import psycopg2
 from psycopg2 import Error as PostgreSQLError
-import subprocess
+import shutil
+import tarfile
 import datetime
-import sshtunnel
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager, nullcontext
 from django.conf import settings
-from .models import DatabaseServer
+from .models import DatabaseServer, BackupHistory
+from .pipeline import (
+    stream_dump, open_artifact_writer, artifact_extension, resolve_threads, new_checksum, write_manifest, read_manifest, remove_artifact,
+    MANIFEST_SUFFIX, PG_DIRECTORY_SUFFIX, CHUNK_MANIFEST_SUFFIX, PARTS_MANIFEST_SUFFIX
+)
+from .chunkstore import ChunkStore
+from .sqlindex import SqlIndexBuilder
+from .supervisor import ProcessSupervisor
+from .ratelimit import RateLimiter
+from .encryption import ArtifactCipher
+from .remote import RemoteShell
+from .sshpool import ssh_pool, server_ssh_params
+from .health import cached_failure, connection_error, record_status
+from .mysql_engine import ParallelMySQLDumper
+from .pg_engine import ParallelPostgreSQLDumper
+from .tuning import DEFAULT_TUNING, profile_tuning, auto_tuning, mysqldump_options
+from .storage import StorageService, STREAMING_STORAGE_TYPES
+from .binlog import (
+    BinlogGapError, DUMP_HEAD_SIZE, binlog_dump_options, parse_binlog_position, capture_binlogs
+)
+from .wal import WalGapError, replication_slot_name, wal_staging_dir, take_base_backup, archive_wal
 import socket
 
+# Databases skipped when listing databases for per-database dumps
+MYSQL_SYSTEM_DATABASES = ('information_schema', 'performance_schema', 'sys')
+
 def direct_log(message):
     """Log message to a file in logs directory"""
     try:
@@ -30,18 +54,801 @@ def direct_log(message):
         except:
             pass
 
+def is_ssh_server(server):
+    return server.connection_type in ['ssh', 'ssh_mysql', 'ssh_postgresql']
+
+def ssh_tunnel(server):
+    """Local port forwarded to the database through the pooled SSH connection of the server"""
+    return ssh_pool.tunnel((server.hostname, int(server.port)), **server_ssh_params(server))
+
+@contextmanager
+def connection_endpoint(server):
+    """Yield (host, port) to connect to, opening SSH tunnel for SSH servers"""
+    if is_ssh_server(server):
+        with ssh_tunnel(server) as tunnel:
+            yield '127.0.0.1', tunnel.local_bind_port
+    else:
+        yield server.hostname, server.port
+
 class BackupService:
     """Service for performing database backups"""
     
-    def __init__(self, server_id):
+    def __init__(self, server_id, progress=None, supervisor=None):
         self.server = DatabaseServer.objects.get(id=server_id)
         self.timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
         self.backup_dir = settings.BACKUP_DIR
+        # Optional ProgressTracker of the running backup
+        self.progress = progress
+        # Timeout, cancellation and priority of the dump processes
+        self.supervisor = supervisor or ProcessSupervisor()
+        # Dump throughput limit of the server, shared by all its dump streams
+        self.limiter = RateLimiter.for_config(self.server)
+        # Encryption of the artifacts, set from the storage configuration of the task
+        self.cipher = None
+        # Dump tool options of the server, chosen once per backup
+        self._tuning = None
+        
+    def _dump_extension(self, task=None):
+        """Extension of a single dump artifact: (compressed) SQL file, chunk or parts manifest"""
+        if task and task.deduplicate:
+            return f".sql{CHUNK_MANIFEST_SUFFIX}"
+        extension = f".sql{artifact_extension(task.compression if task else 'none')}"
+        if task and task.split_size:
+            return f"{extension}{PARTS_MANIFEST_SUFFIX}"
+        return extension
+
+    def _backup_path(self, task=None):
+        """Build artifact path: DATETIME_SERVERNAME_SCHEDULENAME.sql[.gz|.zst][.chunks.json|.parts.json]"""
+        schedule_name = f"_{task.name}" if task else ""
+        backup_filename = f"{self.timestamp}_{self.server.name}{schedule_name}{self._dump_extension(task)}"
+        return os.path.join(self.backup_dir, backup_filename)
+
+    def _stream_dump(self, cmd, backup_path, task=None, env=None, upload=True, head_size=0, remote=None):
+        """
+        Stream dump tool output into the artifact using task compression settings.
+        With streaming upload enabled on the task the output goes to remote storage
+        while the dump runs, upload=False keeps it local (multi-file artifacts).
+        remote is the RemoteShell of dumps running on the SSH host. Artifacts are
+        encrypted when the storage configuration has a key, deduplicated ones are not
+        (a warning is logged, BackupTaskForm rejects deduplicating to such storage).
+        Artifacts with a local copy get a table index for single table restores unless
+        the task turns it off, see BackupTask.table_index.
+        """
+        compression = task.compression if task else 'none'
+        level = task.compression_level if task else None
+        threads = resolve_threads(task.compression_threads) if task else 1
+        part_size = task.split_size * 1024 * 1024 if task else 0
+        index = None
+        if task is None or task.table_index:
+            index = SqlIndexBuilder('postgresql' if self._is_postgresql() else 'mysql', self.server.database_name)
+
+        if task and task.deduplicate:
+            if self.cipher:
+                # Chunks are shared between artifacts and cannot be encrypted, the form rejects
+                # this combination but the storage configuration may have got a key since
+                direct_log(f"SERVICES: WARNING - schedule {task.name} deduplicates dumps, chunks are "
+                           f"stored unencrypted although storage {task.storage_config} has an encryption key")
+            # New chunks are uploaded after the dump, see StorageService
+            return stream_dump(cmd, backup_path, compression, level, env=env,
+                               head_size=head_size, chunk_store=ChunkStore(), progress=self.progress,
+                               supervisor=self.supervisor, limiter=self.limiter, remote=remote)
+        # Split artifacts are uploaded part by part after the dump
+        if upload and task and task.stream_upload and task.storage_type in STREAMING_STORAGE_TYPES and not part_size:
+            return stream_dump(
+                cmd, backup_path, compression, level, env=env,
+                upload=lambda reader: StorageService.store_stream(reader, backup_path, task),
+                keep_local=task.keep_local_copy,
+                head_size=head_size,
+                progress=self.progress,
+                supervisor=self.supervisor,
+                limiter=self.limiter,
+                remote=remote,
+                cipher=self.cipher,
+                threads=threads,
+                index=index,
+            )
+        return stream_dump(cmd, backup_path, compression, level, env=env, head_size=head_size,
+                           progress=self.progress, supervisor=self.supervisor, limiter=self.limiter,
+                           remote=remote, cipher=self.cipher, threads=threads, part_size=part_size,
+                           index=index)
+
+    @contextmanager
+    def _remote_shell(self, task=None):
+        """RemoteShell on the SSH host of the server, compressing the way the task stores artifacts"""
+        with ssh_pool.connection(**server_ssh_params(self.server)) as ssh_client:
+            yield RemoteShell(ssh_client, task.compression if task else 'none',
+                              task.compression_level if task else None)
+
+    def _watch_progress(self, path):
+        """Count files a dump tool writes under path as progress"""
+        if self.progress:
+            return self.progress.watch(path)
+        return nullcontext()
+
+    def _mysql_tool_dump(self, cmd, backup_path, task=None, remote=None):
+        """Run mysqldump, recording the binlog position of its snapshot when enabled"""
+        if not self.server.binlog_backups:
+            return self._stream_dump(cmd, backup_path, task, remote=remote)
+
+        cmd = cmd + binlog_dump_options()
+        result = self._stream_dump(cmd, backup_path, task, head_size=DUMP_HEAD_SIZE, remote=remote)
+        if result['success']:
+            result['binlog_position'] = parse_binlog_position(result.pop('head'))
+            direct_log(f"SERVICES: dump taken at binlog position {result['binlog_position']}")
+        return result
+
+    def _is_postgresql(self):
+        return 'postgresql' in self.server.connection_type
+
+    def _connection_endpoint(self):
+        return connection_endpoint(self.server)
+
+    def _list_databases(self, host, port):
+        """List databases on the server that should be dumped"""
+        if self._is_postgresql():
+            conn = psycopg2.connect(
+                host=host, port=port, user=self.server.username,
+                password=self.server.password, dbname='postgres'
+            )
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT datname FROM pg_database "
+                "WHERE datallowconn AND NOT datistemplate ORDER BY datname"
+            )
+        else:
+            conn = mysql.connector.connect(
+                host=host, port=port, user=self.server.username,
+                password=self.server.password
+            )
+            cursor = conn.cursor()
+            cursor.execute("SHOW DATABASES")
+
+        databases = [row[0] for row in cursor.fetchall()]
+        cursor.close()
+        conn.close()
+        return [db for db in databases if db not in MYSQL_SYSTEM_DATABASES]
+
+    def _database_dump_cmd(self, host, port, database):
+        """Build dump command for a single database of a per-database backup"""
+        if self._is_postgresql():
+            if database is None:
+                # Roles and tablespaces are not part of any single database dump
+                return [
+                    'pg_dumpall', '-h', host, '-p', str(port),
+                    '-U', self.server.username, '--globals-only',
+                ]
+            return [
+                'pg_dump', '-h', host, '-p', str(port),
+                '-U', self.server.username,
+                '-F', 'p',
+                '-b',
+                '--create',  # Restore recreates and connects to the database
+                database,
+            ]
+        return [
+            'mysqldump',
+            f'--host={host}',
+            f'--port={port}',
+            f'--user={self.server.username}',
+            f'--password={self.server.password}',
+            *self._mysqldump_options(),
+            '--routines',
+            '--triggers',
+            '--events',
+            '--databases', database,  # Includes CREATE DATABASE and USE statements
+        ]
+
+    def _manifest_paths(self, task=None):
+        """Directory for the files of a multi-file artifact and its manifest path"""
+        base_path = self._backup_path(task)
+        base_path = base_path[:base_path.rindex('.sql')]
+        return base_path, f"{base_path}{MANIFEST_SUFFIX}"
+
+    def _parallel_database_backup(self, task=None):
+        """
+        Dumps every database of the server concurrently in a bounded worker pool.
+        Each database gets its own artifact, a manifest ties them together.
+        """
+        base_path, manifest_path = self._manifest_paths(task)
+        extension = self._dump_extension(task)
+
+        env = os.environ.copy()
+        env['PGPASSWORD'] = self.server.password
+
+        try:
+            with self._connection_endpoint() as (host, port):
+                databases = self._list_databases(host, port)
+                direct_log(f"SERVICES: per-database backup of {len(databases)} databases, "
+                           f"{self.server.parallel_workers} workers")
+
+                # File names stay unique when uploaded flat to remote storage
+                prefix = os.path.basename(base_path)
+                jobs = [(db, f"{prefix}_{db}{extension}") for db in databases]
+                if self._is_postgresql():
+                    jobs.insert(0, (None, f"{prefix}__globals{extension}"))
+
+                os.makedirs(base_path, exist_ok=True)
+                artifacts = {}
+                errors = []
+                workers = max(1, min(self.server.parallel_workers, len(jobs)))
+
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    futures = {
+                        executor.submit(
+                            self._stream_dump,
+                            self._database_dump_cmd(host, port, db),
+                            os.path.join(base_path, filename),
+                            task,
+                            env,
+                            False,
+                        ): (db, filename)
+                        for db, filename in jobs
+                    }
+                    for future in as_completed(futures):
+                        db, filename = futures[future]
+                        try:
+                            result = future.result()
+                        except Exception as e:
+                            result = {'success': False, 'message': str(e)}
+                        if result['success']:
+                            artifacts[filename] = {
+                                'database': db,
+                                'file': filename,
+                                'raw_size': result['raw_size'],
+                                'file_size': result['file_size'],
+                                'checksum': result.get('checksum'),
+                            }
+                        else:
+                            errors.append(f"{db or 'globals'}: {result['message']}")
+        except Exception as e:
+            remove_artifact(manifest_path)
+            return {
+                'success': False,
+                'message': f'Per-database backup error: {str(e)}'
+            }
+
+        if errors:
+            remove_artifact(manifest_path)
+            return {
+                'success': False,
+                'message': 'Backup execution error: ' + '\n'.join(errors)
+            }
+
+        # Keep the order of the job list so restores replay globals first
+        ordered = [artifacts[filename] for _, filename in jobs]
+        write_manifest(manifest_path, {
+            'server': self.server.name,
+            'engine': 'postgresql' if self._is_postgresql() else 'mysql',
+            'created_at': self.timestamp,
+            'compression': task.compression if task else 'none',
+            'artifacts': ordered,
+        })
+
+        return {
+            'success': True,
+            'path': manifest_path,
+            'raw_size': sum(a['raw_size'] for a in ordered),
+            'file_size': sum(a['file_size'] for a in ordered),
+            'message': f'Per-database backup of {len(databases)} databases completed successfully'
+        }
+
+    def _mysql_engine_backup(self, task=None):
+        """
+        Dumps MySQL with the table-parallel engine: several connections share one
+        consistent snapshot and every table chunk is written to its own file.
+        """
+        base_path, manifest_path = self._manifest_paths(task)
+        compression = task.compression if task else 'none'
+
+        try:
+            with self._connection_endpoint() as (host, port):
+                if self.server.database_name:
+                    databases = [self.server.database_name]
+                else:
+                    databases = self._list_databases(host, port)
+
+                os.makedirs(base_path, exist_ok=True)
+                dumper = ParallelMySQLDumper(
+                    {
+                        'host': host,
+                        'port': port,
+                        'user': self.server.username,
+                        'password': self.server.password,
+                    },
+                    databases,
+                    base_path,
+                    os.path.basename(base_path),
+                    workers=self.server.parallel_workers,
+                    chunk_rows=self.server.chunk_rows,
+                    compression=compression,
+                    level=task.compression_level if task else None,
+                    change_detection=self.server.skip_unchanged_tables,
+                    previous=self._previous_manifest('mysql_parallel'),
+                    progress=self.progress,
+                    supervisor=self.supervisor,
+                    limiter=self.limiter,
+                    cipher=self.cipher,
+                )
+                artifacts = dumper.run()
+        except Exception as e:
+            remove_artifact(manifest_path)
+            return {
+                'success': False,
+                'message': f'Table-parallel backup error: {str(e)}'
+            }
+
+        write_manifest(manifest_path, {
+            'server': self.server.name,
+            'engine': 'mysql_parallel',
+            'created_at': self.timestamp,
+            'compression': compression,
+            'binlog_position': dumper.binlog_position,
+            'change_detection': self.server.skip_unchanged_tables,
+            'fingerprints': dumper.fingerprints,
+            'artifacts': artifacts,
+        })
+
+        message = f'Table-parallel backup completed successfully ({len(artifacts)} files'
+        if dumper.carried_tables:
+            message += f', {dumper.carried_tables} unchanged tables reused'
+
+        return {
+            'success': True,
+            'path': manifest_path,
+            'raw_size': sum(a['raw_size'] for a in artifacts),
+            'file_size': sum(a['file_size'] for a in artifacts),
+            'binlog_position': dumper.binlog_position,
+            'message': message + ')'
+        }
+
+    def _postgresql_copy_backup(self, task=None):
+        """
+        Dumps PostgreSQL with the native engine, without pg_dump: the schema is read
+        from the catalogs and every table is streamed with COPY TO STDOUT over
+        connections sharing one exported snapshot, each to its own file.
+        """
+        base_path, manifest_path = self._manifest_paths(task)
+        compression = task.compression if task else 'none'
+
+        try:
+            with self._connection_endpoint() as (host, port):
+                if self.server.database_name:
+                    databases = [self.server.database_name]
+                else:
+                    databases = self._list_databases(host, port)
+
+                os.makedirs(base_path, exist_ok=True)
+                dumper = ParallelPostgreSQLDumper(
+                    {
+                        'host': host,
+                        'port': port,
+                        'user': self.server.username,
+                        'password': self.server.password,
+                    },
+                    databases,
+                    base_path,
+                    os.path.basename(base_path),
+                    workers=self.server.parallel_workers,
+                    compression=compression,
+                    level=task.compression_level if task else None,
+                    progress=self.progress,
+                    supervisor=self.supervisor,
+                    limiter=self.limiter,
+                    cipher=self.cipher,
+                )
+                artifacts = dumper.run()
+        except Exception as e:
+            remove_artifact(manifest_path)
+            return {
+                'success': False,
+                'message': f'Native PostgreSQL backup error: {str(e)}'
+            }
+
+        write_manifest(manifest_path, {
+            'server': self.server.name,
+            'engine': 'pg_copy',
+            'created_at': self.timestamp,
+            'compression': compression,
+            'server_version': dumper.server_version,
+            'artifacts': artifacts,
+        })
+
+        return {
+            'success': True,
+            'path': manifest_path,
+            'raw_size': sum(a['raw_size'] for a in artifacts),
+            'file_size': sum(a['file_size'] for a in artifacts),
+            'message': f'Native PostgreSQL backup completed successfully ({len(artifacts)} files)'
+        }
+
+    def _previous_manifest(self, engine):
+        """Manifest of the latest successful backup of the server written by engine, None if gone"""
+        if self.server.skip_unchanged_tables == 'off':
+            return None
+        candidates = BackupHistory.objects.filter(
+            server=self.server,
+            status='success',
+            file_path__endswith=MANIFEST_SUFFIX
+        ).order_by('-started_at')
+        for history in candidates[:10]:
+            if not os.path.exists(history.file_path):
+                continue
+            try:
+                manifest = read_manifest(history.file_path)
+            except (OSError, ValueError):
+                continue
+            if manifest.get('engine') == engine:
+                return manifest
+        return None
+
+    def _dump_tuning(self):
+        """Dump tool options of the server profile, an auto profile inspects the server on first use"""
+        if self._tuning is None:
+            profile = self.server.dump_profile
+            if profile is None:
+                self._tuning = dict(DEFAULT_TUNING)
+            elif profile.mode == 'manual':
+                self._tuning = profile_tuning(profile)
+            else:
+                try:
+                    with self._connection_endpoint() as (host, port):
+                        self._tuning = auto_tuning(self.server, host, port)
+                except Exception as e:
+                    direct_log(f"SERVICES: automatic tuning failed, using the defaults: {str(e)}")
+                    self._tuning = dict(DEFAULT_TUNING)
+        return self._tuning
+
+    def _mysqldump_options(self):
+        return mysqldump_options(self._dump_tuning())
+
+    def _pg_compress_option(self, task=None):
+        """pg_dump -Z value matching the task compression settings and the tuning of the server"""
+        compression = task.compression if task else 'none'
+        level = task.compression_level if task else None
+        if self._dump_tuning()['pg_compression_level'] is not None:
+            level = self._dump_tuning()['pg_compression_level']
+        if compression == 'none':
+            return '0'
+        elif compression == 'zstd':
+            return f"zstd:{level or 3}"  # Requires pg_dump 16 or newer
+        return str(level or 6)
+
+    def _postgresql_directory_backup(self, task=None):
+        """
+        Dumps PostgreSQL in directory format with parallel jobs (pg_dump -Fd -j).
+        Dump directories (one per database) are packaged into a single tar artifact
+        that can be restored in parallel with pg_restore -j.
+        """
+        base_path = self._backup_path(task)
+        base_path = base_path[:base_path.rindex('.sql')]
+        artifact_path = f"{base_path}{PG_DIRECTORY_SUFFIX}"
+        work_dir = f"{base_path}.tmp"
+        jobs = max(1, self.server.parallel_workers)
+
+        env = os.environ.copy()
+        env['PGPASSWORD'] = self.server.password
+
+        try:
+            os.makedirs(work_dir)
+            with self._connection_endpoint() as (host, port):
+                if self.server.database_name:
+                    databases = [self.server.database_name]
+                else:
+                    databases = self._list_databases(host, port)
+                    # Roles and tablespaces are not part of any single database dump
+                    result = stream_dump(
+                        self._database_dump_cmd(host, port, None),
+                        os.path.join(work_dir, 'globals.sql'),
+                        env=env,
+                        supervisor=self.supervisor
+                    )
+                    if not result['success']:
+                        raise RuntimeError(f"globals: {result['message']}")
+
+                for database in databases:
+                    direct_log(f"SERVICES: pg_dump -Fd -j {jobs} of database {database}")
+                    cmd = [
+                        'pg_dump',
+                        '-h', host,
+                        '-p', str(port),
+                        '-U', self.server.username,
+                        '-F', 'd',  # Directory format, one file per table
+                        '-j', str(jobs),
+                        '-Z', self._pg_compress_option(task),
+                        '-b',
+                        '-f', os.path.join(work_dir, database),
+                        database,
+                    ]
+                    with self._watch_progress(os.path.join(work_dir, database)):
+                        result = self.supervisor.run(cmd, env=env)
+                    if result.returncode != 0:
+                        raise RuntimeError(f"{database}: {self.supervisor.failure(result.stderr)}")
+
+            digest = new_checksum()
+            with open_artifact_writer(artifact_path, cipher=self.cipher, digest=digest) as out, \
+                    tarfile.open(fileobj=out, mode='w|') as tar:
+                for name in sorted(os.listdir(work_dir)):
+                    tar.add(os.path.join(work_dir, name), arcname=name)
+
+        except Exception as e:
+            remove_artifact(artifact_path)
+            return {
+                'success': False,
+                'message': f'PostgreSQL directory backup error: {str(e)}'
+            }
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        return {
+            'success': True,
+            'path': artifact_path,
+            'file_size': os.path.getsize(artifact_path),
+            'checksum': digest.hexdigest(),
+            'message': f'PostgreSQL directory format backup completed successfully ({jobs} jobs)'
+        }
+
+    def _pg_connect_params(self, host, port):
+        return {
+            'host': host,
+            'port': port,
+            'user': self.server.username,
+            'password': self.server.password,
+            'dbname': self.server.database_name or 'postgres',
+        }
+
+    def _postgresql_base_backup(self, task=None):
+        """
+        Physical backup of the whole PostgreSQL cluster with pg_basebackup. Starts
+        a new WAL chain that incremental backups archive with pg_receivewal.
+        """
+        base_path, manifest_path = self._manifest_paths(task)
+        compression = task.compression if task else 'none'
+
+        env = os.environ.copy()
+        env['PGPASSWORD'] = self.server.password
+
+        try:
+            with self._connection_endpoint() as (host, port):
+                os.makedirs(base_path, exist_ok=True)
+                with self._watch_progress(base_path):
+                    artifacts, end_lsn = take_base_backup(
+                        self._pg_connect_params(host, port),
+                        env,
+                        replication_slot_name(self.server),
+                        base_path,
+                        os.path.basename(base_path),
+                        wal_staging_dir(self.server),
+                        compression=compression,
+                        level=task.compression_level if task else None,
+                        supervisor=self.supervisor,
+                        max_rate=self.limiter.current_rate() if self.limiter else None,
+                        cipher=self.cipher,
+                    )
+        except Exception as e:
+            remove_artifact(manifest_path)
+            return {
+                'success': False,
+                'message': f'PostgreSQL base backup error: {str(e)}'
+            }
+
+        write_manifest(manifest_path, {
+            'server': self.server.name,
+            'engine': 'pg_basebackup',
+            'created_at': self.timestamp,
+            'compression': compression,
+            'end_lsn': end_lsn,
+            'artifacts': artifacts,
+        })
+
+        return {
+            'success': True,
+            'path': manifest_path,
+            'raw_size': sum(a['raw_size'] for a in artifacts),
+            'file_size': sum(a['file_size'] for a in artifacts),
+            'wal_lsn': end_lsn,
+            'message': f'PostgreSQL base backup completed successfully (WAL end point {end_lsn})'
+        }
+
+    def _postgresql_wal_backup(self, task, parent):
+        """
+        Incremental PostgreSQL backup: archives the WAL written since the parent
+        backup. Raises WalGapError when the WAL chain cannot be continued.
+        """
+        base_path, manifest_path = self._manifest_paths(task)
+        compression = task.compression if task else 'none'
+
+        env = os.environ.copy()
+        env['PGPASSWORD'] = self.server.password
+
+        try:
+            with self._connection_endpoint() as (host, port):
+                os.makedirs(base_path, exist_ok=True)
+                with self._watch_progress(base_path):
+                    artifacts, end_lsn = archive_wal(
+                        self._pg_connect_params(host, port),
+                        env,
+                        replication_slot_name(self.server),
+                        wal_staging_dir(self.server),
+                        base_path,
+                        os.path.basename(base_path),
+                        compression=compression,
+                        level=task.compression_level if task else None,
+                        supervisor=self.supervisor,
+                        cipher=self.cipher,
+                    )
+        except WalGapError:
+            remove_artifact(manifest_path)
+            raise
+        except Exception as e:
+            remove_artifact(manifest_path)
+            return {
+                'success': False,
+                'message': f'WAL archiving error: {str(e)}'
+            }
+
+        write_manifest(manifest_path, {
+            'server': self.server.name,
+            'engine': 'pg_wal',
+            'created_at': self.timestamp,
+            'compression': compression,
+            'start_lsn': parent.wal_lsn,
+            'end_lsn': end_lsn,
+            'artifacts': artifacts,
+        })
+
+        return {
+            'success': True,
+            'path': manifest_path,
+            'raw_size': sum(a['raw_size'] for a in artifacts),
+            'file_size': sum(a['file_size'] for a in artifacts),
+            'backup_type': 'incremental',
+            'parent_id': parent.id,
+            'wal_lsn': end_lsn,
+            'message': f"WAL archived successfully ({len(artifacts)} segments from {parent.wal_lsn} to {end_lsn})"
+        }
+
+    def _chain_parent(self):
+        """Latest backup of the server an incremental backup can continue from"""
+        candidates = BackupHistory.objects.filter(
+            server=self.server,
+            status='success'
+        ).order_by('-started_at')
+        if self._is_postgresql():
+            candidates = candidates.exclude(wal_lsn='')
+        else:
+            candidates = candidates.filter(binlog_position__isnull=False).exclude(binlog_file='')
         
+        for history in candidates:
+            # Every backup of the chain must still be on disk to be restorable
+            if history.is_restorable():
+                return history
+        return None
+
+    def _mysql_binlog_backup(self, task, parent):
+        """
+        Incremental MySQL backup: copies the binary logs written since the parent
+        backup ended. Raises BinlogGapError when the server no longer has them.
+        """
+        base_path, manifest_path = self._manifest_paths(task)
+        compression = task.compression if task else 'none'
+        start = {'file': parent.binlog_file, 'position': parent.binlog_position}
+
+        try:
+            with self._connection_endpoint() as (host, port):
+                os.makedirs(base_path, exist_ok=True)
+                with self._watch_progress(base_path):
+                    artifacts, end = capture_binlogs(
+                        {
+                            'host': host,
+                            'port': port,
+                            'user': self.server.username,
+                            'password': self.server.password,
+                        },
+                        start,
+                        base_path,
+                        os.path.basename(base_path),
+                        compression=compression,
+                        level=task.compression_level if task else None,
+                        supervisor=self.supervisor,
+                        cipher=self.cipher,
+                    )
+        except BinlogGapError:
+            remove_artifact(manifest_path)
+            raise
+        except Exception as e:
+            remove_artifact(manifest_path)
+            return {
+                'success': False,
+                'message': f'Incremental backup error: {str(e)}'
+            }
+
+        write_manifest(manifest_path, {
+            'server': self.server.name,
+            'engine': 'mysql_binlog',
+            'created_at': self.timestamp,
+            'compression': compression,
+            'start_position': start,
+            'end_position': end,
+            'artifacts': artifacts,
+        })
+
+        return {
+            'success': True,
+            'path': manifest_path,
+            'raw_size': sum(a['raw_size'] for a in artifacts),
+            'file_size': sum(a['file_size'] for a in artifacts),
+            'backup_type': 'incremental',
+            'parent_id': parent.id,
+            'binlog_position': end,
+            'message': f"Incremental backup completed successfully ({len(artifacts)} binary logs "
+                       f"from {start['file']}:{start['position']} to {end['file']}:{end['position']})"
+        }
+
     def execute_backup(self, task=None):
-        """Executes backup depending on connection type"""
+        """
+        Executes backup depending on connection type. A recent failed health
+        check fails it right away, the dump tool reports any other connection
+        problem itself and the outcome refreshes the cached server status.
+        """
+        failure = cached_failure(self.server)
+        if failure:
+            direct_log(f"SERVICES: {failure}")
+            return {'success': False, 'message': failure}
+        
+        try:
+            self.cipher = ArtifactCipher.for_task(task)
+        except ValueError as e:
+            return {'success': False, 'message': f'Encryption key error: {str(e)}'}
+        
+        result = self._dispatch_backup(task)
+        if result['success']:
+            record_status(self.server, True, 'Reachable, backup completed')
+        else:
+            error = connection_error(result['message'])
+            if error:
+                record_status(self.server, False, error)
+                result['message'] = f'Connection error: {error}'
+        return result
+    
+    def _dispatch_backup(self, task=None):
+        """Runs the backup method matching the server configuration"""
         direct_log(f"SERVICES: Schedule name - {task}")
         
+        if task and task.backup_type == 'incremental':
+            if self._is_postgresql():
+                supported = self.server.dump_engine == 'pg_basebackup'
+                incremental_backup = self._postgresql_wal_backup
+            else:
+                supported = self.server.binlog_backups
+                incremental_backup = self._mysql_binlog_backup
+            if not supported:
+                return {
+                    'success': False,
+                    'message': 'Incremental backups require binary log backups (MySQL) or the '
+                               'pg_basebackup dump engine (PostgreSQL) enabled on the server'
+                }
+            parent = self._chain_parent()
+            if parent:
+                try:
+                    return incremental_backup(task, parent)
+                except (BinlogGapError, WalGapError) as e:
+                    direct_log(f"SERVICES: {str(e)}, starting a new chain with a full backup")
+            else:
+                direct_log("SERVICES: no backup to continue the chain from, taking a full backup")
+        
+        if self.server.dump_engine == 'mysql_parallel' and not self._is_postgresql():
+            return self._mysql_engine_backup(task)
+        if self.server.dump_engine == 'pg_directory' and self._is_postgresql():
+            return self._postgresql_directory_backup(task)
+        if self.server.dump_engine == 'pg_basebackup' and self._is_postgresql():
+            return self._postgresql_base_backup(task)
+        if self.server.dump_engine == 'pg_copy' and self._is_postgresql():
+            return self._postgresql_copy_backup(task)
+        
+        # Without a specific database, dump databases concurrently if configured
+        if not self.server.database_name and self.server.parallel_workers > 1:
+            return self._parallel_database_backup(task)
+        
         # Handling both old and new connection types
         if self.server.connection_type in ['direct', 'direct_mysql']:
             return self._direct_mysql_backup(task)
@@ -57,25 +864,8 @@ class BackupService:
     def _direct_mysql_backup(self, task=None):
         """Performs direct MySQL database backup through TCP/IP"""
         try:
-            # Test connection to database
-            conn_params = {
-                'host': self.server.hostname,
-                'port': self.server.port,
-                'user': self.server.username,
-                'password': self.server.password,
-            }
-            
-            # Add database to connection parameters if specified
-            if self.server.database_name:
-                conn_params['database'] = self.server.database_name
-                
-            conn = mysql.connector.connect(**conn_params)
-            conn.close()
-            
             # Backup filename with new format: DATETIME_SERVERNAME_SCHEDULENAME.sql
-            schedule_name = f"_{task.name}" if task else ""
-            backup_filename = f"{self.timestamp}_{self.server.name}{schedule_name}.sql"
-            backup_path = os.path.join(self.backup_dir, backup_filename)
+            backup_path = self._backup_path(task)
             
             # Execute mysqldump
             cmd = [
@@ -92,27 +882,22 @@ class BackupService:
             else:
                 cmd.append('--all-databases')
             
-            # Path to output file
-            cmd.append(f'--result-file={backup_path}')
+            # Snapshot, row streaming and INSERT sizing of the server tuning
+            cmd.extend(self._mysqldump_options())
             
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            # Stream dump output into the (compressed) artifact
+            result = self._mysql_tool_dump(cmd, backup_path, task)
             
-            if result.returncode == 0:
-                return {
-                    'success': True,
-                    'path': backup_path,
-                    'message': 'Backup completed successfully'
-                }
+            if result['success']:
+                result['message'] = 'Backup completed successfully'
             else:
-                return {
-                    'success': False,
-                    'message': f'Backup execution error: {result.stderr}'
-                }
+                result['message'] = f"Backup execution error: {result['message']}"
+            return result
                 
         except Exception as e:
             return {
                 'success': False,
-                'message': f'Connection error: {str(e)}'
+                'message': f'Backup error: {str(e)}'
             }
     
     def _ssh_tunnel_mysql_backup(self, task=None):
@@ -133,67 +918,33 @@ class BackupService:
                 }
             
             # Backup filename with new format: DATETIME_SERVERNAME_SCHEDULENAME.sql
-            schedule_name = f"_{task.name}" if task else ""
-            backup_filename = f"{self.timestamp}_{self.server.name}{schedule_name}.sql"
-            backup_path = os.path.join(self.backup_dir, backup_filename)
-            
-            # Creating SSH tunnel
-            ssh_config = {
-                'ssh_address_or_host': (self.server.ssh_hostname, int(self.server.ssh_port)),
-                'ssh_username': self.server.ssh_username,
-                'remote_bind_address': (self.server.hostname, int(self.server.port))
-            }
+            backup_path = self._backup_path(task)
             
-            # Adding authentication method
-            if self.server.ssh_password:
-                ssh_config['ssh_password'] = self.server.ssh_password
-            elif self.server.ssh_key_file and self.server.ssh_key_file.path:
-                ssh_config['ssh_pkey'] = self.server.ssh_key_file.path
-                
-            # Create SSH tunnel
-            with sshtunnel.SSHTunnelForwarder(**ssh_config) as tunnel:
-                # Execute backup through tunnel - mysqldump connects to local port
-                cmd = [
-                    'mysqldump',
-                    '--host=127.0.0.1',
-                    f'--port={tunnel.local_bind_port}',
-                    f'--user={self.server.username}',
-                    f'--password={self.server.password}',
-                ]
+            if self.server.ssh_dump_mode == 'remote':
+                # mysqldump runs on the SSH host, only compressed output crosses the link
+                with self._remote_shell(task) as remote:
+                    cmd = self._ssh_mysqldump_cmd(self.server.hostname, self.server.port, compress=False)
+                    result = self._mysql_tool_dump(cmd, backup_path, task, remote=remote)
                 
-                # Add option to select database or all databases
-                if self.server.database_name:
-                    cmd.append(self.server.database_name)
+                if result['success']:
+                    result['message'] = 'Backup completed successfully on the SSH host'
                 else:
-                    cmd.append('--all-databases')
-                
-                # Add useful options for large databases
-                cmd.extend([
-                    '--single-transaction',    # Consistent backup without table locks
-                    '--quick',                 # Less memory usage for large tables
-                    '--compress',              # Data compression between client and server
-                    '--routines',              # Include procedures and functions
-                    '--triggers',              # Include triggers
-                    '--events'                 # Include events
-                ])
-                
-                # Path to output file
-                cmd.append(f'--result-file={backup_path}')
+                    result['message'] = f"Backup execution error: {result['message']}"
+                return result
+            
+            # Create SSH tunnel over the pooled connection to the SSH host
+            with ssh_tunnel(self.server) as tunnel:
+                # Execute backup through tunnel - mysqldump connects to local port
+                cmd = self._ssh_mysqldump_cmd('127.0.0.1', tunnel.local_bind_port)
                 
-                # Run mysqldump
-                result = subprocess.run(cmd, capture_output=True, text=True)
+                # Run mysqldump, streaming output into the (compressed) artifact
+                result = self._mysql_tool_dump(cmd, backup_path, task)
                 
-                if result.returncode == 0:
-                    return {
-                        'success': True,
-                        'path': backup_path,
-                        'message': 'Backup completed successfully through SSH tunnel'
-                    }
+                if result['success']:
+                    result['message'] = 'Backup completed successfully through SSH tunnel'
                 else:
-                    return {
-                        'success': False,
-                        'message': f'Backup execution error: {result.stderr}'
-                    }
+                    result['message'] = f"Backup execution error: {result['message']}"
+                return result
             
         except Exception as e:
             return {
@@ -201,31 +952,38 @@ class BackupService:
                 'message': f'SSH tunnel error: {str(e)}'
             }
     
+    def _ssh_mysqldump_cmd(self, host, port, compress=True):
+        """mysqldump command of SSH servers, compress uses the client/server protocol compression"""
+        cmd = [
+            'mysqldump',
+            f'--host={host}',
+            f'--port={port}',
+            f'--user={self.server.username}',
+            f'--password={self.server.password}',
+        ]
+        
+        # Add option to select database or all databases
+        if self.server.database_name:
+            cmd.append(self.server.database_name)
+        else:
+            cmd.append('--all-databases')
+        
+        # Snapshot, row streaming and INSERT sizing of the server tuning
+        cmd.extend(self._mysqldump_options())
+        cmd.extend([
+            '--routines',              # Include procedures and functions
+            '--triggers',              # Include triggers
+            '--events'                 # Include events
+        ])
+        if compress:
+            cmd.append('--compress')   # Data compression between client and server
+        return cmd
+    
     def _direct_postgresql_backup(self, task=None):
         """Performs direct PostgreSQL database backup through TCP/IP"""
         try:
-            # Test connection to database
-            conn_params = {
-                'host': self.server.hostname,
-                'port': self.server.port,
-                'user': self.server.username,
-                'password': self.server.password,
-            }
-            
-            # Add database to connection parameters if specified
-            if self.server.database_name:
-                conn_params['dbname'] = self.server.database_name
-            else:
-                # For PostgreSQL, we need a specific database to connect to
-                conn_params['dbname'] = 'postgres'  # Connect to default database
-                
-            conn = psycopg2.connect(**conn_params)
-            conn.close()
-            
             # Backup filename
-            schedule_name = f"_{task.name}" if task else ""
-            backup_filename = f"{self.timestamp}_{self.server.name}{schedule_name}.sql"
-            backup_path = os.path.join(self.backup_dir, backup_filename)
+            backup_path = self._backup_path(task)
             
             # Set environment variables for pg_dump
             env = os.environ.copy()
@@ -241,7 +999,6 @@ class BackupService:
                 '-F', 'p',  # Custom format (compressed)
                 '-b',       # Include large objects
                 '-v',       # Verbose mode
-                '-f', backup_path
             ]
             
             # Add database name
@@ -254,28 +1011,21 @@ class BackupService:
                     '-h', self.server.hostname,
                     '-p', str(self.server.port),
                     '-U', self.server.username,
-                    '-f', backup_path
                 ]
             
-            # Execute pg_dump
-            result = subprocess.run(cmd, env=env, capture_output=True, text=True)
+            # Execute pg_dump, streaming output into the (compressed) artifact
+            result = self._stream_dump(cmd, backup_path, task, env=env)
             
-            if result.returncode == 0:
-                return {
-                    'success': True,
-                    'path': backup_path,
-                    'message': 'PostgreSQL backup completed successfully'
-                }
+            if result['success']:
+                result['message'] = 'PostgreSQL backup completed successfully'
             else:
-                return {
-                    'success': False,
-                    'message': f'PostgreSQL backup error: {result.stderr}'
-                }
+                result['message'] = f"PostgreSQL backup error: {result['message']}"
+            return result
                 
         except Exception as e:
             return {
                 'success': False,
-                'message': f'PostgreSQL connection error: {str(e)}'
+                'message': f'PostgreSQL backup error: {str(e)}'
             }
     
     def _ssh_tunnel_postgresql_backup(self, task=None):
@@ -296,69 +1046,39 @@ class BackupService:
                 }
             
             # Backup filename
-            schedule_name = f"_{task.name}" if task else ""
-            backup_filename = f"{self.timestamp}_{self.server.name}{schedule_name}.sql"
-            backup_path = os.path.join(self.backup_dir, backup_filename)
-            
-            # Creating SSH tunnel
-            ssh_config = {
-                'ssh_address_or_host': (self.server.ssh_hostname, int(self.server.ssh_port)),
-                'ssh_username': self.server.ssh_username,
-                'remote_bind_address': (self.server.hostname, int(self.server.port))
-            }
+            backup_path = self._backup_path(task)
             
-            # Adding authentication method
-            if self.server.ssh_password:
-                ssh_config['ssh_password'] = self.server.ssh_password
-            elif self.server.ssh_key_file and self.server.ssh_key_file.path:
-                ssh_config['ssh_pkey'] = self.server.ssh_key_file.path
+            if self.server.ssh_dump_mode == 'remote':
+                # pg_dump runs on the SSH host, only compressed output crosses the link
+                with self._remote_shell(task) as remote:
+                    cmd = self._ssh_pg_dump_cmd(self.server.hostname, self.server.port)
+                    result = self._stream_dump(cmd, backup_path, task,
+                                               env={'PGPASSWORD': self.server.password}, remote=remote)
                 
+                if result['success']:
+                    result['message'] = 'PostgreSQL backup completed successfully on the SSH host'
+                else:
+                    result['message'] = f"PostgreSQL backup error: {result['message']}"
+                return result
+            
             # Set environment variables for pg_dump
             env = os.environ.copy()
             # Add PGPASSWORD env variable for password
             env['PGPASSWORD'] = self.server.password
                 
-            # Create SSH tunnel
-            with sshtunnel.SSHTunnelForwarder(**ssh_config) as tunnel:
+            # Create SSH tunnel over the pooled connection to the SSH host
+            with ssh_tunnel(self.server) as tunnel:
                 # Build pg_dump command through tunnel
-                cmd = [
-                    'pg_dump',
-                    '-h', '127.0.0.1',
-                    '-p', str(tunnel.local_bind_port),
-                    '-U', self.server.username,
-                    '-F', 'p',  # Custom format (compressed)
-                    '-b',       # Include large objects
-                    '-v',       # Verbose mode
-                    '-f', backup_path
-                ]
+                cmd = self._ssh_pg_dump_cmd('127.0.0.1', tunnel.local_bind_port)
                 
-                # Add database name
-                if self.server.database_name:
-                    cmd.append(self.server.database_name)
-                else:
-                    # For all databases, we need to use pg_dumpall instead
-                    cmd = [
-                        'pg_dumpall',
-                        '-h', '127.0.0.1',
-                        '-p', str(tunnel.local_bind_port),
-                        '-U', self.server.username,
-                        '-f', backup_path
-                    ]
-                
-                # Execute pg_dump through tunnel
-                result = subprocess.run(cmd, env=env, capture_output=True, text=True)
+                # Execute pg_dump through tunnel, streaming into the (compressed) artifact
+                result = self._stream_dump(cmd, backup_path, task, env=env)
                 
-                if result.returncode == 0:
-                    return {
-                        'success': True,
-                        'path': backup_path,
-                        'message': 'PostgreSQL backup completed successfully through SSH tunnel'
-                    }
+                if result['success']:
+                    result['message'] = 'PostgreSQL backup completed successfully through SSH tunnel'
                 else:
-                    return {
-                        'success': False,
-                        'message': f'PostgreSQL backup error: {result.stderr}'
-                    }
+                    result['message'] = f"PostgreSQL backup error: {result['message']}"
+                return result
             
         except Exception as e:
             return {
@@ -366,6 +1086,31 @@ class BackupService:
                 'message': f'SSH tunnel error for PostgreSQL: {str(e)}'
             }
 
+    def _ssh_pg_dump_cmd(self, host, port):
+        """pg_dump (pg_dumpall without a database) command of SSH servers"""
+        cmd = [
+            'pg_dump',
+            '-h', host,
+            '-p', str(port),
+            '-U', self.server.username,
+            '-F', 'p',  # Custom format (compressed)
+            '-b',       # Include large objects
+            '-v',       # Verbose mode
+        ]
+        
+        # Add database name
+        if self.server.database_name:
+            cmd.append(self.server.database_name)
+        else:
+            # For all databases, we need to use pg_dumpall instead
+            cmd = [
+                'pg_dumpall',
+                '-h', host,
+                '-p', str(port),
+                '-U', self.server.username,
+            ]
+        return cmd
+
 class DatabaseConnectionService:
     """Service for testing and managing database connections"""
     
@@ -388,6 +1133,7 @@ class DatabaseConnectionService:
                 ssh_port = server.ssh_port
                 ssh_username = server.ssh_username
                 ssh_password = server.ssh_password
+                ssh_key_filename = server.ssh_key_file.path if server.ssh_key_file else None
             except DatabaseServer.DoesNotExist:
                 return {
                     'success': False,
@@ -404,6 +1150,7 @@ class DatabaseConnectionService:
             ssh_port = connection_data.get('ssh_port')
             ssh_username = connection_data.get('ssh_username')
             ssh_password = connection_data.get('ssh_password')
+            ssh_key_filename = None
         else:
             return {
                 'success': False,
@@ -419,7 +1166,7 @@ class DatabaseConnectionService:
         elif connection_type in ['ssh', 'ssh_mysql']:
             return DatabaseConnectionService._test_ssh_mysql_connection(
                 hostname, port, username, password, database_name,
-                ssh_hostname, ssh_port, ssh_username, ssh_password
+                ssh_hostname, ssh_port, ssh_username, ssh_password, ssh_key_filename
             )
         elif connection_type == 'direct_postgresql':
             return DatabaseConnectionService._test_direct_postgresql_connection(
@@ -428,7 +1175,7 @@ class DatabaseConnectionService:
         elif connection_type == 'ssh_postgresql':
             return DatabaseConnectionService._test_ssh_postgresql_connection(
                 hostname, port, username, password, database_name,
-                ssh_hostname, ssh_port, ssh_username, ssh_password
+                ssh_hostname, ssh_port, ssh_username, ssh_password, ssh_key_filename
             )
         else:
             return {
@@ -557,22 +1304,22 @@ class DatabaseConnectionService:
     
     @staticmethod
     def _test_ssh_mysql_connection(db_hostname, db_port, db_username, db_password, 
-                            db_name, ssh_hostname, ssh_port, ssh_username, ssh_password):
+                            db_name, ssh_hostname, ssh_port, ssh_username, ssh_password, ssh_key_filename=None):
         """Tests MySQL database connection through SSH tunnel"""
         try:
-            # Check if we can connect to SSH server
-            ssh_client = paramiko.SSHClient()
-            ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            ssh_params = {
+                'hostname': ssh_hostname,
+                'port': int(ssh_port),
+                'username': ssh_username,
+                'password': ssh_password,
+            }
+            if not ssh_password and ssh_key_filename:
+                ssh_params['key_filename'] = ssh_key_filename
             
+            # Check if we can connect to SSH server, the connection stays in the pool for the tunnel
             try:
-                ssh_client.connect(
-                    hostname=ssh_hostname,
-                    port=int(ssh_port),
-                    username=ssh_username,
-                    password=ssh_password,
-                    timeout=10
-                )
-                ssh_client.close()
+                with ssh_pool.connection(**ssh_params):
+                    pass
             except Exception as e:
                 return {
                     'success': False,
@@ -580,12 +1327,7 @@ class DatabaseConnectionService:
                 }
             
             # Try to open SSH tunnel and connect to database
-            with sshtunnel.SSHTunnelForwarder(
-                (ssh_hostname, int(ssh_port)),
-                ssh_username=ssh_username,
-                ssh_password=ssh_password,
-                remote_bind_address=(db_hostname, int(db_port))
-            ) as tunnel:
+            with ssh_pool.tunnel((db_hostname, int(db_port)), **ssh_params) as tunnel:
                 conn_params = {
                     'host': '127.0.0.1',
                     'port': tunnel.local_bind_port,
@@ -624,22 +1366,22 @@ class DatabaseConnectionService:
     
     @staticmethod
     def _test_ssh_postgresql_connection(db_hostname, db_port, db_username, db_password, 
-                                db_name, ssh_hostname, ssh_port, ssh_username, ssh_password):
+                                db_name, ssh_hostname, ssh_port, ssh_username, ssh_password, ssh_key_filename=None):
         """Tests PostgreSQL database connection through SSH tunnel"""
         try:
-            # Check if we can connect to SSH server
-            ssh_client = paramiko.SSHClient()
-            ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            ssh_params = {
+                'hostname': ssh_hostname,
+                'port': int(ssh_port),
+                'username': ssh_username,
+                'password': ssh_password,
+            }
+            if not ssh_password and ssh_key_filename:
+                ssh_params['key_filename'] = ssh_key_filename
             
+            # Check if we can connect to SSH server, the connection stays in the pool for the tunnel
             try:
-                ssh_client.connect(
-                    hostname=ssh_hostname,
-                    port=int(ssh_port),
-                    username=ssh_username,
-                    password=ssh_password,
-                    timeout=10
-                )
-                ssh_client.close()
+                with ssh_pool.connection(**ssh_params):
+                    pass
             except Exception as e:
                 return {
                     'success': False,
@@ -647,12 +1389,7 @@ class DatabaseConnectionService:
                 }
             
             # Try to open SSH tunnel and connect to database
-            with sshtunnel.SSHTunnelForwarder(
-                (ssh_hostname, int(ssh_port)),
-                ssh_username=ssh_username,
-                ssh_password=ssh_password,
-                remote_bind_address=(db_hostname, int(db_port))
-            ) as tunnel:
+            with ssh_pool.tunnel((db_hostname, int(db_port)), **ssh_params) as tunnel:
                 conn_params = {
                     'host': '127.0.0.1',
                     'port': tunnel.local_bind_port,
@@ -0,0 +1,399 @@
+# backup_manager/sqlindex.py
+"""
+Table index of plain SQL dump artifacts. While a dump streams, the comments
+mysqldump and pg_dump write ahead of every table are located in its output
+and the artifact is compressed in independent blocks (gzip members, zstd
+frames, see open_compressor). The index, stored next to the artifact, maps
+every database/table to its byte range in the dump and every block to its
+offset in the stored file. Restoring a few tables seeks to the block holding
+each of them and decompresses only from there to the end of the table.
+Remote dumps stored as the SSH host compressed them are not indexed, an
+index without blocks is read by decompressing from the start of the dump.
+"""
+import os
+import re
+import json
+import bisect
+from .pipeline import CHUNK_SIZE, StreamDecoder, open_stored_reader, index_path, is_manifest, read_manifest
+
+INDEX_FORMAT = 'debt-index'
+
+# Compressed bytes decoded at once when reading a table, bounds the memory of highly compressed dumps
+INDEX_READ_SIZE = 64 * 1024
+
+# Longest comment line considered, section comments are short
+MAX_MARKER_LINE = 4096
+
+# Lines that start a section or hold rows, checked only at the start of a line
+MYSQL_LINE_PREFIXES = (b'--', b'INSERT ')
+POSTGRESQL_LINE_PREFIXES = (b'--', b'\\connect', b'COPY ', b'\\.')
+MYSQL_LINE_RE = re.compile(rb'^(?:--|INSERT )[^\n]*\n', re.M)
+POSTGRESQL_LINE_RE = re.compile(rb'^(?:--|\\connect|COPY |\\\.)[^\n]*\n', re.M)
+
+# String literal of mysqldump, quotes inside it are escaped with a backslash
+MYSQL_STRING_RE = re.compile(rb"'[^'\\]*(?:\\.[^'\\]*)*'", re.S)
+
+MYSQL_DATABASE_RE = re.compile(r'^-- Current Database: `(.*)`$')
+MYSQL_TABLE_RE = re.compile(r'^-- (?:Table structure|Dumping data) for table `(.*)`$')
+MYSQL_SECTION_RE = re.compile(
+    r'^-- (?:Temporary (?:view|table) structure for view|Final view structure for view|'
+    r'Dumping routines|Dumping events|Dump completed)'
+)
+POSTGRESQL_OBJECT_RE = re.compile(r'^-- (Data for )?Name: (.*); Type: ([A-Z ]+); Schema: ([^;]*);')
+POSTGRESQL_CONNECT_RE = re.compile(r'''^\\connect (?:-reuse-previous=on "dbname='(.*)'"|"?([^"]*)"?)$''')
+POSTGRESQL_END = '-- PostgreSQL database dump complete'
+
+
+def _unquote_mysql(name):
+    return name.replace('``', '`')
+
+
+def _insert_rows(line):
+    """Rows of an extended INSERT statement of mysqldump, tuples are separated by ),( outside strings"""
+    return MYSQL_STRING_RE.sub(b"''", line).count(b'),(') + 1
+
+
+class SqlIndexBuilder:
+    """
+    Locates the sections of every table in the output of mysqldump (dialect
+    'mysql') or pg_dump/pg_dumpall ('postgresql') fed to it in order and
+    counts the rows of their data. database is the database of dumps that do
+    not name it (a single database dump).
+    """
+
+    def __init__(self, dialect, database=None):
+        self.dialect = dialect
+        self.tables = []
+        self.preambles = []
+        self._database = database or None
+        self._offset = 0
+        self._newlines = 0
+        self._line = b''
+        self._skip = False
+        self._current = None
+        # Line number of the first row of the COPY being read
+        self._copy_start = None
+        # Session settings at the top of the dump (of each database for pg_dumpall)
+        self._preamble = (0, self._database)
+        if dialect == 'postgresql':
+            self._prefixes, self._line_re = POSTGRESQL_LINE_PREFIXES, POSTGRESQL_LINE_RE
+        else:
+            self._prefixes, self._line_re = MYSQL_LINE_PREFIXES, MYSQL_LINE_RE
+
+    def feed(self, data):
+        if self._skip:
+            newline = data.find(b'\n')
+            if newline < 0:
+                self._offset += len(data)
+                return
+            self._skip = False
+            text, base, pos = data, self._offset, newline + 1
+        else:
+            text, base, pos = self._line + data, self._offset - len(self._line), 0
+        # Newlines ahead of text, the kept unfinished line has none
+        newlines = self._newlines
+        counted = 0
+        self._offset += len(data)
+        self._newlines += data.count(b'\n')
+
+        for match in self._line_re.finditer(text, pos):
+            line = match.group()[:-1]
+            if line.startswith(b'INSERT '):
+                if self._current is not None:
+                    self._current['rows'] += _insert_rows(line)
+            elif line.startswith((b'COPY ', b'\\.')):
+                # Line numbers are only needed around COPY data
+                newlines += text.count(b'\n', counted, match.start())
+                counted = match.start()
+                self._copy_marker(newlines, line)
+            elif self._copy_start is None:
+                self._marker(base + match.start(), line.decode('utf-8', 'replace'))
+
+        # An unfinished line is kept when it may be one of those, INSERT statements whole
+        tail = text[max(text.rfind(b'\n') + 1, pos):]
+        if self.dialect == 'mysql' and tail.startswith(b'INSERT '):
+            self._line = bytes(tail)
+        elif len(tail) <= MAX_MARKER_LINE and any(prefix.startswith(tail[:len(prefix)]) for prefix in self._prefixes):
+            self._line = bytes(tail)
+        else:
+            self._line = b''
+            self._skip = bool(tail)
+
+    def _copy_marker(self, line_number, line):
+        current = self._current
+        if current is None or current['kind'] != 'data':
+            return
+        if line.startswith(b'COPY ') and self._copy_start is None:
+            self._copy_start = line_number + 1
+        elif line == b'\\.' and self._copy_start is not None:
+            current['rows'] += line_number - self._copy_start
+            self._copy_start = None
+
+    def _marker(self, offset, line):
+        if self.dialect == 'postgresql':
+            self._postgresql_marker(offset, line)
+        else:
+            self._mysql_marker(offset, line)
+
+    def _mysql_marker(self, offset, line):
+        match = MYSQL_TABLE_RE.match(line)
+        if match:
+            table = _unquote_mysql(match.group(1))
+            current = self._current
+            # Data follows the structure of the same table
+            if not (current and current['table'] == table and current['database'] == self._database):
+                self._open(offset, None, table, 'table')
+            return
+        match = MYSQL_DATABASE_RE.match(line)
+        if match:
+            self._close(offset)
+            self._end_preamble(offset)
+            self._database = _unquote_mysql(match.group(1))
+        elif MYSQL_SECTION_RE.match(line):
+            self._close(offset)
+            self._end_preamble(offset)
+
+    def _postgresql_marker(self, offset, line):
+        match = POSTGRESQL_OBJECT_RE.match(line)
+        if match:
+            data, name, kind, schema = match.groups()
+            if kind == 'TABLE DATA' and data:
+                self._open(offset, schema, name, 'data')
+            elif kind == 'TABLE' and not data:
+                self._open(offset, schema, name, 'schema')
+            else:
+                self._close(offset)
+                self._end_preamble(offset)
+            return
+        match = POSTGRESQL_CONNECT_RE.match(line)
+        if match:
+            self._close(offset)
+            self._database = match.group(1).replace("''", "'") if match.group(1) is not None else match.group(2)
+            # The \connect line is part of the preamble, replaying it switches to the database
+            self._preamble = (offset, self._database)
+        elif line.startswith(POSTGRESQL_END):
+            self._close(offset)
+
+    def _open(self, offset, schema, table, kind):
+        self._close(offset)
+        self._end_preamble(offset)
+        self._current = {
+            'database': self._database,
+            'schema': schema,
+            'table': table,
+            'kind': kind,
+            'start': offset,
+        }
+        if kind != 'schema':
+            self._current['rows'] = 0
+
+    def _close(self, offset):
+        if self._current is not None:
+            self._current['end'] = offset
+            self.tables.append(self._current)
+            self._current = None
+
+    def _end_preamble(self, offset):
+        if self._preamble is not None:
+            start, database = self._preamble
+            self.preambles.append({'database': database, 'start': start, 'end': offset})
+            self._preamble = None
+
+    def write(self, path, compression, blocks, raw_size):
+        """Write the index of a dump of raw_size bytes atomically to path"""
+        self._close(raw_size)
+        index = {
+            'format': INDEX_FORMAT,
+            'version': 1,
+            'dialect': self.dialect,
+            'compression': compression or 'none',
+            'raw_size': raw_size,
+            'blocks': [list(block) for block in blocks],
+            'preambles': self.preambles,
+            'tables': self.tables,
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, path)
+
+
+def read_index(path):
+    """Table index of the artifact at path, None when it has none"""
+    try:
+        with open(index_path(path)) as f:
+            index = json.load(f)
+    except FileNotFoundError:
+        return None
+    if index.get('format') != INDEX_FORMAT:
+        raise ValueError(f"Not a table index: {index_path(path)}")
+    return index
+
+
+def table_key(entry):
+    """Name of a table as users select it: database.table, database.schema.table on PostgreSQL"""
+    return '.'.join(part for part in (entry['database'], entry['schema'], entry['table']) if part)
+
+
+def _matches(key, name):
+    # A name without its database (or schema) selects the table in every one
+    return key == name or key.endswith(f".{name}")
+
+
+def _indexed_files(path):
+    """Files of an artifact that can carry a table index, every database of a per-database backup"""
+    if is_manifest(path):
+        return [entry['path'] for entry in read_manifest(path)['artifacts']]
+    return [path]
+
+
+def artifact_tables(path):
+    """Names of the tables in the table indexes of an artifact, in dump order"""
+    names = []
+    for file_path in _indexed_files(path):
+        index = read_index(file_path)
+        for entry in index['tables'] if index else []:
+            key = table_key(entry)
+            if key not in names:
+                names.append(key)
+    return names
+
+
+def select_tables(path, tables):
+    """
+    Match the table names a user selected against the indexes of an artifact.
+    Returns (file path, table names) of every file holding selected tables,
+    raises ValueError when the artifact has no index or a name matches nothing.
+    """
+    selection = []
+    found = set()
+    indexed = False
+    for file_path in _indexed_files(path):
+        index = read_index(file_path)
+        if index is None:
+            continue
+        indexed = True
+        keys = []
+        for entry in index['tables']:
+            key = table_key(entry)
+            matched = [name for name in tables if _matches(key, name)]
+            if matched and key not in keys:
+                keys.append(key)
+            found.update(matched)
+        if keys:
+            selection.append((file_path, keys))
+
+    if not indexed:
+        raise ValueError('This backup has no table index, it can only be restored as a whole')
+    missing = [name for name in tables if name not in found]
+    if missing:
+        raise ValueError(f"Tables not found in the backup: {', '.join(missing)}")
+    return selection
+
+
+class TableReader:
+    """
+    Readable stream of the selected tables of an indexed SQL dump, preceded by
+    the session settings at the top of the dump. Blocks before a table are
+    never read, the block holding its start is decompressed from its start.
+    """
+
+    def __init__(self, path, index, sections):
+        self._index = index
+        self._stored = open_stored_reader(path)
+        self._block_offsets = [block[0] for block in index['blocks']]
+        self._pieces = self._generate(sections)
+        self._buffer = b''
+
+    def _generate(self, sections):
+        preamble = None
+        database = None
+        for number, section in enumerate(sections):
+            if number == 0 or section['database'] != database:
+                database = section['database']
+                current = self._preamble(database)
+                if current is not None and current != preamble:
+                    preamble = current
+                    yield from self._read_range(preamble['start'], preamble['end'])
+                if self._index['dialect'] == 'mysql' and database:
+                    # mysqldump selects the database once, ahead of its first table
+                    yield f"USE `{database.replace('`', '``')}`;\n".encode()
+            yield from self._read_range(section['start'], section['end'])
+
+    def _preamble(self, database):
+        preambles = self._index['preambles']
+        for preamble in preambles:
+            if preamble['database'] == database:
+                return preamble
+        return preambles[0] if preambles else None
+
+    def _read_range(self, start, end):
+        compression = self._index['compression']
+        if compression == 'none':
+            self._stored.seek(start)
+            position = start
+            while position < end:
+                data = self._stored.read(min(CHUNK_SIZE, end - position))
+                if not data:
+                    raise IOError('Artifact is shorter than its table index')
+                position += len(data)
+                yield data
+            return
+
+        block = max(bisect.bisect_right(self._block_offsets, start) - 1, 0)
+        position, offset = self._index['blocks'][block] if self._block_offsets else (0, 0)
+        self._stored.seek(offset)
+        decoder = StreamDecoder(compression)
+        while position < end:
+            compressed = self._stored.read(INDEX_READ_SIZE)
+            if not compressed:
+                raise IOError('Artifact is shorter than its table index')
+            data = decoder.decompress(compressed)
+            piece = data[max(start - position, 0):max(end - position, 0)]
+            if piece:
+                yield piece
+            position += len(data)
+
+    def read(self, size=-1):
+        parts = [self._buffer]
+        length = len(self._buffer)
+        while size is None or size < 0 or length < size:
+            piece = next(self._pieces, None)
+            if piece is None:
+                break
+            parts.append(piece)
+            length += len(piece)
+        data = b''.join(parts)
+        if size is None or size < 0:
+            size = len(data)
+        self._buffer = data[size:]
+        return data[:size]
+
+    def close(self):
+        self._stored.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_table_reader(path, tables):
+    """Readable stream of the named tables (see table_key) of the SQL dump artifact at path"""
+    index = read_index(path)
+    if index is None:
+        raise ValueError(f"{os.path.basename(path)} has no table index")
+    sections = [entry for entry in index['tables'] if any(_matches(table_key(entry), name) for name in tables)]
+    if not sections:
+        raise ValueError(f"None of the tables is in {os.path.basename(path)}")
+
+    # Adjacent sections are read as one range
+    merged = []
+    for section in sorted(sections, key=lambda entry: entry['start']):
+        last = merged[-1] if merged else None
+        if last and last['end'] == section['start'] and last['database'] == section['database']:
+            last['end'] = section['end']
+        else:
+            merged.append(dict(section))
+    return TableReader(path, index, merged)
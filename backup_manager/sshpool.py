@@ -0,0 +1,297 @@
+# backup_manager/sshpool.py
+"""
+Pool of authenticated SSH connections in the worker process. Backups,
+restores and connection tests of servers behind the same bastion share warm
+transports instead of doing a full handshake each. Tunnels are direct-tcpip
+channels and SFTP sessions are subsystem channels over the pooled transports.
+"""
+import os
+import time
+import socket
+import select
+import hashlib
+import threading
+import contextlib
+import paramiko
+from .models import file_log
+
+# Seconds an unused connection stays open
+SSH_POOL_IDLE_TIMEOUT = 300
+
+# Connections idle for longer are probed with a session round trip before reuse
+SSH_HEALTH_CHECK_AFTER = 30
+
+# Channels of one connection before another connection to the host is opened,
+# OpenSSH allows 10 sessions per connection by default
+SSH_MAX_CHANNELS = 8
+
+SSH_KEEPALIVE_INTERVAL = 30
+
+
+def server_ssh_params(server):
+    """Connection parameters of the SSH host of a DatabaseServer"""
+    if not all([server.ssh_hostname, server.ssh_port, server.ssh_username]):
+        raise ValueError('Missing SSH data: hostname, port or username')
+    if not server.ssh_password and not server.ssh_key_file:
+        raise ValueError('No SSH authentication method (password or key)')
+
+    params = {
+        'hostname': server.ssh_hostname,
+        'port': int(server.ssh_port),
+        'username': server.ssh_username,
+    }
+    if server.ssh_password:
+        params['password'] = server.ssh_password
+    elif server.ssh_key_file and server.ssh_key_file.path:
+        params['key_filename'] = server.ssh_key_file.path
+    return params
+
+
+class _Connection:
+    def __init__(self, key, client):
+        self.key = key
+        self.client = client
+        self.users = 0
+        self.last_used = time.monotonic()
+
+    def alive(self, probe=False):
+        transport = self.client.get_transport()
+        if transport is None or not transport.is_active():
+            return False
+        if probe:
+            try:
+                transport.open_session(timeout=10).close()
+            except Exception:
+                return False
+        return True
+
+
+class SSHPool:
+    """Authenticated SSH connections keyed by host, port, user and credentials"""
+
+    def __init__(self, idle_timeout=SSH_POOL_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self._connections = {}
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._reaper = None
+
+    @staticmethod
+    def _key(hostname, port, username, password=None, key_filename=None):
+        secret = hashlib.sha256(f"{password or ''}\0{key_filename or ''}".encode()).hexdigest()
+        return (hostname.lower(), int(port), username, secret)
+
+    def _check_fork(self):
+        # Connections of a parent process must not be shared by forked workers
+        if os.getpid() != self._pid:
+            self._pid = os.getpid()
+            self._connections = {}
+            self._clients = {}
+            self._reaper = None
+
+    def acquire(self, hostname, port=22, username=None, password=None, key_filename=None, timeout=10):
+        """Pooled SSHClient connected to the host, give it back with release()"""
+        key = self._key(hostname, port, username, password, key_filename)
+        with self._lock:
+            self._check_fork()
+            self._start_reaper()
+            candidates = [c for c in self._connections.get(key, []) if c.users < SSH_MAX_CHANNELS]
+            connection = min(candidates, key=lambda c: c.users) if candidates else None
+            if connection is not None:
+                # Reserved before the health check, which runs outside the lock
+                connection.users += 1
+
+        if connection is not None:
+            probe = time.monotonic() - connection.last_used > SSH_HEALTH_CHECK_AFTER and connection.users == 1
+            if connection.alive(probe):
+                return connection.client
+            file_log(f"SSH POOL: connection to {hostname}:{port} is dead, reconnecting")
+            self._discard(connection)
+
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        client.connect(hostname=hostname, port=int(port), username=username, password=password,
+                       key_filename=key_filename, timeout=timeout)
+        client.get_transport().set_keepalive(SSH_KEEPALIVE_INTERVAL)
+        file_log(f"SSH POOL: connected to {username}@{hostname}:{port}")
+
+        connection = _Connection(key, client)
+        connection.users = 1
+        with self._lock:
+            self._connections.setdefault(key, []).append(connection)
+            self._clients[id(client)] = connection
+        return client
+
+    def release(self, client):
+        with self._lock:
+            connection = self._clients.get(id(client))
+            if connection is None:
+                return
+            connection.users = max(0, connection.users - 1)
+            connection.last_used = time.monotonic()
+
+    def _discard(self, connection):
+        with self._lock:
+            pooled = self._connections.get(connection.key, [])
+            if connection in pooled:
+                pooled.remove(connection)
+            self._clients.pop(id(connection.client), None)
+        try:
+            connection.client.close()
+        except Exception:
+            pass
+
+    @contextlib.contextmanager
+    def connection(self, **params):
+        client = self.acquire(**params)
+        try:
+            yield client
+        finally:
+            self.release(client)
+
+    @contextlib.contextmanager
+    def sftp(self, **params):
+        """SFTP session over a pooled connection"""
+        with self.connection(**params) as client:
+            sftp = client.open_sftp()
+            try:
+                yield sftp
+            finally:
+                sftp.close()
+
+    @contextlib.contextmanager
+    def tunnel(self, remote_address, **params):
+        """Local port forwarded to remote_address through a pooled connection"""
+        with self.connection(**params) as client:
+            forward = LocalForward(client.get_transport(), remote_address)
+            forward.start()
+            try:
+                yield forward
+            finally:
+                forward.stop()
+
+    def close_idle(self):
+        """Close connections unused for longer than the idle timeout"""
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            # Taken out of the pool under the lock so acquire() cannot hand them out meanwhile
+            for pooled in self._connections.values():
+                for connection in list(pooled):
+                    if connection.users == 0 and now - connection.last_used > self.idle_timeout:
+                        pooled.remove(connection)
+                        self._clients.pop(id(connection.client), None)
+                        expired.append(connection)
+        for connection in expired:
+            file_log(f"SSH POOL: closing idle connection to {connection.key[0]}:{connection.key[1]}")
+            try:
+                connection.client.close()
+            except Exception:
+                pass
+
+    def _start_reaper(self):
+        if self._reaper is None:
+            self._reaper = threading.Thread(target=self._reap, daemon=True)
+            self._reaper.start()
+
+    def _reap(self):
+        while True:
+            time.sleep(min(60, self.idle_timeout))
+            self.close_idle()
+
+
+class LocalForward:
+    """
+    Listens on a local port and forwards every accepted connection through a
+    direct-tcpip channel of an SSH transport. local_bind_port mirrors the
+    sshtunnel attribute the dump and restore code reads.
+    """
+
+    def __init__(self, transport, remote_address):
+        self.transport = transport
+        self.remote_address = (remote_address[0], int(remote_address[1]))
+        self.local_bind_port = None
+        self._server = None
+        self._stopped = threading.Event()
+        self._threads = []
+        self._open = set()
+        self._lock = threading.Lock()
+
+    def start(self):
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.bind(('127.0.0.1', 0))
+        self._server.listen(16)
+        # Closing a socket does not wake a thread blocked in accept(), poll for stop() instead
+        self._server.settimeout(1)
+        self.local_bind_port = self._server.getsockname()[1]
+        thread = threading.Thread(target=self._accept, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        return self
+
+    def _accept(self):
+        while not self._stopped.is_set():
+            try:
+                sock, peer = self._server.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            sock.settimeout(None)
+            try:
+                channel = self.transport.open_channel('direct-tcpip', self.remote_address, peer, timeout=30)
+            except Exception as e:
+                file_log(f"SSH POOL: could not forward to {self.remote_address[0]}:{self.remote_address[1]}: {str(e)}")
+                sock.close()
+                continue
+            thread = threading.Thread(target=self._pump, args=(sock, channel), daemon=True)
+            thread.start()
+            with self._lock:
+                self._threads.append(thread)
+
+    def _pump(self, sock, channel):
+        with self._lock:
+            self._open.update((sock, channel))
+        sock_open = channel_open = True
+        try:
+            while (sock_open or channel_open) and not self._stopped.is_set():
+                readable, _, _ = select.select([s for s, o in ((sock, sock_open), (channel, channel_open)) if o], [], [], 1)
+                if sock in readable:
+                    data = sock.recv(65536)
+                    if data:
+                        channel.sendall(data)
+                    else:
+                        sock_open = False
+                        channel.shutdown_write()
+                if channel in readable:
+                    data = channel.recv(65536)
+                    if data:
+                        sock.sendall(data)
+                    else:
+                        # The remote end is done, nothing more can be answered
+                        break
+        except (OSError, EOFError):
+            pass
+        finally:
+            channel.close()
+            sock.close()
+            with self._lock:
+                self._open.difference_update((sock, channel))
+
+    def stop(self):
+        self._stopped.set()
+        self._server.close()
+        with self._lock:
+            open_ends = list(self._open)
+            threads = list(self._threads)
+        for end in open_ends:
+            try:
+                end.close()
+            except Exception:
+                pass
+        for thread in threads:
+            thread.join(5)
+
+
+ssh_pool = SSHPool()
@@ -1,11 +1,29 @@
 # backup_manager/storage.py
 
 import os
+import time
+import shlex
 import ftplib
-import paramiko
+from concurrent.futures import ThreadPoolExecutor
 from django.conf import settings
 import logging
 import datetime  # dodany import dla timestampów
+from .pipeline import (
+    is_manifest, is_chunk_manifest, is_parts_manifest, artifact_members, read_parts_manifest, new_checksum
+)
+from .chunkstore import ChunkStore, read_chunk_manifest
+from .ratelimit import RateLimiter, throttle
+from .sshpool import ssh_pool
+
+# Storage types that accept a dump while it is still being written
+STREAMING_STORAGE_TYPES = ('ftp', 'sftp', 'gdrive')
+
+# Attempts of every part of a split artifact, waiting PART_RETRY_DELAY seconds longer after each failure
+PART_UPLOAD_ATTEMPTS = 3
+PART_RETRY_DELAY = 10
+
+# Google Drive resumable uploads need chunks in multiples of 256 KB
+GDRIVE_STREAM_CHUNK_SIZE = 8 * 1024 * 1024
 
 # Bezpośredni zapis do pliku - niezależny od konfiguracji Django
 def direct_log(message):
@@ -27,6 +45,91 @@ def direct_log(message):
         except:
             pass
 
+def _streaming_media(fileobj, chunk_size=GDRIVE_STREAM_CHUNK_SIZE):
+    """Build a resumable Google Drive media body reading from a stream of unknown size"""
+    from googleapiclient.http import MediaUpload
+
+    class StreamingMediaUpload(MediaUpload):
+        def __init__(self):
+            self._buffer = b''
+            self._offset = 0
+
+        def chunksize(self):
+            return chunk_size
+
+        def mimetype(self):
+            return 'application/octet-stream'
+
+        def size(self):
+            return None
+
+        def resumable(self):
+            return True
+
+        def has_stream(self):
+            return False
+
+        def getbytes(self, begin, length):
+            # Drop what the server confirmed, a retried chunk is served again from the buffer
+            if begin > self._offset:
+                del_count = begin - self._offset
+                self._buffer = self._buffer[del_count:]
+                self._offset = begin
+            while len(self._buffer) < length:
+                data = fileobj.read(length - len(self._buffer))
+                if not data:
+                    break
+                self._buffer += data
+            # A short read tells the client this is the last chunk
+            return self._buffer[:length]
+
+    return StreamingMediaUpload()
+
+class HashingReader:
+    """
+    Readable stream hashing the bytes uploaded through it. Bytes sent again
+    after the uploader seeks back (resumed chunks) are hashed once.
+    """
+
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+        self._digest = new_checksum()
+        self._position = 0
+        self.size = 0
+
+    def read(self, size=-1):
+        data = self._fileobj.read(size)
+        end = self._position + len(data)
+        if end > self.size:
+            self._digest.update(memoryview(data)[self.size - self._position:])
+            self.size = end
+        self._position = end
+        return data
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        self._position = self._fileobj.seek(offset, whence)
+        return self._position
+
+    def tell(self):
+        return self._position
+
+    def checksum(self):
+        return self._digest.hexdigest()
+
+    def __getattr__(self, name):
+        return getattr(self._fileobj, name)
+
+def _remote_sha256(ssh_client, path):
+    """SHA-256 of a file computed on the SFTP host, None when the account has no shell or sha256sum"""
+    try:
+        _, stdout, _ = ssh_client.exec_command(f"sha256sum -- {shlex.quote(path)}")
+        output = stdout.read().decode(errors='replace')
+        if stdout.channel.recv_exit_status() == 0 and output:
+            return output.split()[0].lower()
+    except Exception as e:
+        direct_log(f"Remote checksum unavailable: {str(e)}")
+    return None
+
 class StorageService:
     """Service for storing backups in different locations"""
     
@@ -54,7 +157,19 @@ class StorageService:
                 'message': 'File stored in local storage',
                 'path': backup_file_path
             }
-        elif task.storage_type == 'ftp':
+        elif is_manifest(backup_file_path):
+            return StorageService._store_manifest(backup_file_path, task)
+        elif is_chunk_manifest(backup_file_path):
+            return StorageService._store_chunks(backup_file_path, task)
+        elif is_parts_manifest(backup_file_path):
+            return StorageService._store_parts(backup_file_path, task)
+        else:
+            return StorageService._store_file(backup_file_path, task)
+
+    @staticmethod
+    def _store_file(backup_file_path, task):
+        """Upload a single file to the remote storage of the task"""
+        if task.storage_type == 'ftp':
             return StorageService._store_ftp(backup_file_path, task)
         elif task.storage_type == 'sftp':
             return StorageService._store_sftp(backup_file_path, task)
@@ -67,10 +182,126 @@ class StorageService:
                 'success': False,
                 'message': error_msg
             }
+
+    @staticmethod
+    def _destination_key(task):
+        """Identify a remote location, chunks already uploaded there are skipped"""
+        if task.storage_type == 'gdrive':
+            folder = task.storage_config.gdrive_folder_id if task.storage_config else ''
+            return f"gdrive:{folder or ''}"
+        return f"{task.storage_type}://{task.remote_username}@{task.remote_hostname}:{task.remote_port}/{task.remote_path or ''}"
+
+    @staticmethod
+    def _store_chunks(manifest_path, task):
+        """Upload the chunks of a deduplicated artifact missing on the remote, the manifest last"""
+        store = ChunkStore()
+        destination = StorageService._destination_key(task)
+        manifest = read_chunk_manifest(manifest_path)
+        digests = list(dict.fromkeys(digest for digest, _ in manifest['chunks']))
+        pending = [digest for digest in digests if not store.is_uploaded(digest, destination)]
+        direct_log(f"Uploading {len(pending)} of {len(digests)} chunks to {destination}")
+        
+        for digest in pending:
+            result = StorageService._store_file(store.chunk_path(digest), task)
+            if not result.get('success', False):
+                return result
+            store.mark_uploaded(digest, destination)
+        
+        result = StorageService._store_file(manifest_path, task)
+        if result.get('success', False):
+            result['message'] = f"{len(pending)} new of {len(digests)} chunks uploaded. {result.get('message', '')}"
+        return result
+    
+    @staticmethod
+    def _store_part(part, task):
+        """Upload one part of a split artifact, retried on its own"""
+        for attempt in range(1, PART_UPLOAD_ATTEMPTS + 1):
+            result = StorageService._store_file(part['path'], task)
+            if result.get('success', False) and result.get('checksum', part['checksum']) != part['checksum']:
+                result = {
+                    'success': False,
+                    'message': f"Part {part['file']} changed on disk after the dump (checksum mismatch)"
+                }
+            if result.get('success', False):
+                return result
+            direct_log(f"Upload of part {part['file']} failed (attempt {attempt}/{PART_UPLOAD_ATTEMPTS}): "
+                       f"{result.get('message', '')}")
+            if attempt < PART_UPLOAD_ATTEMPTS:
+                time.sleep(PART_RETRY_DELAY * attempt)
+        return result
+
+    @staticmethod
+    def _store_parts(manifest_path, task):
+        """Upload the parts of a split artifact in parallel, the parts manifest last"""
+        parts = read_parts_manifest(manifest_path)['parts']
+        workers = max(1, min(task.upload_workers, len(parts)))
+        direct_log(f"Uploading {len(parts)} parts of {manifest_path}, {workers} at a time")
+        
+        # A failed part does not stop the others, they are not sent again when the upload is retried
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(lambda part: StorageService._store_part(part, task), parts))
+        failed = [(part, result) for part, result in zip(parts, results) if not result.get('success', False)]
+        if failed:
+            return {
+                'success': False,
+                'message': f"{len(failed)} of {len(parts)} parts could not be uploaded: "
+                           + '; '.join(f"{part['file']}: {result.get('message', '')}" for part, result in failed)
+            }
+        
+        result = StorageService._store_file(manifest_path, task)
+        if result.get('success', False):
+            result.pop('checksum', None)
+            result['message'] = f"{len(parts)} parts uploaded. {result.get('message', '')}"
+        return result
     
     @staticmethod
-    def _store_ftp(backup_file_path, task):
-        """Upload file to FTP server"""
+    def store_stream(fileobj, backup_file_path, task):
+        """Upload a dump while it is produced, reading it from fileobj"""
+        direct_log(f"StorageService.store_stream called for file: {backup_file_path}")
+        direct_log(f"Task: {task.name}, storage type: {task.storage_type}")
+
+        if task.storage_type == 'ftp':
+            return StorageService._store_ftp(backup_file_path, task, fileobj)
+        elif task.storage_type == 'sftp':
+            return StorageService._store_sftp(backup_file_path, task, fileobj)
+        elif task.storage_type == 'gdrive':
+            return StorageService._store_gdrive(backup_file_path, task, fileobj)
+        else:
+            error_msg = f'Streaming upload not supported for storage type: {task.storage_type}'
+            direct_log(f"ERROR: {error_msg}")
+            return {
+                'success': False,
+                'message': error_msg
+            }
+
+    @staticmethod
+    def _store_manifest(manifest_path, task):
+        """Upload every file of a multi-file artifact, the manifest last"""
+        files = artifact_members(manifest_path)
+        direct_log(f"Uploading {len(files)} files of manifest: {manifest_path}")
+        
+        # Upload dumps first so a manifest on remote storage is always complete,
+        # members may be split or deduplicated artifacts of their own
+        for file_path in files[1:]:
+            result = StorageService.store_backup(file_path, task)
+            if not result.get('success', False):
+                return result
+        
+        result = StorageService._store_file(manifest_path, task)
+        if not result.get('success', False):
+            return result
+        result['path'] = manifest_path
+        result['message'] = f"{len(files)} files uploaded. {result.get('message', '')}"
+        return result
+    
+    @staticmethod
+    def _upload_limiter(task):
+        """Upload throughput limit of the storage configuration, None for custom storage"""
+        return RateLimiter.for_config(task.storage_config)
+    
+    @staticmethod
+    def _store_ftp(backup_file_path, task, fileobj=None):
+        """Upload file to FTP server, reading from fileobj instead of the file when given"""
         try:
             direct_log(f"Starting FTP upload for file: {backup_file_path}")
             
@@ -173,9 +404,16 @@ class StorageService:
             direct_log(f"Uploading file: {filename}")
             
             try:
-                with open(backup_file_path, 'rb') as file:
-                    direct_log("File opened, starting upload...")
-                    ftp.storbinary(f'STOR {filename}', file)
+                limiter = StorageService._upload_limiter(task)
+                if fileobj is not None:
+                    direct_log("Streaming upload while the dump is running...")
+                    source = HashingReader(fileobj)
+                    ftp.storbinary(f'STOR {filename}', throttle(source, limiter))
+                else:
+                    with open(backup_file_path, 'rb') as file:
+                        direct_log("File opened, starting upload...")
+                        source = HashingReader(file)
+                        ftp.storbinary(f'STOR {filename}', throttle(source, limiter))
                 direct_log("File uploaded successfully")
             except Exception as e:
                 error_msg = f"File upload failed: {str(e)}"
@@ -185,15 +423,31 @@ class StorageService:
                     'message': error_msg
                 }
             
-            # Verify file was uploaded
+            # Verify the size of the remote copy, FTP has no standard way to hash it
             try:
-                file_list = ftp.nlst()
-                if filename in file_list:
-                    direct_log(f"Verified file {filename} exists in directory")
-                else:
-                    direct_log(f"WARNING: File {filename} not found in directory after upload")
-            except:
-                direct_log("Could not verify file upload")
+                remote_size = ftp.size(filename)
+            except ftplib.all_errors as e:
+                direct_log(f"SIZE not supported by the server: {str(e)}")
+                remote_size = None
+            if remote_size is not None and remote_size != source.size:
+                error_msg = f"Uploaded file has {remote_size} bytes on the FTP server, {source.size} were sent"
+                direct_log(f"ERROR: {error_msg}")
+                ftp.quit()
+                return {
+                    'success': False,
+                    'message': error_msg
+                }
+            elif remote_size is not None:
+                direct_log(f"Verified file {filename} on the server, {remote_size} bytes")
+            else:
+                try:
+                    file_list = ftp.nlst()
+                    if filename in file_list:
+                        direct_log(f"Verified file {filename} exists in directory")
+                    else:
+                        direct_log(f"WARNING: File {filename} not found in directory after upload")
+                except:
+                    direct_log("Could not verify file upload")
                 
             ftp.quit()
             direct_log("FTP connection closed")
@@ -205,7 +459,8 @@ class StorageService:
                 'message': f'File uploaded to FTP server {task.remote_hostname}' + 
                            (f' in {task.remote_path}' if task.remote_path else ''),
                 'path': backup_file_path,  # Return the local path for reference
-                'storage_path': storage_path  # Add the remote path for reference
+                'storage_path': storage_path,  # Add the remote path for reference
+                'checksum': source.checksum()
             }
         
         except Exception as e:
@@ -220,8 +475,8 @@ class StorageService:
             }
     
     @staticmethod
-    def _store_sftp(backup_file_path, task):
-        """Upload file to SFTP server"""
+    def _store_sftp(backup_file_path, task, fileobj=None):
+        """Upload file to SFTP server, reading from fileobj instead of the file when given"""
         try:
             direct_log(f"Starting SFTP upload for file: {backup_file_path}")
             
@@ -242,11 +497,6 @@ class StorageService:
                     'message': error_msg
                 }
             
-            # Create SSH client
-            direct_log("Creating SSH client")
-            ssh_client = paramiko.SSHClient()
-            ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            
             # Connect to server
             connect_params = {
                 'hostname': task.remote_hostname,
@@ -264,7 +514,8 @@ class StorageService:
             
             direct_log(f"Connecting to SFTP server: {task.remote_hostname}:{task.remote_port or 22}")
             try:
-                ssh_client.connect(**connect_params)
+                # Warm connection from the pool when an upload to this server ran recently
+                ssh_client = ssh_pool.acquire(**connect_params)
                 direct_log("SSH connection established")
             except Exception as e:
                 error_msg = f"SSH connection failed: {str(e)}"
@@ -276,7 +527,11 @@ class StorageService:
             
             # Open SFTP session
             direct_log("Opening SFTP session")
-            sftp = ssh_client.open_sftp()
+            try:
+                sftp = ssh_client.open_sftp()
+            except Exception:
+                ssh_pool.release(ssh_client)
+                raise
             
             # Create directory if needed
             if task.remote_path:
@@ -306,7 +561,7 @@ class StorageService:
                                     error_msg = f"Failed to create directory {current_path}: {str(dir_error)}"
                                     direct_log(f"ERROR: {error_msg}")
                                     sftp.close()
-                                    ssh_client.close()
+                                    ssh_pool.release(ssh_client)
                                     return {
                                         'success': False,
                                         'message': error_msg
@@ -318,31 +573,56 @@ class StorageService:
             direct_log(f"Uploading file to: {remote_file_path}")
             
             try:
-                sftp.put(backup_file_path, remote_file_path)
+                limiter = StorageService._upload_limiter(task)
+                if fileobj is not None:
+                    direct_log("Streaming upload while the dump is running...")
+                    source = HashingReader(fileobj)
+                    sftp.putfo(throttle(source, limiter), remote_file_path)
+                else:
+                    with open(backup_file_path, 'rb') as file:
+                        source = HashingReader(file)
+                        sftp.putfo(throttle(source, limiter), remote_file_path,
+                                   file_size=os.path.getsize(backup_file_path))
                 direct_log("File uploaded successfully")
             except Exception as e:
                 error_msg = f"File upload failed: {str(e)}"
                 direct_log(f"ERROR: {error_msg}")
                 sftp.close()
-                ssh_client.close()
+                ssh_pool.release(ssh_client)
                 return {
                     'success': False,
                     'message': error_msg
                 }
             
-            # Verify file was uploaded
+            # Verify the remote copy: its size, and its hash where the account may run sha256sum
+            direct_log(f"Verifying file: {remote_file_path}")
+            error_msg = None
             try:
-                direct_log(f"Verifying file: {remote_file_path}")
-                sftp.stat(remote_file_path)
-                direct_log("File verified on remote server")
+                remote_size = sftp.stat(remote_file_path).st_size
+                if remote_size != source.size:
+                    error_msg = f"Uploaded file has {remote_size} bytes on the SFTP server, {source.size} were sent"
             except Exception as e:
                 direct_log(f"WARNING: Could not verify file: {str(e)}")
+            if error_msg is None:
+                remote_checksum = _remote_sha256(ssh_client, remote_file_path)
+                if remote_checksum and remote_checksum != source.checksum():
+                    error_msg = f"Uploaded file on the SFTP server has sha256 {remote_checksum}, {source.checksum()} was sent"
+                elif remote_checksum:
+                    direct_log("File checksum verified on remote server")
+            if error_msg:
+                direct_log(f"ERROR: {error_msg}")
+                sftp.close()
+                ssh_pool.release(ssh_client)
+                return {
+                    'success': False,
+                    'message': error_msg
+                }
             
             # Close connections
             direct_log("Closing SFTP session")
             sftp.close()
-            direct_log("Closing SSH connection")
-            ssh_client.close()
+            direct_log("Returning SSH connection to the pool")
+            ssh_pool.release(ssh_client)
             
             storage_path = f"SFTP: {task.remote_hostname}" + (f"/{task.remote_path}" if task.remote_path else "")
             
@@ -351,7 +631,8 @@ class StorageService:
                 'message': f'File uploaded to SFTP server {task.remote_hostname}' + 
                            (f' in {task.remote_path}' if task.remote_path else ''),
                 'path': backup_file_path,  # Return the local path for reference
-                'storage_path': storage_path  # Add the remote path for reference
+                'storage_path': storage_path,  # Add the remote path for reference
+                'checksum': source.checksum()
             }
         
         except Exception as e:
@@ -366,8 +647,8 @@ class StorageService:
             }
 
     @staticmethod
-    def _store_gdrive(backup_file_path, task):
-        """Upload file to Google Drive"""
+    def _store_gdrive(backup_file_path, task, fileobj=None):
+        """Upload file to Google Drive, reading from fileobj instead of the file when given"""
         try:
             direct_log(f"Starting Google Drive upload for file: {backup_file_path}")
             
@@ -383,7 +664,7 @@ class StorageService:
             
             # Initialize Google Drive API client
             from googleapiclient.discovery import build
-            from googleapiclient.http import MediaFileUpload
+            from googleapiclient.http import MediaIoBaseUpload
             from google.oauth2 import service_account
             
             creds_path = task.storage_config.gdrive_credentials_file.path
@@ -414,27 +695,56 @@ class StorageService:
                 direct_log(f"Using folder ID: {task.storage_config.gdrive_folder_id}")
                 file_metadata['parents'] = [task.storage_config.gdrive_folder_id]
                 
-            media = MediaFileUpload(
-                backup_file_path,
-                mimetype='application/octet-stream',
-                resumable=True
-            )
+            limiter = StorageService._upload_limiter(task)
+            upload_file = None
+            if fileobj is not None:
+                direct_log("Streaming upload while the dump is running...")
+                source = HashingReader(fileobj)
+                media = _streaming_media(throttle(source, limiter))
+            else:
+                # MediaFileUpload reads the file itself, pass it as a hashed (and throttled) stream
+                upload_file = open(backup_file_path, 'rb')
+                source = HashingReader(upload_file)
+                media = MediaIoBaseUpload(
+                    throttle(source, limiter),
+                    mimetype='application/octet-stream',
+                    chunksize=GDRIVE_STREAM_CHUNK_SIZE,
+                    resumable=True
+                )
             
             # Upload file
             direct_log("Starting file upload to Google Drive")
-            file = drive_service.files().create(
-                body=file_metadata,
-                media_body=media,
-                fields='id,name,webViewLink'
-            ).execute()
+            try:
+                file = drive_service.files().create(
+                    body=file_metadata,
+                    media_body=media,
+                    fields='id,name,webViewLink,size,sha256Checksum'
+                ).execute()
+            finally:
+                if upload_file:
+                    upload_file.close()
             
             direct_log(f"File uploaded successfully, ID: {file.get('id')}")
             
+            # Google Drive reports the size and SHA-256 of the stored file
+            error_msg = None
+            if file.get('size') is not None and int(file['size']) != source.size:
+                error_msg = f"Uploaded file has {file['size']} bytes on Google Drive, {source.size} were sent"
+            elif file.get('sha256Checksum') and file['sha256Checksum'].lower() != source.checksum():
+                error_msg = f"Uploaded file on Google Drive has sha256 {file['sha256Checksum']}, {source.checksum()} was sent"
+            if error_msg:
+                direct_log(f"ERROR: {error_msg}")
+                return {
+                    'success': False,
+                    'message': error_msg
+                }
+            
             return {
                 'success': True,
                 'message': f'File uploaded to Google Drive with ID: {file.get("id")}',
                 'path': backup_file_path,
-                'storage_path': f"GDrive: {file.get('name')} ({file.get('webViewLink')})"
+                'storage_path': f"GDrive: {file.get('name')} ({file.get('webViewLink')})",
+                'checksum': source.checksum()
             }
                 
         except Exception as e:
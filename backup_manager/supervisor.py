@@ -0,0 +1,221 @@
+# backup_manager/supervisor.py
+"""
+Supervised execution of dump and restore tools. Every tool runs in its own
+process group at the priority configured on the task and its stderr is kept in
+a bounded buffer. A watchdog kills the process groups of a task when its
+wall-clock timeout passes or when the backup is cancelled from the UI.
+"""
+import os
+import time
+import shutil
+import signal
+import threading
+import subprocess
+from django.db import connection
+from .models import BackupHistory, file_log
+
+# Only the end of the tool output is kept, it holds the error
+STDERR_TAIL_SIZE = 64 * 1024
+
+# Seconds between checks of the cancel flag in the database
+CANCEL_POLL_INTERVAL = 5
+
+# Seconds a killed process group gets between SIGTERM and SIGKILL
+KILL_GRACE_PERIOD = 10
+
+IONICE_CLASSES = {
+    'best_effort': ['-c', '2', '-n', '7'],
+    'idle': ['-c', '3'],
+}
+
+
+class ProcessTerminated(Exception):
+    """The task was cancelled or ran out of time, no further tools are started"""
+
+
+class StderrTail:
+    """Drains a process stream in a thread, keeping only its last bytes"""
+
+    def __init__(self, stream, limit=STDERR_TAIL_SIZE):
+        self.limit = limit
+        self.omitted = 0
+        self._buffer = bytearray()
+        self._thread = threading.Thread(target=self._drain, args=(stream,), daemon=True)
+        self._thread.start()
+
+    def _drain(self, stream):
+        for data in iter(lambda: stream.read1(8192), b''):
+            self._buffer.extend(data)
+            excess = len(self._buffer) - self.limit
+            if excess > 0:
+                del self._buffer[:excess]
+                self.omitted += excess
+        stream.close()
+
+    def join(self):
+        self._thread.join()
+
+    def text(self):
+        text = self._buffer.decode('utf-8', errors='replace')
+        if self.omitted:
+            text = f"[{self.omitted} bytes of earlier output omitted]\n" + text
+        return text
+
+
+class ProcessSupervisor:
+    """
+    Starts and watches every tool process of one backup or restore. Without a
+    history id, timeout or priorities it only bounds stderr and process groups.
+    """
+
+    def __init__(self, timeout=None, nice=0, io_priority='normal', history_id=None):
+        self.timeout = timeout
+        self.nice = nice
+        self.io_priority = io_priority
+        self.history_id = history_id
+        self.reason = None
+        self._deadline = time.monotonic() + timeout if timeout else None
+        self._processes = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def for_task(cls, task, history, timeout=True):
+        """Supervisor with the limits of a schedule, timeout=False for restores"""
+        return cls(
+            timeout=task.timeout_minutes * 60 if task and timeout and task.timeout_minutes else None,
+            nice=task.nice_level if task else 0,
+            io_priority=task.io_priority if task else 'normal',
+            history_id=history.id if history else None,
+        )
+
+    def command(self, cmd):
+        """cmd prefixed with nice/ionice according to the configured priorities"""
+        prefix = []
+        if self.io_priority in IONICE_CLASSES and shutil.which('ionice'):
+            prefix += ['ionice'] + IONICE_CLASSES[self.io_priority]
+        if self.nice and shutil.which('nice'):
+            prefix += ['nice', '-n', str(self.nice)]
+        return prefix + list(cmd)
+
+    def check(self):
+        """Raise ProcessTerminated once the task was cancelled or timed out"""
+        if self.reason:
+            raise ProcessTerminated(self.message())
+
+    def popen(self, cmd, remote=None, **kwargs):
+        """
+        Start cmd in its own process group, kill() reaches its children too.
+        With a RemoteShell cmd runs on its SSH host, without priorities.
+        """
+        self.check()
+        if remote is not None:
+            process = remote.popen(cmd, env=kwargs.get('env'))
+        else:
+            process = subprocess.Popen(self.command(cmd), start_new_session=True, **kwargs)
+        with self._lock:
+            self._processes.add(process)
+        return process
+
+    def kill(self, process):
+        self._signal(process, signal.SIGKILL)
+
+    def release(self, process):
+        with self._lock:
+            self._processes.discard(process)
+
+    def run(self, cmd, env=None, stdin=subprocess.DEVNULL):
+        """
+        Run cmd to completion with its output discarded and stderr bounded.
+        Returns a CompletedProcess with the stderr tail as text.
+        """
+        process = self.popen(cmd, stdin=stdin, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, env=env)
+        tail = StderrTail(process.stderr)
+        try:
+            returncode = process.wait()
+        finally:
+            self.release(process)
+        tail.join()
+        return subprocess.CompletedProcess(cmd, returncode, None, tail.text())
+
+    def message(self):
+        if self.reason == 'timeout':
+            return f"Timed out after {self.timeout // 60} minutes, running processes were killed"
+        if self.reason == 'cancelled':
+            return "Cancelled, running processes were killed"
+        return ''
+
+    def failure(self, message):
+        """Error message of a failed process, the termination reason when it was killed"""
+        return self.message() or message
+
+    def terminate(self, reason):
+        """Kill the process groups of every running tool, SIGKILL after a grace period"""
+        if self.reason:
+            return
+        self.reason = reason
+        file_log(f"SUPERVISOR: {self.message()}")
+        with self._lock:
+            processes = list(self._processes)
+        for process in processes:
+            self._signal(process, signal.SIGTERM)
+
+        deadline = time.monotonic() + KILL_GRACE_PERIOD
+        for process in processes:
+            try:
+                process.wait(max(0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                pass
+            self._signal(process, signal.SIGKILL)
+
+    @staticmethod
+    def _signal(process, signum):
+        if not isinstance(process, subprocess.Popen):
+            # Remote processes can only be cut off
+            process.kill()
+            return
+        try:
+            os.killpg(process.pid, signum)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def _cancel_requested(self):
+        try:
+            return BackupHistory.objects.filter(pk=self.history_id, cancel_requested=True).exists()
+        except Exception as e:
+            file_log(f"SUPERVISOR: could not read cancel flag of history {self.history_id}: {str(e)}")
+            return False
+
+    def _watch(self):
+        last_poll = time.monotonic()
+        try:
+            while not self._stop.wait(1):
+                now = time.monotonic()
+                if self._deadline and now >= self._deadline:
+                    self.terminate('timeout')
+                elif self.history_id and now - last_poll >= CANCEL_POLL_INTERVAL:
+                    last_poll = now
+                    if self._cancel_requested():
+                        self.terminate('cancelled')
+        finally:
+            # The watchdog thread has its own database connection
+            connection.close()
+
+    def start(self):
+        if self._deadline or self.history_id:
+            self._thread = threading.Thread(target=self._watch, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -1,15 +1,33 @@
 # backup_manager/tasks.py
 import os
+import time
+import shutil
+import tarfile
+import tempfile
 import datetime
+import functools
 import subprocess
-import sshtunnel
+from concurrent.futures import ThreadPoolExecutor
 from celery import shared_task
 from django.conf import settings
 from django.core.mail import send_mail
 from django.utils import timezone
 from .models import BackupTask, BackupHistory, DatabaseServer
-from .services import BackupService
+from .services import BackupService, DatabaseConnectionService, connection_endpoint, ssh_tunnel
+from .health import record_status
+from .progress import ProgressTracker
+from .supervisor import ProcessSupervisor
+from .concurrency import BackupSlots, mark_queued, clear_queued
 from .storage import StorageService
+from .binlog import replay_binlogs
+from .wal import is_physical_backup, prepare_recovery
+from .pg_engine import CopyRestorer, is_copy_backup
+from .sqlindex import select_tables
+from .verify import scratch_instance, expected_counts, compare_counts
+from .pipeline import (
+    stream_restore, read_artifact_header, open_artifact_reader, ChecksumCheck, is_manifest, read_manifest,
+    artifact_size, remove_artifact, is_directory_dump
+)
 import logging
 import traceback
 
@@ -46,9 +64,33 @@ def run_scheduled_backups():
     file_log(f"Found {due_tasks.count()} tasks due for execution")
     
     for task in due_tasks:
+        if not mark_queued(task.id):
+            file_log(f"Task {task.name} (ID: {task.id}) is already queued")
+            continue
         file_log(f"Scheduling task: {task.name} (ID: {task.id})")
         execute_backup_task.delay(task.id)
 
+# Servers tested at once by the health check
+HEALTH_CHECK_WORKERS = 8
+
+@shared_task
+def check_server_health():
+    """Test every server and cache the result, backups rely on it instead of probing"""
+    servers = list(DatabaseServer.objects.all())
+    
+    def check(server):
+        try:
+            result = DatabaseConnectionService.test_connection(server_id=server.id)
+            record_status(server, result['success'], result['message'])
+            if not result['success']:
+                file_log(f"Health check: {server.name} unreachable: {result['message']}")
+        except Exception as e:
+            file_log(f"Health check of {server.name} failed: {str(e)}")
+    
+    with ThreadPoolExecutor(max_workers=HEALTH_CHECK_WORKERS) as executor:
+        list(executor.map(check, servers))
+    file_log(f"Health check finished for {len(servers)} servers")
+
 @shared_task(bind=True, max_retries=2, default_retry_delay=60)
 def execute_backup_task(self, task_id):
     """
@@ -56,6 +98,8 @@ def execute_backup_task(self, task_id):
     """
     file_log(f"Starting backup for task_id: {task_id}")
     
+    slots = None
+    requeued = False
     try:
         task = BackupTask.objects.get(id=task_id)
         server = task.server
@@ -125,6 +169,16 @@ def execute_backup_task(self, task_id):
             file_log(f"After sync - Task remote password present: {'Yes' if task.remote_password else 'No'}")
             file_log(f"After sync - Task remote path: {task.remote_path}")
 
+        # Wait for free slots of the database host, SSH bastion and storage without blocking the worker
+        slots = BackupSlots.for_task(task)
+        if not slots.acquire():
+            file_log(f"Task {task_id} waits for a free slot of {slots.busy}, "
+                     f"requeued in {settings.BACKUP_SLOT_RETRY_DELAY} seconds")
+            execute_backup_task.apply_async((task_id,), countdown=settings.BACKUP_SLOT_RETRY_DELAY)
+            mark_queued(task_id, refresh=True)
+            requeued = True
+            return
+
         history = BackupHistory.objects.create(
             server=server,
             task=task,
@@ -132,20 +186,46 @@ def execute_backup_task(self, task_id):
         )
         file_log(f"Created history entry: {history.id}")
         
+        progress = ProgressTracker.for_history(history).start()
+        supervisor = ProcessSupervisor.for_task(task, history).start()
         try:
             # Execute backup
             file_log("Creating backup service...")
-            backup_service = BackupService(server.id)
+            backup_service = BackupService(server.id, progress=progress, supervisor=supervisor)
             file_log("Executing backup...")
-            result = backup_service.execute_backup(task)
+            try:
+                result = backup_service.execute_backup(task)
+            finally:
+                supervisor.stop()
+            if supervisor.reason:
+                # Killed processes may leave errors of their own, report why they were killed
+                if result.get('success'):
+                    remove_artifact(result['path'])
+                history.termination_reason = supervisor.reason
+                result = {'success': False, 'message': supervisor.message()}
             file_log(f"Backup result success: {result.get('success', False)}")
             file_log(f"Backup result message: {result.get('message', '')}")
             file_log(f"Backup result path: {result.get('path', '')}")
             
             if result['success']:
                 # Store backup to selected storage
-                file_log(f"Backup successful, uploading to {task.storage_type} storage...")
-                storage_result = StorageService.store_backup(result['path'], task)
+                if 'upload_result' in result:
+                    # Already uploaded while dumping
+                    file_log(f"Backup successful, streamed to {task.storage_type} storage during dump")
+                    storage_result = result['upload_result']
+                else:
+                    file_log(f"Backup successful, uploading to {task.storage_type} storage...")
+                    progress.set_phase('upload')
+                    storage_result = StorageService.store_backup(result['path'], task)
+                # The uploaded bytes are hashed on the way out, they must be the bytes the dump wrote
+                if (storage_result.get('success') and result.get('checksum') and storage_result.get('checksum')
+                        and storage_result['checksum'] != result['checksum']):
+                    storage_result = {
+                        'success': False,
+                        'message': f"Checksum mismatch: the uploaded file (sha256 {storage_result['checksum']}) "
+                                   f"differs from the dump (sha256 {result['checksum']})"
+                    }
+                progress.finish(history)
                 file_log(f"Storage result success: {storage_result.get('success', False)}")
                 file_log(f"Storage result message: {storage_result.get('message', '')}")
                 
@@ -165,8 +245,12 @@ def execute_backup_task(self, task_id):
                     try:
                         if os.path.exists(local_path):
                             file_log(f"Getting size of local file: {local_path}")
-                            history.file_size = os.path.getsize(local_path)
+                            history.file_size = artifact_size(local_path)
                             file_log(f"File size: {history.file_size} bytes")
+                        elif result.get('file_size') is not None:
+                            # Streamed without a local copy, size counted on the way out
+                            history.file_size = result['file_size']
+                            file_log(f"No local copy kept, streamed size: {history.file_size} bytes")
                         else:
                             file_log(f"WARNING: Local file not found: {local_path}")
                             history.file_size = 0
@@ -174,6 +258,18 @@ def execute_backup_task(self, task_id):
                         file_log(f"ERROR getting file size: {str(e)}")
                         history.file_size = 0
                     
+                    # Uncompressed size counted while streaming the dump
+                    history.raw_size = result.get('raw_size')
+                    history.checksum = result.get('checksum') or ''
+                    
+                    # Backup chain data for incremental (binlog) backups
+                    history.backup_type = result.get('backup_type', 'full')
+                    history.parent_id = result.get('parent_id')
+                    if result.get('binlog_position'):
+                        history.binlog_file = result['binlog_position']['file']
+                        history.binlog_position = result['binlog_position']['position']
+                    history.wal_lsn = result.get('wal_lsn') or ''
+                    
                     history.save()
                     file_log("History updated with success")
                 else:
@@ -186,6 +282,7 @@ def execute_backup_task(self, task_id):
                     file_log("History updated with storage error")
             else:
                 # Backup error
+                progress.finish(history)
                 file_log(f"Backup failed: {result.get('message', 'Unknown error')}")
                 history.completed_at = timezone.now()
                 history.status = 'error'
@@ -216,21 +313,33 @@ def execute_backup_task(self, task_id):
             file_log(error_msg)
             file_log(stack_trace)
             
+            progress.finish(history)
             history.status = 'error'
             history.error_message = f"{error_msg}\n{stack_trace}"
             history.completed_at = timezone.now()
             history.save()
             file_log("History updated with execution error")
+        finally:
+            slots.release()
             
     except Exception as e:
         error_msg = f"MAIN TASK ERROR: {str(e)}"
         stack_trace = traceback.format_exc()
         file_log(error_msg)
         file_log(stack_trace)
+        if slots:
+            slots.release()
         
         # Retry in case of database lock or similar
         file_log(f"Retrying task in 30 seconds, attempt {self.request.retries + 1}")
+        if self.request.retries < self.max_retries:
+            # The retry is still queued, the scheduler must not queue the task again
+            mark_queued(task_id, refresh=True)
+            requeued = True
         self.retry(exc=e, countdown=30)
+    finally:
+        if not requeued:
+            clear_queued(task_id)
 
 def _cleanup_old_backups(server_id, retain_count):
     """
@@ -253,14 +362,24 @@ def _cleanup_old_backups(server_id, retain_count):
     # If we have more backups than the retain count
     if history_entries.count() > retain_count:
         file_log(f"Need to remove {history_entries.count() - retain_count} oldest backups")
+        
+        # Retained incremental backups still need every older backup of their chain
+        chain_ids = set()
+        for entry in history_entries[:retain_count]:
+            if entry.backup_type == 'incremental':
+                chain_ids.update(b.id for b in entry.restore_chain())
+        
         # For each entry that exceeds our retain count
         for entry in history_entries[retain_count:]:
+            if entry.id in chain_ids:
+                file_log(f"Keeping entry ID: {entry.id}, part of a retained backup chain")
+                continue
             try:
                 file_log(f"Processing entry ID: {entry.id}, date: {entry.completed_at}")
                 # If the file exists, delete it
                 if entry.file_path and os.path.exists(entry.file_path):
                     file_log(f"Deleting file: {entry.file_path}")
-                    os.remove(entry.file_path)
+                    remove_artifact(entry.file_path)
                     file_log("File deleted successfully")
                 else:
                     file_log(f"File not found or path is empty: {entry.file_path}")
@@ -312,9 +431,11 @@ def _send_backup_notification(task, history, result):
         file_log(f"Error sending email: {str(e)}")
 
 @shared_task
-def restore_backup_task(backup_id, history_id):
+def restore_backup_task(backup_id, history_id, stop_datetime=None, tables=None):
     """
-    Restore database from backup
+    Restore database from backup. Incremental backups are restored with their
+    whole chain, stop_datetime ends the binary log replay at that point in time.
+    tables restores only these tables of a SQL dump with a table index.
     """
     file_log(f"Starting restore of backup ID: {backup_id}, history ID: {history_id}")
     
@@ -335,27 +456,47 @@ def restore_backup_task(backup_id, history_id):
         # For backward compatibility with existing backups
         if server.connection_type in ['direct', 'direct_mysql']:
             file_log("Performing direct MySQL restore")
-            result = _restore_direct(server, backup.file_path)
+            restore_func = _restore_direct
         elif server.connection_type in ['ssh', 'ssh_mysql']:
             file_log("Performing SSH tunnel MySQL restore")
-            result = _restore_ssh_tunnel(server, backup.file_path)
+            restore_func = _restore_ssh_tunnel
         elif server.connection_type == 'direct_postgresql':
             file_log("Performing direct PostgreSQL restore")
-            result = _restore_postgresql_direct(server, backup.file_path)
+            restore_func = _restore_postgresql_direct
         elif server.connection_type == 'ssh_postgresql':
             file_log("Performing SSH tunnel PostgreSQL restore")
-            result = _restore_postgresql_ssh_tunnel(server, backup.file_path)
+            restore_func = _restore_postgresql_ssh_tunnel
         else:
             error_msg = f"Unsupported connection type: {server.connection_type}"
             file_log(f"ERROR: {error_msg}")
             raise ValueError(error_msg)
         
+        # Restores can be cancelled and run at the priority of the schedule, without its timeout
+        supervisor = ProcessSupervisor.for_task(backup.task, history, timeout=False)
+        restore_func = functools.partial(restore_func, supervisor=supervisor)
+        
+        with supervisor:
+            if tables:
+                result = _restore_tables(server, backup.file_path, restore_func, tables)
+            elif is_physical_backup(backup.restore_chain()[0].file_path):
+                result = _restore_postgresql_physical(server, backup, stop_datetime)
+            elif backup.backup_type == 'incremental':
+                result = _restore_binlog_chain(server, backup, restore_func, stop_datetime, supervisor)
+            else:
+                result = _restore_artifact(server, backup.file_path, restore_func, supervisor, backup.checksum)
+        if supervisor.reason:
+            history.termination_reason = supervisor.reason
+            result = {'success': False, 'message': supervisor.message()}
+        
         history.completed_at = timezone.now()
         history.status = 'success' if result['success'] else 'error'
         
         if result['success']:
             file_log("Restore completed successfully")
             history.description += f" - completed successfully"
+            if result.get('data_dir'):
+                # Physical restores only prepare a data directory, tell where it is
+                history.description += f". {result['message']}"
         else:
             file_log(f"Restore failed: {result.get('message', 'Unknown error')}")
             history.error_message = result.get('message', 'Unknown error')
@@ -377,7 +518,292 @@ def restore_backup_task(backup_id, history_id):
         except Exception as history_error:
             file_log(f"Could not update history: {str(history_error)}")
 
-def _restore_direct(server, backup_file):
+@shared_task
+def verify_recent_backups():
+    """Queue the verification of full backups completed within VERIFY_MAX_AGE_HOURS"""
+    since = timezone.now() - datetime.timedelta(hours=settings.VERIFY_MAX_AGE_HOURS)
+    backups = BackupHistory.objects.filter(
+        status='success',
+        backup_type='full',
+        completed_at__gte=since,
+        verification_status='',
+        verified_at__isnull=True
+    ).exclude(file_path='')
+    
+    for backup in backups:
+        # Marked before queueing so the next run does not queue it again
+        backup.verification_status = 'pending'
+        backup.save(update_fields=['verification_status'])
+        verify_backup_task.delay(backup.id)
+    file_log(f"Queued verification of {len(backups)} backups")
+
+@shared_task
+def verify_backup_task(backup_id):
+    """
+    Restore a backup into a scratch database instance and compare its tables
+    and row counts with the dump. The restore duration is recorded as the
+    measured recovery time. Waits for one of VERIFY_MAX_CONCURRENT slots.
+    """
+    try:
+        backup = BackupHistory.objects.get(id=backup_id)
+    except BackupHistory.DoesNotExist:
+        file_log(f"VERIFY: backup {backup_id} no longer exists")
+        return
+    
+    if backup.backup_type != 'full' or not backup.has_file() or is_physical_backup(backup.file_path):
+        # Incremental and physical backups are not restored into a database, see the full backup
+        backup.verification_status = ''
+        backup.verification_message = 'Only full logical backups stored locally can be verified'
+        backup.verified_at = timezone.now()
+        backup.save(update_fields=['verification_status', 'verification_message', 'verified_at'])
+        return
+    
+    slots = BackupSlots.for_verification()
+    if not slots.acquire():
+        file_log(f"VERIFY: backup {backup_id} waits for a free verification slot, "
+                 f"requeued in {settings.BACKUP_SLOT_RETRY_DELAY} seconds")
+        verify_backup_task.apply_async((backup_id,), countdown=settings.BACKUP_SLOT_RETRY_DELAY)
+        return
+    
+    file_log(f"VERIFY: verifying backup {backup_id} of {backup.server.name}: {backup.file_path}")
+    try:
+        result = _verify_backup(backup)
+    except Exception as e:
+        file_log(f"ERROR in verify_backup_task: {str(e)}")
+        file_log(traceback.format_exc())
+        result = {'success': False, 'message': f'Verification error: {str(e)}'}
+    finally:
+        slots.release()
+    
+    file_log(f"VERIFY: backup {backup_id} {'passed' if result['success'] else 'failed'}: {result['message']}")
+    backup.verification_status = 'passed' if result['success'] else 'failed'
+    backup.verification_message = result['message']
+    backup.restore_seconds = result.get('restore_seconds')
+    backup.verified_at = timezone.now()
+    backup.save(update_fields=['verification_status', 'verification_message', 'restore_seconds', 'verified_at'])
+
+def _verify_backup(backup):
+    """Restore backup into a scratch instance and check its tables, result dict with restore_seconds"""
+    server = backup.server
+    restore_func = _restore_postgresql_direct if 'postgresql' in server.connection_type else _restore_direct
+    expected = expected_counts(backup.file_path)
+    
+    # Restored at the priority of the schedule, without its timeout
+    supervisor = ProcessSupervisor.for_task(backup.task, None, timeout=False)
+    restore_func = functools.partial(restore_func, supervisor=supervisor)
+    
+    with scratch_instance(server) as scratch, supervisor:
+        started = time.monotonic()
+        result = _restore_artifact(scratch, backup.file_path, restore_func, supervisor, backup.checksum)
+        restore_seconds = round(time.monotonic() - started, 1)
+        if not result['success']:
+            return {'success': False, 'message': f"Restore failed: {result['message']}"}
+        
+        if expected is None:
+            result = {
+                'success': True,
+                'message': 'Restored without errors, row counts are not recorded for this backup format'
+            }
+        else:
+            result = compare_counts(scratch, expected)
+    
+    result['restore_seconds'] = restore_seconds
+    result['message'] += f" (restored in {restore_seconds} s)"
+    return result
+
+def _restore_artifact(server, backup_file, restore_func, supervisor=None, checksum=None):
+    """
+    Restore a single backup artifact of any format. Files are verified against
+    the checksum recorded at dump time while they are read, files of a
+    manifest against the checksums in their entries.
+    """
+    if is_directory_dump(backup_file):
+        return _restore_postgresql_directory(server, backup_file, supervisor, checksum)
+    elif is_manifest(backup_file):
+        return _restore_manifest(server, backup_file, restore_func, supervisor)
+    else:
+        return restore_func(server, backup_file, checksum=checksum)
+
+def _restore_tables(server, backup_file, restore_func, tables):
+    """
+    Restore only the selected tables of a SQL dump through its table index,
+    the artifact of each database of a per-database backup on its own
+    """
+    try:
+        selection = select_tables(backup_file, tables)
+    except ValueError as e:
+        return {'success': False, 'message': str(e)}
+    
+    restored = []
+    for file_path, names in selection:
+        file_log(f"Restoring tables {', '.join(names)} from {file_path}")
+        result = restore_func(server, file_path, tables=names)
+        if not result['success']:
+            return result
+        restored.extend(names)
+    
+    return {
+        'success': True,
+        'message': f"Restored {len(restored)} tables: {', '.join(restored)}"
+    }
+
+def _restore_binlog_chain(server, backup, restore_func, stop_datetime=None, supervisor=None):
+    """
+    Restore the full backup of the chain, then replay the binary logs of every
+    incremental backup up to the selected one, optionally stopping at stop_datetime.
+    """
+    chain = backup.restore_chain()
+    base, incrementals = chain[0], chain[1:]
+    if base.backup_type != 'full' or not base.has_file():
+        return {
+            'success': False,
+            'message': 'The full backup this incremental backup is based on is no longer available'
+        }
+    
+    file_log(f"Restoring full backup {base.file_path} with {len(incrementals)} incremental backups")
+    result = _restore_artifact(server, base.file_path, restore_func, supervisor, base.checksum)
+    if not result['success']:
+        return result
+    
+    # A log still being written is copied again by the next incremental, keep the longest copy
+    binlogs = {}
+    for incremental in incrementals:
+        for entry in read_manifest(incremental.file_path)['artifacts']:
+            binlogs[entry['binlog_file']] = entry['path']
+    
+    try:
+        with connection_endpoint(server) as (host, port):
+            cmd = [
+                'mysql',
+                f'--host={host}',
+                f'--port={port}',
+                f'--user={server.username}',
+                f'--password={server.password}',
+            ]
+            replay = replay_binlogs(
+                list(binlogs.values()),
+                cmd,
+                start_position=base.binlog_position,
+                stop_datetime=stop_datetime,
+                database=server.database_name,
+                supervisor=supervisor,
+            )
+    except Exception as e:
+        file_log(traceback.format_exc())
+        replay = {'success': False, 'message': str(e)}
+    
+    if not replay['success']:
+        replay['message'] = f"Full backup restored, binary log replay failed: {replay['message']}"
+        return replay
+    
+    return {
+        'success': True,
+        'message': f"Restored full backup and {len(incrementals)} incremental backups"
+                   + (f" up to {stop_datetime}" if stop_datetime else "")
+    }
+
+def _restore_postgresql_physical(server, backup, stop_datetime=None):
+    """
+    Prepare a PostgreSQL data directory from a base backup and the WAL archived
+    up to the selected backup. The cluster is replaced by starting PostgreSQL on
+    it, which cannot be done over a database connection.
+    """
+    chain = backup.restore_chain()
+    base, incrementals = chain[0], chain[1:]
+    target_dir = os.path.join(
+        settings.BACKUP_DIR, 'restores',
+        f"{server.name}_{timezone.now().strftime('%Y%m%d_%H%M%S')}"
+    )
+    file_log(f"Preparing data directory {target_dir} from {base.file_path} and {len(incrementals)} WAL backups")
+    
+    try:
+        recovery = prepare_recovery(
+            read_manifest(base.file_path),
+            [read_manifest(incremental.file_path) for incremental in incrementals],
+            target_dir,
+            stop_datetime
+        )
+    except Exception as e:
+        file_log(traceback.format_exc())
+        shutil.rmtree(target_dir, ignore_errors=True)
+        shutil.rmtree(f"{target_dir}_wal", ignore_errors=True)
+        shutil.rmtree(f"{target_dir}_tablespaces", ignore_errors=True)
+        return {
+            'success': False,
+            'message': f'PostgreSQL physical restore error: {str(e)}'
+        }
+    
+    return {
+        'success': True,
+        'data_dir': recovery['data_dir'],
+        'message': f"Data directory prepared in {recovery['data_dir']} ({recovery['segments']} WAL segments"
+                   + (f", recovery target {stop_datetime}" if stop_datetime else "") + "). "
+                   f"Stop PostgreSQL on {server.hostname}, replace its data directory with this one "
+                   f"(owned by the postgres user) and start it to recover."
+    }
+
+def _restore_manifest(server, manifest_path, restore_func, supervisor=None):
+    """
+    Restore every artifact of a multi-file backup in manifest order.
+    Data chunks are independent of each other and are restored in parallel.
+    Backups of the native PostgreSQL engine are loaded over database
+    connections, their data files with COPY FROM STDIN.
+    """
+    manifest = read_manifest(manifest_path)
+    file_log(f"Restoring {len(manifest['artifacts'])} artifacts from manifest: {manifest_path}")
+    
+    if is_copy_backup(manifest):
+        with connection_endpoint(server) as (host, port):
+            restorer = CopyRestorer(
+                {'host': host, 'port': port, 'user': server.username, 'password': server.password},
+                supervisor
+            )
+            return _restore_manifest_entries(server, manifest, restorer.restore_entry)
+    
+    return _restore_manifest_entries(
+        server, manifest,
+        lambda entry: restore_func(server, entry['path'], checksum=entry.get('checksum'))
+    )
+
+def _restore_manifest_entries(server, manifest, restore_one):
+    """Restore the entries of a manifest with restore_one(entry), data entries in parallel"""
+    def restore_entry(entry):
+        file_log(f"Restoring {entry['database'] or 'globals'} from {entry['path']}")
+        result = restore_one(entry)
+        if not result['success']:
+            result['message'] = f"{entry['database'] or 'globals'}: {result['message']}"
+        return result
+    
+    # Group consecutive entries of the same phase, schema must exist before data
+    groups = []
+    for entry in manifest['artifacts']:
+        phase = entry.get('phase')
+        if groups and phase == 'data' and groups[-1][0] == 'data':
+            groups[-1][1].append(entry)
+        else:
+            groups.append((phase, [entry]))
+    
+    for phase, entries in groups:
+        if phase == 'data' and len(entries) > 1:
+            workers = max(1, min(server.parallel_workers, len(entries)))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(restore_entry, entries))
+        else:
+            results = [restore_entry(entry) for entry in entries]
+        
+        failed = [r for r in results if not r['success']]
+        if failed:
+            return {
+                'success': False,
+                'message': '\n'.join(r['message'] for r in failed)
+            }
+    
+    return {
+        'success': True,
+        'message': f"Restored {len(manifest['artifacts'])} artifacts"
+    }
+
+def _restore_direct(server, backup_file, supervisor=None, checksum=None, tables=None):
     """Restore database directly via TCP/IP"""
     file_log(f"Starting direct restore for server: {server.name}")
     file_log(f"Using backup file: {backup_file}")
@@ -413,22 +839,17 @@ def _restore_direct(server, backup_file):
         
         file_log(f"Running MySQL restore command: {' '.join(cmd)}")
         
-        with open(backup_file, 'rb') as f:
-            result = subprocess.run(
-                cmd,
-                stdin=f,
-                capture_output=True,
-                text=True
-            )
+        # Decompress the artifact on the fly and feed it to mysql
+        result = stream_restore(cmd, backup_file, supervisor=supervisor, checksum=checksum, tables=tables)
         
-        if result.returncode == 0:
+        if result['success']:
             file_log("Restore command completed successfully")
             return {
                 'success': True,
                 'message': 'Backup restored successfully'
             }
         else:
-            error_msg = f'Error during restore: {result.stderr}'
+            error_msg = f"Error during restore: {result['message']}"
             file_log(f"ERROR: {error_msg}")
             return {
                 'success': False,
@@ -443,7 +864,7 @@ def _restore_direct(server, backup_file):
             'message': error_msg
         }
 
-def _restore_ssh_tunnel(server, backup_file):
+def _restore_ssh_tunnel(server, backup_file, supervisor=None, checksum=None, tables=None):
     """Restore database through SSH tunnel"""
     file_log(f"Starting SSH tunnel restore for server: {server.name}")
     file_log(f"Using backup file: {backup_file}")
@@ -484,20 +905,11 @@ def _restore_ssh_tunnel(server, backup_file):
         file_log(f"SSH username: {server.ssh_username}")
         file_log(f"SSH authentication: {'Password' if server.ssh_password else 'Key'}")
         
-        ssh_config = {
-            'ssh_address_or_host': (server.ssh_hostname, int(server.ssh_port)),
-            'ssh_username': server.ssh_username,
-            'remote_bind_address': (server.hostname, int(server.port))
-        }
-        
-        if server.ssh_password:
-            ssh_config['ssh_password'] = server.ssh_password
-        elif server.ssh_key_file and server.ssh_key_file.path:
-            ssh_config['ssh_pkey'] = server.ssh_key_file.path
+        if not server.ssh_password and server.ssh_key_file and server.ssh_key_file.path:
             file_log(f"Using SSH key file: {server.ssh_key_file.path}")
             
         file_log("Opening SSH tunnel")
-        with sshtunnel.SSHTunnelForwarder(**ssh_config) as tunnel:
+        with ssh_tunnel(server) as tunnel:
             file_log(f"SSH tunnel established, local port: {tunnel.local_bind_port}")
             
             cmd = [
@@ -516,22 +928,17 @@ def _restore_ssh_tunnel(server, backup_file):
             
             file_log(f"Running MySQL restore command through tunnel: {' '.join(cmd)}")
             
-            with open(backup_file, 'rb') as f:
-                result = subprocess.run(
-                    cmd,
-                    stdin=f,
-                    capture_output=True,
-                    text=True
-                )
+            # Decompress the artifact on the fly and feed it to mysql
+            result = stream_restore(cmd, backup_file, supervisor=supervisor, checksum=checksum, tables=tables)
             
-            if result.returncode == 0:
+            if result['success']:
                 file_log("Restore command completed successfully")
                 return {
                     'success': True,
                     'message': 'Backup successfully restored through SSH tunnel'
                 }
             else:
-                error_msg = f'Error during restore: {result.stderr}'
+                error_msg = f"Error during restore: {result['message']}"
                 file_log(f"ERROR: {error_msg}")
                 return {
                     'success': False,
@@ -547,7 +954,7 @@ def _restore_ssh_tunnel(server, backup_file):
             'message': error_msg
         }
 
-def _restore_postgresql_direct(server, backup_file):
+def _restore_postgresql_direct(server, backup_file, supervisor=None, checksum=None, tables=None):
     """Restore PostgreSQL database directly via TCP/IP"""
     file_log(f"Starting direct PostgreSQL restore for server: {server.name}")
     file_log(f"Using backup file: {backup_file}")
@@ -571,13 +978,9 @@ def _restore_postgresql_direct(server, backup_file):
         env['PGPASSWORD'] = server.password
         
         # Determine if the backup is in custom format (pg_dump -Fc) or plain SQL
-        is_custom_format = False
-        with open(backup_file, 'rb') as f:
-            # Check the first few bytes for the PostgreSQL custom format signature
-            # Custom format files start with "PGDMP"
-            header = f.read(5)
-            if header.startswith(b'PGDMP'):
-                is_custom_format = True
+        # Check the first few bytes for the PostgreSQL custom format signature
+        # Custom format files start with "PGDMP" (checked after decompression)
+        is_custom_format = read_artifact_header(backup_file).startswith(b'PGDMP')
         
         if is_custom_format:
             # Build command for restoring custom format backup
@@ -591,7 +994,6 @@ def _restore_postgresql_direct(server, backup_file):
                 '--no-owner', # Don't output commands to set ownership
                 '--no-privileges', # Don't restore privileges
                 '--verbose',  # Verbose mode
-                backup_file
             ]
         else:
             # Plain SQL format - use psql
@@ -601,26 +1003,21 @@ def _restore_postgresql_direct(server, backup_file):
                 '-p', str(server.port),
                 '-U', server.username,
                 '-d', server.database_name if server.database_name else 'postgres',
-                '-f', backup_file
             ]
         
         file_log(f"Running PostgreSQL restore command: {' '.join(cmd)}")
         
-        result = subprocess.run(
-            cmd,
-            env=env,
-            capture_output=True,
-            text=True
-        )
+        # Both psql and pg_restore read the decompressed artifact from stdin
+        result = stream_restore(cmd, backup_file, env=env, supervisor=supervisor, checksum=checksum, tables=tables)
         
-        if result.returncode == 0:
+        if result['success']:
             file_log("Restore command completed successfully")
             return {
                 'success': True,
                 'message': 'PostgreSQL backup restored successfully'
             }
         else:
-            error_msg = f'Error during PostgreSQL restore: {result.stderr}'
+            error_msg = f"Error during PostgreSQL restore: {result['message']}"
             file_log(f"ERROR: {error_msg}")
             return {
                 'success': False,
@@ -635,7 +1032,7 @@ def _restore_postgresql_direct(server, backup_file):
             'message': error_msg
         }
 
-def _restore_postgresql_ssh_tunnel(server, backup_file):
+def _restore_postgresql_ssh_tunnel(server, backup_file, supervisor=None, checksum=None, tables=None):
     """Restore PostgreSQL database through SSH tunnel"""
     file_log(f"Starting SSH tunnel PostgreSQL restore for server: {server.name}")
     file_log(f"Using backup file: {backup_file}")
@@ -676,16 +1073,7 @@ def _restore_postgresql_ssh_tunnel(server, backup_file):
         file_log(f"SSH username: {server.ssh_username}")
         file_log(f"SSH authentication: {'Password' if server.ssh_password else 'Key'}")
         
-        ssh_config = {
-            'ssh_address_or_host': (server.ssh_hostname, int(server.ssh_port)),
-            'ssh_username': server.ssh_username,
-            'remote_bind_address': (server.hostname, int(server.port))
-        }
-        
-        if server.ssh_password:
-            ssh_config['ssh_password'] = server.ssh_password
-        elif server.ssh_key_file and server.ssh_key_file.path:
-            ssh_config['ssh_pkey'] = server.ssh_key_file.path
+        if not server.ssh_password and server.ssh_key_file and server.ssh_key_file.path:
             file_log(f"Using SSH key file: {server.ssh_key_file.path}")
             
         # Set environment variables for pg_restore
@@ -693,15 +1081,11 @@ def _restore_postgresql_ssh_tunnel(server, backup_file):
         env['PGPASSWORD'] = server.password
         
         # Determine if the backup is in custom format (pg_dump -Fc) or plain SQL
-        is_custom_format = False
-        with open(backup_file, 'rb') as f:
-            # Check the first few bytes for the PostgreSQL custom format signature
-            header = f.read(5)
-            if header.startswith(b'PGDMP'):
-                is_custom_format = True
+        # Check the first few bytes for the PostgreSQL custom format signature
+        is_custom_format = read_artifact_header(backup_file).startswith(b'PGDMP')
                 
         file_log("Opening SSH tunnel")
-        with sshtunnel.SSHTunnelForwarder(**ssh_config) as tunnel:
+        with ssh_tunnel(server) as tunnel:
             file_log(f"SSH tunnel established, local port: {tunnel.local_bind_port}")
             
             if is_custom_format:
@@ -716,7 +1100,6 @@ def _restore_postgresql_ssh_tunnel(server, backup_file):
                     '--no-owner', # Don't output commands to set ownership
                     '--no-privileges', # Don't restore privileges
                     '--verbose',  # Verbose mode
-                    backup_file
                 ]
             else:
                 # Plain SQL format - use psql
@@ -726,26 +1109,21 @@ def _restore_postgresql_ssh_tunnel(server, backup_file):
                     '-p', str(tunnel.local_bind_port),
                     '-U', server.username,
                     '-d', server.database_name if server.database_name else 'postgres',
-                    '-f', backup_file
                 ]
             
             file_log(f"Running PostgreSQL restore command through tunnel: {' '.join(cmd)}")
             
-            result = subprocess.run(
-                cmd,
-                env=env,
-                capture_output=True,
-                text=True
-            )
+            # Both psql and pg_restore read the decompressed artifact from stdin
+            result = stream_restore(cmd, backup_file, env=env, supervisor=supervisor, checksum=checksum, tables=tables)
             
-            if result.returncode == 0:
+            if result['success']:
                 file_log("Restore command completed successfully")
                 return {
                     'success': True,
                     'message': 'PostgreSQL backup successfully restored through SSH tunnel'
                 }
             else:
-                error_msg = f'Error during PostgreSQL restore: {result.stderr}'
+                error_msg = f"Error during PostgreSQL restore: {result['message']}"
                 file_log(f"ERROR: {error_msg}")
                 return {
                     'success': False,
@@ -760,3 +1138,87 @@ def _restore_postgresql_ssh_tunnel(server, backup_file):
             'success': False,
             'message': error_msg
         }
+
+def _restore_postgresql_directory(server, backup_file, supervisor=None, checksum=None):
+    """Restore directory format PostgreSQL dumps with parallel pg_restore jobs"""
+    file_log(f"Starting parallel PostgreSQL restore for server: {server.name}")
+    file_log(f"Using backup file: {backup_file}")
+    
+    supervisor = supervisor or ProcessSupervisor()
+    work_dir = tempfile.mkdtemp(prefix='restore_', dir=settings.BACKUP_DIR)
+    try:
+        file_log(f"Extracting directory dump to: {work_dir}")
+        check = ChecksumCheck(checksum) if checksum else None
+        with open_artifact_reader(backup_file, check) as reader, tarfile.open(fileobj=reader, mode='r|') as tar:
+            tar.extractall(work_dir, filter='data')
+            # Verified before pg_restore sees any of the extracted files
+            if check is not None and not check.matches():
+                raise ValueError('Checksum mismatch, the artifact is corrupted or truncated')
+        
+        env = os.environ.copy()
+        env['PGPASSWORD'] = server.password
+        jobs = max(1, server.parallel_workers)
+        globals_file = os.path.join(work_dir, 'globals.sql')
+        
+        with connection_endpoint(server) as (host, port):
+            # Backup of all databases: restore roles first, then recreate each database
+            if os.path.exists(globals_file):
+                file_log("Restoring roles and tablespaces")
+                cmd = ['psql', '-h', host, '-p', str(port), '-U', server.username, '-d', 'postgres']
+                result = stream_restore(cmd, globals_file, env=env, supervisor=supervisor)
+                if not result['success']:
+                    error_msg = f"Error restoring globals: {result['message']}"
+                    file_log(f"ERROR: {error_msg}")
+                    return {
+                        'success': False,
+                        'message': error_msg
+                    }
+            
+            for name in sorted(os.listdir(work_dir)):
+                dump_dir = os.path.join(work_dir, name)
+                if not os.path.isdir(dump_dir):
+                    continue
+                
+                cmd = [
+                    'pg_restore',
+                    '-h', host,
+                    '-p', str(port),
+                    '-U', server.username,
+                    '-j', str(jobs),
+                    '--clean',
+                    '--if-exists',
+                    '--no-owner',
+                    '--no-privileges',
+                ]
+                if os.path.exists(globals_file):
+                    cmd.extend(['--create', '-d', 'postgres'])
+                else:
+                    cmd.extend(['-d', server.database_name or name])
+                cmd.append(dump_dir)
+                
+                file_log(f"Running pg_restore with {jobs} jobs for database: {name}")
+                result = supervisor.run(cmd, env=env)
+                
+                if result.returncode != 0:
+                    error_msg = f'Error during PostgreSQL restore of {name}: {supervisor.failure(result.stderr)}'
+                    file_log(f"ERROR: {error_msg}")
+                    return {
+                        'success': False,
+                        'message': error_msg
+                    }
+        
+        file_log("Parallel restore completed successfully")
+        return {
+            'success': True,
+            'message': f'PostgreSQL directory backup restored successfully ({jobs} jobs)'
+        }
+    except Exception as e:
+        error_msg = f'PostgreSQL restore error: {str(e)}'
+        file_log(f"ERROR: {error_msg}")
+        file_log(traceback.format_exc())
+        return {
+            'success': False,
+            'message': error_msg
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
@@ -1,3 +1,72 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from types import SimpleNamespace
+from unittest import mock
+from django.test import SimpleTestCase
+from .health import connection_error
+from .pipeline import write_manifest, manifest_dir, MANIFEST_SUFFIX
+from .storage import StorageService
 
-# Create your tests here.
+
+class StoreManifestTests(SimpleTestCase):
+    """Multi-file artifacts uploaded to remote storage"""
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.work_dir)
+        self.manifest_path = os.path.join(self.work_dir, f"backup{MANIFEST_SUFFIX}")
+        files = ['globals.sql.gz', 'db1.sql.gz', 'db2.sql.gz']
+        files_dir = manifest_dir(self.manifest_path)
+        os.makedirs(files_dir, exist_ok=True)
+        for name in files:
+            with open(os.path.join(files_dir, name), 'wb') as f:
+                f.write(b'dump')
+        write_manifest(self.manifest_path, {
+            'engine': 'postgresql',
+            'artifacts': [{'database': None, 'file': name} for name in files],
+        })
+        self.member_paths = [os.path.join(files_dir, name) for name in files]
+
+    def test_every_file_uploaded_once_manifest_last(self):
+        task = SimpleNamespace(
+            name='nightly', storage_type='sftp', storage_config=None, remote_hostname='backup.example.com',
+            remote_port=22, remote_username='debt', remote_password='secret', remote_path='/backups'
+        )
+        uploaded = []
+
+        def store_sftp(path, task, fileobj=None):
+            uploaded.append(path)
+            return {'success': True, 'message': 'uploaded'}
+
+        with mock.patch.object(StorageService, '_store_sftp', side_effect=store_sftp):
+            result = StorageService.store_backup(self.manifest_path, task)
+
+        self.assertTrue(result['success'])
+        self.assertEqual(result['path'], self.manifest_path)
+        self.assertEqual(uploaded, self.member_paths + [self.manifest_path])
+
+
+class ConnectionErrorTests(SimpleTestCase):
+    """Dump tool errors cached as a server being unreachable"""
+
+    def test_postgresql_unreachable_server(self):
+        stderr = ('pg_dump: error: connection to server at "db" (10.0.0.5), port 5432 failed: Connection refused\n'
+                  '\tIs the server running on that host and accepting TCP/IP connections?\n')
+        self.assertEqual(connection_error(stderr), 'PostgreSQL connection failed: Connection refused')
+
+    def test_postgresql_server_starting_up(self):
+        stderr = ('pg_dump: error: connection to server at "db" (10.0.0.5), port 5432 failed: '
+                  'FATAL:  the database system is starting up\n')
+        self.assertEqual(connection_error(stderr), 'PostgreSQL connection failed: the database system is starting up')
+
+    def test_postgresql_fatal_errors_of_reachable_server(self):
+        for stderr in (
+            'pg_dump: error: connection to server at "db" (10.0.0.5), port 5432 failed: '
+            'FATAL:  password authentication failed for user "debt"\n',
+            'pg_dump: error: connection to server at "db" (10.0.0.5), port 5432 failed: '
+            'FATAL:  database "shop" does not exist\n',
+            'pg_dump: error: Dumping the contents of table "orders" failed: PQgetResult() failed.\n'
+            'pg_dump: error: Error message from server: FATAL:  terminating connection due to administrator command\n',
+        ):
+            self.assertIsNone(connection_error(stderr))
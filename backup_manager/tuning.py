@@ -0,0 +1,133 @@
+# backup_manager/tuning.py
+"""
+Options of the dump tools of a server. A DumpProfile sets them by hand or,
+in auto mode, has them chosen from the sizes and storage engines of the
+tables on the server when a backup starts.
+"""
+import mysql.connector
+import psycopg2
+from .models import file_log
+from .mysql_engine import SYSTEM_DATABASES
+
+# Options of servers without a profile
+DEFAULT_TUNING = {
+    'single_transaction': True,
+    'quick': True,
+    'extended_insert': True,
+    'net_buffer_length': 0,
+    'pg_compression_level': None,
+}
+
+# Datasets at least this large are tuned for throughput
+LARGE_DATASET_BYTES = 10 * 1024 * 1024 * 1024
+
+# INSERT statement size of large MySQL datasets, fewer statements load faster on restore
+LARGE_NET_BUFFER_LENGTH = 1024 * 1024
+
+# pg_dump -Z level of large PostgreSQL datasets, compression speed matters more than ratio
+LARGE_PG_COMPRESSION_LEVEL = 1
+
+# Engines whose tables are dumped consistently by --single-transaction
+TRANSACTIONAL_ENGINES = ('InnoDB', 'RocksDB', 'TokuDB')
+
+
+def profile_tuning(profile):
+    """Options set by hand on a manual profile"""
+    return {
+        'single_transaction': profile.single_transaction,
+        'quick': profile.quick,
+        'extended_insert': profile.extended_insert,
+        'net_buffer_length': profile.net_buffer_length,
+        'pg_compression_level': profile.pg_compression_level,
+    }
+
+
+def _format_size(size):
+    return f"{size / (1024 * 1024 * 1024):.1f} GB"
+
+
+def _mysql_auto_tuning(server, host, port):
+    conn = mysql.connector.connect(host=host, port=port, user=server.username, password=server.password)
+    try:
+        cursor = conn.cursor()
+        placeholders = ', '.join(['%s'] * len(SYSTEM_DATABASES))
+        query = (
+            "SELECT ENGINE, COALESCE(SUM(DATA_LENGTH + INDEX_LENGTH), 0) FROM information_schema.TABLES "
+            f"WHERE TABLE_TYPE = 'BASE TABLE' AND TABLE_SCHEMA NOT IN ({placeholders})"
+        )
+        params = list(SYSTEM_DATABASES)
+        if server.database_name:
+            query += " AND TABLE_SCHEMA = %s"
+            params.append(server.database_name)
+        cursor.execute(query + " GROUP BY ENGINE", params)
+        sizes = {engine: int(size) for engine, size in cursor.fetchall()}
+        cursor.execute("SELECT @@max_allowed_packet")
+        max_packet = int(cursor.fetchone()[0])
+        cursor.close()
+    finally:
+        conn.close()
+
+    total = sum(sizes.values())
+    other_engines = sorted(engine or 'unknown' for engine in sizes if engine not in TRANSACTIONAL_ENGINES)
+    tuning = dict(DEFAULT_TUNING)
+    # Non-transactional tables are only consistent while they are locked
+    tuning['single_transaction'] = not other_engines
+    if total >= LARGE_DATASET_BYTES:
+        tuning['net_buffer_length'] = min(LARGE_NET_BUFFER_LENGTH, max_packet)
+
+    engines = f"{', '.join(other_engines)} tables, locking them" if other_engines else "transactional tables only"
+    tuning['reason'] = f"{_format_size(total)} of data, {engines}"
+    return tuning
+
+
+def _postgresql_auto_tuning(server, host, port):
+    if server.database_name:
+        query = (
+            "SELECT COALESCE(SUM(pg_catalog.pg_total_relation_size(c.oid)), 0) FROM pg_catalog.pg_class c "
+            "JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace "
+            "WHERE c.relkind IN ('r', 'm') AND n.nspname <> 'information_schema' AND n.nspname !~ '^pg_'"
+        )
+        database = server.database_name
+    else:
+        query = (
+            "SELECT COALESCE(SUM(pg_catalog.pg_database_size(datname)), 0) FROM pg_catalog.pg_database "
+            "WHERE datallowconn AND NOT datistemplate"
+        )
+        database = 'postgres'
+    conn = psycopg2.connect(host=host, port=port, user=server.username, password=server.password, dbname=database)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(query)
+        total = int(cursor.fetchone()[0])
+        cursor.close()
+    finally:
+        conn.close()
+
+    tuning = dict(DEFAULT_TUNING)
+    if total >= LARGE_DATASET_BYTES:
+        tuning['pg_compression_level'] = LARGE_PG_COMPRESSION_LEVEL
+    tuning['reason'] = f"{_format_size(total)} of data"
+    return tuning
+
+
+def auto_tuning(server, host, port):
+    """Options chosen from the tables on the server, reached at host:port"""
+    if 'postgresql' in server.connection_type:
+        tuning = _postgresql_auto_tuning(server, host, port)
+    else:
+        tuning = _mysql_auto_tuning(server, host, port)
+    file_log(f"TUNING: {server.name}: {tuning['reason']}")
+    return tuning
+
+
+def mysqldump_options(tuning):
+    """mysqldump command line options of a tuning"""
+    options = []
+    # Without it mysqldump locks the tables of each database (--lock-tables of --opt)
+    if tuning['single_transaction']:
+        options.append('--single-transaction')
+    options.append('--quick' if tuning['quick'] else '--skip-quick')
+    options.append('--extended-insert' if tuning['extended_insert'] else '--skip-extended-insert')
+    if tuning['net_buffer_length']:
+        options.append(f"--net-buffer-length={tuning['net_buffer_length']}")
+    return options
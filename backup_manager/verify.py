@@ -0,0 +1,311 @@
+# backup_manager/verify.py
+"""
+Restore verification. A backup is restored into a throwaway MySQL or
+PostgreSQL instance started on the worker from the server binaries in a
+temporary data directory, then its tables and their row counts are compared
+with the counts recorded while the dump ran: in the table index of SQL dumps
+(sqlindex) and in the data entries of native engine manifests.
+"""
+import os
+import pwd
+import copy
+import time
+import shutil
+import socket
+import tempfile
+import subprocess
+import contextlib
+import mysql.connector
+import psycopg2
+from django.conf import settings
+from .models import file_log
+from .pipeline import is_manifest, read_manifest
+from .sqlindex import read_index, table_key, _indexed_files
+from .mysql_engine import SYSTEM_DATABASES, quote_identifier as mysql_identifier
+from .pg_engine import quote_identifier as postgresql_identifier, _qualified
+
+# Seconds a scratch instance may take to start or stop
+SCRATCH_START_TIMEOUT = 120
+
+# Table names listed in a failure message, the rest are counted
+MAX_LISTED_TABLES = 10
+
+# Manifests of the table-parallel engines, their data entries carry row counts
+NATIVE_ENGINES = ('mysql_parallel', 'pg_copy')
+
+# PostgreSQL settings of a scratch instance, its data is thrown away
+POSTGRESQL_SCRATCH_OPTIONS = '-c fsync=off -c full_page_writes=off -c synchronous_commit=off'
+
+
+def _binary(directory, name):
+    return os.path.join(directory, name) if directory else name
+
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _run(cmd, **kwargs):
+    result = subprocess.run(cmd, capture_output=True, text=True, **kwargs)
+    if result.returncode != 0:
+        raise RuntimeError(f"{os.path.basename(cmd[0])} failed: {(result.stderr or result.stdout).strip()[-1000:]}")
+    return result
+
+
+def _scratch_server(server, connection_type, port, username, password):
+    """Unsaved copy of server pointing at the scratch instance"""
+    scratch = copy.copy(server)
+    scratch.connection_type = connection_type
+    scratch.hostname = '127.0.0.1'
+    scratch.port = port
+    scratch.username = username
+    scratch.password = password
+    return scratch
+
+
+@contextlib.contextmanager
+def _postgresql_instance(server, work_dir, socket_dir):
+    bin_dir = settings.VERIFY_POSTGRESQL_BIN
+    data_dir = os.path.join(work_dir, 'data')
+    port = _free_port()
+    # The superuser is named after the user of the server, dumps set owners to it
+    _run([_binary(bin_dir, 'initdb'), '-D', data_dir, '-U', server.username, '--auth=trust',
+          '--encoding=UTF8', '--no-sync'])
+    _run([
+        _binary(bin_dir, 'pg_ctl'), '-D', data_dir, '-l', os.path.join(work_dir, 'postgresql.log'),
+        '-w', '-t', str(SCRATCH_START_TIMEOUT),
+        '-o', f"-p {port} -k {socket_dir} -c listen_addresses=127.0.0.1 {POSTGRESQL_SCRATCH_OPTIONS}",
+        'start',
+    ])
+    try:
+        scratch = _scratch_server(server, 'direct_postgresql', port, server.username, '')
+        if server.database_name:
+            conn = psycopg2.connect(host='127.0.0.1', port=port, user=server.username, dbname='postgres')
+            try:
+                conn.autocommit = True
+                cursor = conn.cursor()
+                cursor.execute(f"CREATE DATABASE {postgresql_identifier(server.database_name)}")
+                cursor.close()
+            finally:
+                conn.close()
+        yield scratch
+    finally:
+        subprocess.run([_binary(bin_dir, 'pg_ctl'), '-D', data_dir, '-m', 'immediate', '-w', 'stop'],
+                       capture_output=True)
+
+
+@contextlib.contextmanager
+def _mysql_instance(server, work_dir, socket_dir):
+    bin_dir = settings.VERIFY_MYSQL_BIN
+    data_dir = os.path.join(work_dir, 'data')
+    sock = os.path.join(socket_dir, 'mysqld.sock')
+    port = _free_port()
+    # mysqld refuses to run as root unless told to
+    user = f"--user={pwd.getpwuid(os.getuid()).pw_name}"
+    version = _run([_binary(bin_dir, 'mysqld'), '--version']).stdout
+    if 'MariaDB' in version:
+        _run([_binary(bin_dir, 'mysql_install_db'), '--no-defaults', f'--datadir={data_dir}', user,
+              '--auth-root-authentication-method=normal'])
+    else:
+        _run([_binary(bin_dir, 'mysqld'), '--no-defaults', '--initialize-insecure', f'--datadir={data_dir}', user])
+
+    log = open(os.path.join(work_dir, 'mysqld.log'), 'wb')
+    process = subprocess.Popen([
+        _binary(bin_dir, 'mysqld'), '--no-defaults', f'--datadir={data_dir}', user,
+        f'--socket={sock}', f'--port={port}', '--bind-address=127.0.0.1', '--skip-name-resolve',
+        f"--pid-file={os.path.join(work_dir, 'mysqld.pid')}", '--skip-log-bin', '--loose-mysqlx=OFF',
+        '--innodb-flush-log-at-trx-commit=0',
+    ], stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+    admin = [_binary(bin_dir, 'mysqladmin'), '--no-defaults', f'--socket={sock}', '--user=root']
+    try:
+        deadline = time.monotonic() + SCRATCH_START_TIMEOUT
+        while subprocess.run(admin + ['ping'], capture_output=True).returncode != 0:
+            if process.poll() is not None or time.monotonic() > deadline:
+                with open(os.path.join(work_dir, 'mysqld.log'), errors='replace') as f:
+                    raise RuntimeError(f"mysqld did not start: {f.read()[-1000:].strip()}")
+            time.sleep(1)
+
+        # root@localhost only reaches the socket, restores connect over TCP
+        conn = mysql.connector.connect(unix_socket=sock, user='root')
+        try:
+            cursor = conn.cursor()
+            cursor.execute("CREATE USER IF NOT EXISTS 'root'@'127.0.0.1'")
+            cursor.execute("GRANT ALL PRIVILEGES ON *.* TO 'root'@'127.0.0.1' WITH GRANT OPTION")
+            if server.database_name:
+                cursor.execute(f"CREATE DATABASE IF NOT EXISTS {mysql_identifier(server.database_name)}")
+            cursor.close()
+        finally:
+            conn.close()
+        yield _scratch_server(server, 'direct_mysql', port, 'root', '')
+    finally:
+        subprocess.run(admin + ['shutdown'], capture_output=True)
+        try:
+            process.wait(timeout=SCRATCH_START_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        log.close()
+
+
+@contextlib.contextmanager
+def scratch_instance(server):
+    """
+    Start an empty local instance of the database engine of server and yield
+    an unsaved copy of server connecting to it, with its database created.
+    The instance and its data directory are removed on exit.
+    """
+    work_dir = tempfile.mkdtemp(prefix='verify_', dir=settings.BACKUP_DIR)
+    # Socket paths are limited to about 100 characters, BACKUP_DIR may be deeper
+    socket_dir = tempfile.mkdtemp(prefix='debt_')
+    try:
+        if 'postgresql' in server.connection_type:
+            instance = _postgresql_instance(server, work_dir, socket_dir)
+        else:
+            instance = _mysql_instance(server, work_dir, socket_dir)
+        with instance as scratch:
+            file_log(f"VERIFY: scratch instance of {server.name} listening on 127.0.0.1:{scratch.port}")
+            yield scratch
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        shutil.rmtree(socket_dir, ignore_errors=True)
+
+
+def _add_count(counts, key, rows):
+    # None marks a table whose rows were not counted at dump time
+    if rows is None or counts.get(key, 0) is None:
+        counts[key] = None
+    else:
+        counts[key] = counts.get(key, 0) + rows
+
+
+def _table(entry):
+    return entry['database'], entry.get('schema'), entry['table']
+
+
+def expected_counts(path):
+    """
+    Row counts recorded at dump time of the artifact at path, keyed by
+    (database, schema, table). None when the artifact has no recorded
+    counts (custom and directory format dumps).
+    """
+    counts = {}
+    manifest = read_manifest(path) if is_manifest(path) else None
+    if manifest is not None and manifest.get('engine') in NATIVE_ENGINES:
+        # One data entry per table (PostgreSQL) or per chunk of a table (MySQL)
+        for entry in manifest['artifacts']:
+            if entry.get('phase') == 'data':
+                _add_count(counts, _table(entry), entry.get('rows'))
+        return counts or None
+
+    indexed = False
+    for file_path in _indexed_files(path):
+        index = read_index(file_path)
+        if index is None:
+            continue
+        indexed = True
+        for entry in index['tables']:
+            key = _table(entry)
+            if entry['kind'] == 'schema':
+                # PostgreSQL tables without data (partitioned tables) only need to exist
+                counts.setdefault(key, 0)
+            else:
+                _add_count(counts, key, entry.get('rows'))
+    return counts if indexed else None
+
+
+def _mysql_counts(scratch, keys):
+    conn = mysql.connector.connect(host=scratch.hostname, port=scratch.port, user=scratch.username,
+                                   password=scratch.password)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT TABLE_SCHEMA, TABLE_NAME FROM information_schema.TABLES WHERE TABLE_TYPE = 'BASE TABLE'")
+        existing = {(database, None, table) for database, table in cursor.fetchall()}
+        counts = {}
+        for key in keys:
+            if key in existing:
+                database, _, table = key
+                cursor.execute(f"SELECT COUNT(*) FROM {mysql_identifier(database)}.{mysql_identifier(table)}")
+                counts[key] = cursor.fetchone()[0]
+        cursor.close()
+        return counts
+    finally:
+        conn.close()
+
+
+def _postgresql_counts(scratch, keys):
+    databases = {}
+    for key in keys:
+        databases.setdefault(key[0], []).append(key)
+
+    counts = {}
+    for database, database_keys in databases.items():
+        try:
+            conn = psycopg2.connect(host=scratch.hostname, port=scratch.port, user=scratch.username,
+                                    dbname=database)
+        except psycopg2.OperationalError:
+            # Database not restored, all its tables are missing
+            continue
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT n.nspname, c.relname FROM pg_catalog.pg_class c "
+                "JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace "
+                "WHERE c.relkind IN ('r', 'p') AND n.nspname <> 'information_schema' AND n.nspname !~ '^pg_'"
+            )
+            existing = {(database, schema, table) for schema, table in cursor.fetchall()}
+            for key in database_keys:
+                if key in existing:
+                    # Rows of partitions are counted on the partitions
+                    cursor.execute(f"SELECT COUNT(*) FROM ONLY {_qualified(key[1], key[2])}")
+                    counts[key] = cursor.fetchone()[0]
+            cursor.close()
+        finally:
+            conn.close()
+    return counts
+
+
+def _name(key):
+    database, schema, table = key
+    return table_key({'database': database, 'schema': schema, 'table': table})
+
+
+def _listed(names):
+    listed = ', '.join(names[:MAX_LISTED_TABLES])
+    if len(names) > MAX_LISTED_TABLES:
+        listed += f" and {len(names) - MAX_LISTED_TABLES} more"
+    return listed
+
+
+def compare_counts(scratch, expected):
+    """Compare the tables restored into scratch with the expected counts, result dict"""
+    # Dumps of a single database may not name it
+    expected = {(database or scratch.database_name, schema, table): rows
+                for (database, schema, table), rows in expected.items()}
+    if 'postgresql' in scratch.connection_type:
+        keys = [key for key in expected if key[0]]
+        actual = _postgresql_counts(scratch, keys)
+    else:
+        # System tables differ between any two instances
+        keys = [key for key in expected if key[0] and key[0] not in SYSTEM_DATABASES]
+        actual = _mysql_counts(scratch, keys)
+
+    missing = [_name(key) for key in keys if key not in actual]
+    mismatched = [
+        f"{_name(key)} ({actual[key]} rows, {expected[key]} dumped)" for key in keys
+        if key in actual and expected[key] is not None and actual[key] != expected[key]
+    ]
+    problems = []
+    if missing:
+        problems.append(f"{len(missing)} of {len(keys)} tables missing: {_listed(missing)}")
+    if mismatched:
+        problems.append(f"row counts differ in {len(mismatched)} tables: {_listed(mismatched)}")
+    if problems:
+        return {'success': False, 'message': '; '.join(problems)}
+
+    rows = sum(actual.values())
+    return {
+        'success': True,
+        'message': f"{len(keys)} tables and {rows} rows match the dump"
+    }
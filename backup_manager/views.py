@@ -1,15 +1,22 @@
 # backup_manager/views.py
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse, FileResponse, Http404
+from django.http import JsonResponse, HttpResponse, FileResponse, StreamingHttpResponse, Http404
 from django.views.decorators.csrf import csrf_exempt
 from django.utils import timezone
 from django.urls import reverse
 from django.conf import settings
-from .models import DatabaseServer, BackupTask, BackupHistory, StorageConfig, AppSettings
-from .forms import DatabaseServerForm, BackupTaskForm, StorageConfigForm
+from django.db.models import Count
+from .models import DatabaseServer, BackupTask, BackupHistory, StorageConfig, AppSettings, DumpProfile
+from .forms import DatabaseServerForm, BackupTaskForm, StorageConfigForm, DumpProfileForm
 from .services import DatabaseConnectionService, BackupService
-from .tasks import execute_backup_task, restore_backup_task
+from .tasks import execute_backup_task, restore_backup_task, verify_backup_task
+from .health import record_status
+from .sqlindex import artifact_tables, select_tables
+from .pipeline import (
+    is_manifest, is_chunk_manifest, is_parts_manifest, manifest_dir, remove_artifact, iter_artifact_tar,
+    open_artifact_reader, open_stored_reader, CHUNK_MANIFEST_SUFFIX, PARTS_MANIFEST_SUFFIX
+)
 import json
 import csv
 from datetime import datetime
@@ -77,13 +84,10 @@ def test_connection_view(request):
                 server_id = data['server_id']
                 result = DatabaseConnectionService.test_connection(server_id=server_id)
                 
-                # Update server status
+                # Update cached server status, backups fail fast while it is down
                 try:
                     server = DatabaseServer.objects.get(id=server_id)
-                    server.last_status = result['success']
-                    server.last_status_check = timezone.now()
-                    server.last_status_message = result['message']
-                    server.save()
+                    record_status(server, result['success'], result['message'])
                 except DatabaseServer.DoesNotExist:
                     pass
                 
@@ -282,11 +286,12 @@ def export_history_csv_view(request):
     response['Content-Disposition'] = 'attachment; filename="backup_history.csv"'
     
     writer = csv.writer(response)
-    writer.writerow(['Server', 'Task', 'Started', 'Completed', 'Status', 'File Size (MB)', 'Error'])
+    writer.writerow(['Server', 'Task', 'Started', 'Completed', 'Status', 'File Size (MB)', 'Raw Size (MB)', 'Error'])
     
     history = BackupHistory.objects.all().order_by('-started_at')
     for entry in history:
         file_size = f"{entry.file_size / (1024*1024):.2f}" if entry.file_size else "N/A"
+        raw_size = f"{entry.raw_size / (1024*1024):.2f}" if entry.raw_size else "N/A"
         task_name = entry.task.name if entry.task else "Manual"
         
         writer.writerow([
@@ -296,6 +301,7 @@ def export_history_csv_view(request):
             entry.completed_at.strftime('%Y-%m-%d %H:%M:%S') if entry.completed_at else "N/A",
             entry.get_status_display(),
             file_size,
+            raw_size,
             entry.error_message
         ])
     
@@ -321,7 +327,24 @@ def download_backup_view(request, backup_id):
     file_path = backup.file_path
     filename = os.path.basename(file_path)
     
-    response = FileResponse(open(file_path, 'rb'))
+    # Multi-file artifacts are downloaded as a single tar archive
+    if is_manifest(file_path):
+        filename = f"{os.path.basename(manifest_dir(file_path))}.tar"
+        response = StreamingHttpResponse(iter_artifact_tar(file_path), content_type='application/x-tar')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+    
+    # Deduplicated artifacts are reassembled from the chunk store, uncompressed
+    if is_chunk_manifest(file_path):
+        filename = filename[:-len(CHUNK_MANIFEST_SUFFIX)]
+        response = FileResponse(open_artifact_reader(file_path))
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+    
+    # Split files are joined back, encrypted files are decrypted, the file stays compressed as stored
+    if is_parts_manifest(file_path):
+        filename = filename[:-len(PARTS_MANIFEST_SUFFIX)]
+    response = FileResponse(open_stored_reader(file_path))
     response['Content-Disposition'] = f'attachment; filename="{filename}"'
     return response
 
@@ -336,6 +359,27 @@ def restore_backup_view(request, backup_id):
     if not backup.file_path or not os.path.exists(backup.file_path):
         return JsonResponse({'success': False, 'message': 'Backup file does not exist'}, status=404)
     
+    if not backup.is_restorable():
+        return JsonResponse({'success': False, 'message': 'Backup chain is incomplete, the full backup or an incremental backup is missing'}, status=404)
+    
+    # Point in time for incremental backups, binary logs are replayed up to it
+    stop_datetime = None
+    if request.POST.get('stop_datetime'):
+        try:
+            stop_datetime = datetime.fromisoformat(request.POST['stop_datetime']).strftime('%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            return JsonResponse({'success': False, 'message': 'Invalid restore point, expected YYYY-MM-DD HH:MM'}, status=400)
+    
+    # Only these tables are restored, read from the artifact through its table index
+    tables = [name.strip() for name in request.POST.getlist('tables') if name.strip()]
+    if tables:
+        if stop_datetime:
+            return JsonResponse({'success': False, 'message': 'Single tables cannot be restored to a point in time'}, status=400)
+        try:
+            select_tables(backup.file_path, tables)
+        except ValueError as e:
+            return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    
     try:
         filename = os.path.basename(backup.file_path)
         # Create history entry for restore operation
@@ -343,10 +387,12 @@ def restore_backup_view(request, backup_id):
             server=backup.server,
             status='pending',
             description=f"Restoring from backup {filename}"  # Use new field
+                        + (f" up to {stop_datetime}" if stop_datetime else "")
+                        + (f" (tables: {', '.join(tables)})" if tables else "")
         )
         
         # Launch restore task in background
-        restore_backup_task.delay(backup_id, restore_history.id)
+        restore_backup_task.delay(backup_id, restore_history.id, stop_datetime, tables or None)
         
         return JsonResponse({
             'success': True,
@@ -393,7 +439,7 @@ def delete_backup_view(request, backup_id):
         # Delete file if exists
         if backup.file_path and os.path.exists(backup.file_path):
             try:
-                os.remove(backup.file_path)
+                remove_artifact(backup.file_path)
             except OSError as e:
                 return JsonResponse({
                     'success': False, 
@@ -431,7 +477,7 @@ def delete_history_view(request, history_id):
         # Check if file exists and delete it if so
         if history.file_path and os.path.exists(history.file_path):
             try:
-                os.remove(history.file_path)
+                remove_artifact(history.file_path)
             except OSError as e:
                 # Log error but continue deleting entry
                 print(f"Error deleting file: {str(e)}")
@@ -455,6 +501,92 @@ def delete_history_view(request, history_id):
         }, status=500)
 
 
+def backup_tables_view(request, backup_id):
+    """API endpoint listing the tables a backup can restore one by one"""
+    if request.method != 'GET':
+        return JsonResponse({'success': False, 'message': 'Invalid HTTP method'}, status=405)
+
+    backup = get_object_or_404(BackupHistory, id=backup_id, status='success')
+    if not backup.file_path or not os.path.exists(backup.file_path):
+        return JsonResponse({'success': False, 'message': 'Backup file does not exist'}, status=404)
+
+    try:
+        tables = artifact_tables(backup.file_path)
+    except (OSError, ValueError) as e:
+        return JsonResponse({'success': False, 'message': f'Error reading table index: {str(e)}'}, status=500)
+    return JsonResponse({'success': True, 'tables': tables})
+
+@csrf_exempt
+def verify_backup_view(request, backup_id):
+    """API endpoint restoring a backup into a scratch database to verify it"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'Invalid HTTP method'}, status=405)
+
+    backup = get_object_or_404(BackupHistory, id=backup_id, status='success')
+    if not backup.file_path or not os.path.exists(backup.file_path):
+        return JsonResponse({'success': False, 'message': 'Backup file does not exist'}, status=404)
+    if backup.backup_type != 'full':
+        return JsonResponse({'success': False, 'message': 'Only full backups can be verified'}, status=400)
+    if backup.verification_status == 'pending':
+        return JsonResponse({'success': False, 'message': 'This backup is already being verified'}, status=409)
+
+    backup.verification_status = 'pending'
+    backup.save(update_fields=['verification_status'])
+    verify_backup_task.delay(backup.id)
+    return JsonResponse({
+        'success': True,
+        'message': 'Verification started. The backup is restored into a scratch database and its row counts compared.'
+    })
+
+def history_progress_view(request, history_id):
+    """API endpoint with the live progress of a backup"""
+    if request.method != 'GET':
+        return JsonResponse({'success': False, 'message': 'Invalid HTTP method'}, status=405)
+
+    try:
+        history = BackupHistory.objects.get(id=history_id)
+    except BackupHistory.DoesNotExist:
+        return JsonResponse({
+            'success': False,
+            'message': 'History entry does not exist.'
+        }, status=404)
+
+    return JsonResponse({'success': True, 'progress': history.progress_data()})
+
+@csrf_exempt
+def cancel_backup_view(request, history_id):
+    """API endpoint asking the supervisor of a running backup or restore to kill it"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'Invalid HTTP method'}, status=405)
+
+    updated = BackupHistory.objects.filter(id=history_id, status='pending').update(cancel_requested=True)
+    if not updated:
+        return JsonResponse({
+            'success': False,
+            'message': 'No running backup with this history entry.'
+        }, status=404)
+
+    return JsonResponse({
+        'success': True,
+        'message': 'Cancellation requested, the running processes are stopped within a few seconds.'
+    })
+
+def running_backups_view(request):
+    """API endpoint with the live progress of every running backup"""
+    if request.method != 'GET':
+        return JsonResponse({'success': False, 'message': 'Invalid HTTP method'}, status=405)
+
+    running = BackupHistory.objects.filter(status='pending').select_related('server', 'task').order_by('started_at')
+    backups = []
+    for history in running:
+        progress = history.progress_data()
+        progress['server'] = history.server.name
+        progress['task'] = history.task.name if history.task else None
+        progress['started_at'] = history.started_at.isoformat()
+        backups.append(progress)
+
+    return JsonResponse({'success': True, 'backups': backups})
+
 def storage_list_view(request):
     """Storage configurations list"""
     storage_configs = StorageConfig.objects.all().order_by('-is_default', 'name')
@@ -543,6 +675,81 @@ def delete_storage_view(request, storage_id):
         'message': 'Invalid HTTP method.'
     }, status=405)
 
+def profile_list_view(request):
+    """Dump tuning profiles list"""
+    profiles = DumpProfile.objects.all().annotate(server_count=Count('servers')).order_by('name')
+    
+    context = {
+        'profiles': profiles,
+    }
+    return render(request, 'profile_list.html', context)
+
+def add_profile_view(request):
+    """Add new dump tuning profile"""
+    form = DumpProfileForm()
+    
+    if request.method == 'POST':
+        form = DumpProfileForm(request.POST)
+        if form.is_valid():
+            profile = form.save()
+            messages.success(request, f"Tuning profile '{profile.name}' has been added.")
+            return redirect('profile_list')
+        else:
+            messages.error(request, "Please correct the form errors.")
+    
+    context = {
+        'form': form,
+    }
+    return render(request, 'add_profile.html', context)
+
+def edit_profile_view(request, profile_id):
+    """Edit dump tuning profile"""
+    profile = get_object_or_404(DumpProfile, id=profile_id)
+    form = DumpProfileForm(instance=profile)
+    
+    if request.method == 'POST':
+        form = DumpProfileForm(request.POST, instance=profile)
+        if form.is_valid():
+            profile = form.save()
+            messages.success(request, f"Tuning profile '{profile.name}' has been updated.")
+            return redirect('profile_list')
+        else:
+            messages.error(request, "Please correct the form errors.")
+    
+    context = {
+        'form': form,
+        'profile': profile,
+    }
+    return render(request, 'edit_profile.html', context)
+
+@csrf_exempt
+def delete_profile_view(request, profile_id):
+    """API endpoint for deleting a dump tuning profile, its servers go back to the default options"""
+    if request.method == 'DELETE':
+        try:
+            profile = DumpProfile.objects.get(id=profile_id)
+            name = profile.name
+            profile.delete()
+            return JsonResponse({
+                'success': True,
+                'message': f"Tuning profile '{name}' has been deleted."
+            })
+        except DumpProfile.DoesNotExist:
+            return JsonResponse({
+                'success': False,
+                'message': 'Tuning profile does not exist.'
+            }, status=404)
+        except Exception as e:
+            return JsonResponse({
+                'success': False,
+                'message': f'Error: {str(e)}'
+            }, status=500)
+    
+    return JsonResponse({
+        'success': False,
+        'message': 'Invalid HTTP method.'
+    }, status=405)
+
 def gdrive_auth_start(request):
     """Placeholder for Google Drive auth start"""
     messages.info(request, "Using service account authentication. No user auth needed.")
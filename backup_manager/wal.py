@@ -0,0 +1,275 @@
+# backup_manager/wal.py
+"""
+Physical PostgreSQL backups: base backups taken with pg_basebackup and WAL
+archived between them with pg_receivewal. Both run over the replication
+protocol through a permanent replication slot, so the server keeps every WAL
+segment until it is archived. A restore prepares a data directory that recovers
+to the end of the archived WAL or to a point in time when started.
+"""
+import os
+import re
+import shutil
+import tarfile
+import tempfile
+import psycopg2
+from django.conf import settings
+from .models import file_log
+from .pipeline import (
+    CHUNK_SIZE, artifact_extension, open_artifact_writer, open_artifact_reader,
+    is_manifest, read_manifest
+)
+from .supervisor import ProcessSupervisor
+
+WAL_SEGMENT_RE = re.compile(r'^[0-9A-F]{24}(\.partial)?$')
+BASEBACKUP_END_RE = re.compile(r'write-ahead log end point: ([0-9A-F]+/[0-9A-F]+)')
+
+
+class WalGapError(Exception):
+    """The WAL needed to continue a backup chain is no longer available"""
+
+
+def replication_slot_name(server):
+    return f"debt_server_{server.id}"
+
+
+def wal_staging_dir(server):
+    """Directory pg_receivewal resumes from between incremental backups"""
+    return os.path.join(settings.BACKUP_DIR, '.wal', str(server.id))
+
+
+def is_physical_backup(path):
+    """True for base backup manifests written by take_base_backup"""
+    return bool(path) and os.path.exists(path) and is_manifest(path) \
+        and read_manifest(path).get('engine') == 'pg_basebackup'
+
+
+def _query_one(connect_params, query, params=None):
+    conn = psycopg2.connect(**connect_params)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        row = cursor.fetchone()
+        cursor.close()
+        return row
+    finally:
+        conn.close()
+
+
+def _slot_exists(connect_params, slot):
+    return _query_one(
+        connect_params, "SELECT 1 FROM pg_replication_slots WHERE slot_name = %s", (slot,)
+    ) is not None
+
+
+def _replication_cmd(tool, connect_params):
+    return [
+        tool,
+        '-h', connect_params['host'],
+        '-p', str(connect_params['port']),
+        '-U', connect_params['user'],
+        '--no-password',
+    ]
+
+
+def _wal_segments(directory):
+    return sorted(name for name in os.listdir(directory) if WAL_SEGMENT_RE.match(name))
+
+
+def _store_file(source, output_dir, filename, compression, level, cipher=None):
+    """Copy a work file into the artifact directory, compressing (and encrypting) it"""
+    target = os.path.join(output_dir, filename)
+    with open(source, 'rb') as src, open_artifact_writer(target, compression, level, cipher) as out:
+        shutil.copyfileobj(src, out, CHUNK_SIZE)
+    return os.path.getsize(source), os.path.getsize(target)
+
+
+def _seed_staging(pg_wal_tar, staging_dir):
+    """
+    Start a new WAL chain: the last segment of the base backup is placed as a
+    partial segment, pg_receivewal continues streaming from its beginning.
+    """
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    os.makedirs(staging_dir)
+    with tarfile.open(pg_wal_tar) as tar:
+        members = [m for m in tar.getmembers()
+                   if m.isfile() and WAL_SEGMENT_RE.match(os.path.basename(m.name))]
+        if not members:
+            raise RuntimeError('Base backup does not contain any WAL segment')
+        last = max(members, key=lambda m: os.path.basename(m.name))
+        with tar.extractfile(last) as src, \
+                open(os.path.join(staging_dir, f"{os.path.basename(last.name)}.partial"), 'wb') as out:
+            shutil.copyfileobj(src, out, CHUNK_SIZE)
+
+
+def take_base_backup(connect_params, env, slot, output_dir, prefix, staging_dir,
+                     compression='none', level=None, supervisor=None, max_rate=None, cipher=None):
+    """
+    Run pg_basebackup in tar format streaming WAL through the replication slot
+    (created on first use) and start a new WAL chain. Returns manifest entries
+    and the WAL position the backup ends at. max_rate limits the transfer in
+    bytes per second.
+    """
+    supervisor = supervisor or ProcessSupervisor()
+    work_dir = tempfile.mkdtemp(prefix='basebackup_', dir=output_dir)
+    try:
+        cmd = _replication_cmd('pg_basebackup', connect_params) + [
+            '-D', work_dir,
+            '-F', 't',
+            '-X', 'stream',
+            '--checkpoint=fast',
+            f'--slot={slot}',
+            f'--label={prefix}',
+            '--verbose',
+        ]
+        if not _slot_exists(connect_params, slot):
+            cmd.append('--create-slot')
+        if max_rate:
+            # pg_basebackup accepts 32 kB/s to 1 GB/s
+            cmd.append(f'--max-rate={min(max(32, max_rate // 1024), 1024 * 1024)}k')
+
+        file_log(f"WAL: pg_basebackup through replication slot {slot}")
+        result = supervisor.run(cmd, env=env)
+        if result.returncode != 0:
+            raise RuntimeError(supervisor.failure(result.stderr.strip() or f'pg_basebackup exited with code {result.returncode}'))
+
+        match = BASEBACKUP_END_RE.search(result.stderr)
+        if not match:
+            raise RuntimeError('pg_basebackup did not report the WAL end point')
+        end_lsn = match.group(1)
+
+        _seed_staging(os.path.join(work_dir, 'pg_wal.tar'), staging_dir)
+
+        entries = []
+        extension = artifact_extension(compression)
+        for name in sorted(os.listdir(work_dir)):
+            if name == 'base.tar':
+                phase = 'base'
+            elif name == 'pg_wal.tar':
+                phase = 'wal'
+            elif name == 'backup_manifest':
+                phase = 'manifest'
+            else:
+                phase = 'tablespace'
+            filename = f"{prefix}_{name}{extension}"
+            raw_size, file_size = _store_file(os.path.join(work_dir, name), output_dir, filename, compression, level, cipher)
+            entries.append({
+                'name': name,
+                'phase': phase,
+                'file': filename,
+                'raw_size': raw_size,
+                'file_size': file_size,
+            })
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return entries, end_lsn
+
+
+def archive_wal(connect_params, env, slot, staging_dir, output_dir, prefix,
+                compression='none', level=None, supervisor=None, cipher=None):
+    """
+    Stream the WAL written since the previous run up to the current server
+    position into the staging directory and copy the new segments to output_dir.
+    Raises WalGapError when there is no chain to continue.
+    """
+    supervisor = supervisor or ProcessSupervisor()
+    if not os.path.isdir(staging_dir) or not _wal_segments(staging_dir):
+        raise WalGapError('No archived WAL position to continue from')
+    if not _slot_exists(connect_params, slot):
+        raise WalGapError(f'Replication slot {slot} does not exist')
+
+    end_lsn = _query_one(connect_params, "SELECT pg_current_wal_lsn()")[0]
+    cmd = _replication_cmd('pg_receivewal', connect_params) + [
+        '-D', staging_dir,
+        f'--slot={slot}',
+        f'--endpos={end_lsn}',
+        '--no-loop',
+        '--verbose',
+    ]
+    file_log(f"WAL: pg_receivewal through replication slot {slot} up to {end_lsn}")
+    result = supervisor.run(cmd, env=env)
+    if result.returncode != 0:
+        raise RuntimeError(supervisor.failure(result.stderr.strip() or f'pg_receivewal exited with code {result.returncode}'))
+
+    segments = _wal_segments(staging_dir)
+    entries = []
+    extension = artifact_extension(compression)
+    for name in segments:
+        filename = f"{prefix}_{name}{extension}"
+        raw_size, file_size = _store_file(os.path.join(staging_dir, name), output_dir, filename, compression, level, cipher)
+        entries.append({
+            'segment': name.split('.')[0],
+            'partial': name.endswith('.partial'),
+            'phase': 'wal',
+            'file': filename,
+            'raw_size': raw_size,
+            'file_size': file_size,
+        })
+
+    # Only the newest segment is needed for pg_receivewal to resume
+    for name in segments[:-1]:
+        os.remove(os.path.join(staging_dir, name))
+
+    return entries, end_lsn
+
+
+def _extract(path, target_dir):
+    with open_artifact_reader(path) as reader, tarfile.open(fileobj=reader, mode='r|') as tar:
+        tar.extractall(target_dir, filter='data')
+
+
+def prepare_recovery(base_manifest, wal_manifests, target_dir, stop_datetime=None):
+    """
+    Build a data directory in target_dir from a base backup and the WAL archived
+    after it. Started by PostgreSQL of the same major version it replays the
+    archive up to its end, or up to stop_datetime, and promotes.
+    """
+    wal_archive = f"{target_dir}_wal"
+    tablespace_root = f"{target_dir}_tablespaces"
+    os.makedirs(target_dir)
+    os.makedirs(wal_archive)
+
+    tablespaces = {}
+    for entry in base_manifest['artifacts']:
+        if entry['phase'] == 'base':
+            _extract(entry['path'], target_dir)
+        elif entry['phase'] == 'wal':
+            _extract(entry['path'], os.path.join(target_dir, 'pg_wal'))
+        elif entry['phase'] == 'tablespace':
+            oid = entry['name'].split('.')[0]
+            tablespaces[oid] = os.path.join(tablespace_root, oid)
+            _extract(entry['path'], tablespaces[oid])
+
+    # Tablespaces are restored next to the data directory instead of their original location
+    tablespace_map = os.path.join(target_dir, 'tablespace_map')
+    if tablespaces and os.path.exists(tablespace_map):
+        with open(tablespace_map, 'w') as f:
+            for oid, path in tablespaces.items():
+                f.write(f"{oid} {path}\n")
+
+    # A segment still being written is archived again by the next backup, keep the longest copy
+    segments = {}
+    for manifest in wal_manifests:
+        for entry in manifest['artifacts']:
+            segments[entry['segment']] = entry['path']
+    for segment, path in segments.items():
+        with open_artifact_reader(path) as src, open(os.path.join(wal_archive, segment), 'wb') as out:
+            shutil.copyfileobj(src, out, CHUNK_SIZE)
+
+    settings_lines = [
+        f"restore_command = 'cp \"{wal_archive}/%f\" \"%p\"'",
+        "recovery_target_action = 'promote'",
+    ]
+    if stop_datetime:
+        settings_lines.append(f"recovery_target_time = '{stop_datetime}'")
+    with open(os.path.join(target_dir, 'postgresql.auto.conf'), 'a') as f:
+        f.write("\n# Added by DEBT restore\n" + "\n".join(settings_lines) + "\n")
+    open(os.path.join(target_dir, 'recovery.signal'), 'w').close()
+    os.chmod(target_dir, 0o700)
+
+    file_log(f"WAL: data directory prepared in {target_dir} with {len(segments)} archived WAL segments")
+    return {
+        'data_dir': target_dir,
+        'wal_archive': wal_archive,
+        'segments': len(segments),
+    }
@@ -2,6 +2,7 @@
 import os
 from celery import Celery
 from celery.signals import worker_ready
+from django.conf import settings
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'db_backup_tool.settings')
 
@@ -16,10 +17,22 @@ app.conf.beat_schedule = {
         'schedule': 60.0,  # Check every minute
         'options': {'expires': 50}  # Task expires after 50 seconds to prevent overlap
     },
+    'check-server-health': {
+        'task': 'backup_manager.tasks.check_server_health',
+        'schedule': float(settings.SERVER_HEALTH_CHECK_INTERVAL),
+        'options': {'expires': settings.SERVER_HEALTH_CHECK_INTERVAL * 0.8}
+    },
 }
 
-# Add rate limiting to reduce task duplication
-app.conf.task_default_rate_limit = '1/m'  # Limit task to once per minute
+if settings.VERIFY_INTERVAL:
+    app.conf.beat_schedule['verify-recent-backups'] = {
+        'task': 'backup_manager.tasks.verify_recent_backups',
+        'schedule': float(settings.VERIFY_INTERVAL),
+        'options': {'expires': settings.VERIFY_INTERVAL * 0.8}
+    }
+
+# No global rate limit: backups are limited per database host, SSH bastion and
+# storage destination (backup_manager.concurrency), the rest of the pool stays busy
 
 # Set task serialization format
 app.conf.task_serializer = 'json'
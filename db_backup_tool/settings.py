@@ -93,6 +93,29 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = config('CELERY_TIMEZONE', default=TIME_ZONE)
 
+# Simultaneous backups per database host, SSH bastion and storage destination, 0 means no limit.
+# Slots are kept in Redis, a backup without a free slot is requeued after BACKUP_SLOT_RETRY_DELAY seconds.
+BACKUP_MAX_PER_HOST = config('BACKUP_MAX_PER_HOST', default=1, cast=int)
+BACKUP_MAX_PER_SSH_HOST = config('BACKUP_MAX_PER_SSH_HOST', default=2, cast=int)
+BACKUP_MAX_PER_STORAGE = config('BACKUP_MAX_PER_STORAGE', default=2, cast=int)
+BACKUP_SLOT_RETRY_DELAY = config('BACKUP_SLOT_RETRY_DELAY', default=60, cast=int)
+BACKUP_LOCK_URL = config('BACKUP_LOCK_URL', default=CELERY_BROKER_URL)
+
+# Seconds between connection tests of all servers, backups skip servers that failed the last one
+SERVER_HEALTH_CHECK_INTERVAL = config('SERVER_HEALTH_CHECK_INTERVAL', default=300, cast=int)
+
+# Restore verification: recent successful backups are restored into a throwaway local MySQL or
+# PostgreSQL instance (binaries of the worker host, VERIFY_*_BIN) and their tables and row counts
+# compared with the dump. Seconds between checks for unverified backups, 0 disables it.
+VERIFY_INTERVAL = config('VERIFY_INTERVAL', default=0, cast=int)
+# Only backups completed within this many hours are verified automatically
+VERIFY_MAX_AGE_HOURS = config('VERIFY_MAX_AGE_HOURS', default=24, cast=int)
+# Simultaneous verifications across all workers, each runs its own database instance
+VERIFY_MAX_CONCURRENT = config('VERIFY_MAX_CONCURRENT', default=1, cast=int)
+# Directories of initdb/pg_ctl and mysqld/mysqladmin, empty searches PATH
+VERIFY_POSTGRESQL_BIN = config('VERIFY_POSTGRESQL_BIN', default='')
+VERIFY_MYSQL_BIN = config('VERIFY_MYSQL_BIN', default='')
+
 SESSION_COOKIE_AGE = 1800
 SESSION_SAVE_EVERY_REQUEST = True
 
@@ -10,9 +10,10 @@ from backup_manager.views import (
     schedule_list_view, add_schedule_view, edit_schedule_view,
     delete_schedule_view, toggle_schedule_view, run_backup_now_view,
     backup_history_view, export_history_csv_view,
-    backup_files_view, download_backup_view, restore_backup_view,
-    delete_backup_view, delete_history_view, add_storage_view, edit_storage_view,
-    delete_storage_view, storage_list_view, handler404, handler500, test_404_view, test_500_view
+    backup_files_view, download_backup_view, restore_backup_view, backup_tables_view, verify_backup_view,
+    delete_backup_view, delete_history_view, history_progress_view, cancel_backup_view, running_backups_view, add_storage_view, edit_storage_view,
+    delete_storage_view, storage_list_view, profile_list_view, add_profile_view, edit_profile_view,
+    delete_profile_view, handler404, handler500, test_404_view, test_500_view
 )
 
 urlpatterns = [
@@ -48,8 +49,13 @@ urlpatterns = [
     path('backups/', login_required(backup_files_view), name='backup_files'),
     path('backups/download/<int:backup_id>/', login_required(download_backup_view), name='download_backup'),
     path('api/backups/restore/<int:backup_id>/', login_required(restore_backup_view), name='restore_backup'),
+    path('api/backups/tables/<int:backup_id>/', login_required(backup_tables_view), name='backup_tables'),
+    path('api/backups/verify/<int:backup_id>/', login_required(verify_backup_view), name='verify_backup'),
     path('api/backups/delete/<int:backup_id>/', login_required(delete_backup_view), name='delete_backup'),
     path('api/history/delete/<int:history_id>/', login_required(delete_history_view), name='delete_history'),
+    path('api/history/<int:history_id>/progress/', login_required(history_progress_view), name='history_progress'),
+    path('api/history/<int:history_id>/cancel/', login_required(cancel_backup_view), name='cancel_backup'),
+    path('api/history/running/', login_required(running_backups_view), name='running_backups'),
 
     # Storage configurations
     path('storage/', login_required(storage_list_view), name='storage_list'),
@@ -57,6 +63,12 @@ urlpatterns = [
     path('storage/edit/<int:storage_id>/', login_required(edit_storage_view), name='edit_storage'),
     path('api/storage/<int:storage_id>/', login_required(delete_storage_view), name='delete_storage'),
 
+    # Dump tuning profiles
+    path('profiles/', login_required(profile_list_view), name='profile_list'),
+    path('profiles/add/', login_required(add_profile_view), name='add_profile'),
+    path('profiles/edit/<int:profile_id>/', login_required(edit_profile_view), name='edit_profile'),
+    path('api/profiles/<int:profile_id>/', login_required(delete_profile_view), name='delete_profile'),
+
     path('test-404/', test_404_view, name='test_404'),
     path('test-500/', test_500_view, name='test_500'),
     